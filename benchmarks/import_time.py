@@ -0,0 +1,85 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Measures how long it takes a fresh interpreter to import the gs123 modules
+and to run a one-file line mode conversion with the command line script.
+Each case is run in a new process `--repeat` times and the fastest and
+median wall clock times are printed, together with the bare interpreter
+start up time for comparison.
+
+    python benchmarks/import_time.py --repeat 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = (
+    'gs123.check_digit',
+    'gs123.conversion',
+    'gs123.record_conversion',
+    'gs123.xml_conversion',
+    'gs123.gs123conversion',
+)
+
+
+def run(arguments, repeat):
+    """
+    Runs the command `repeat` times and returns the wall clock times.
+    """
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(arguments, check=True, env=environment,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name, times, baseline=0.0):
+    print('%-32s min %7.1f ms  median %7.1f ms  (+%.1f ms)' % (
+        name, min(times) * 1000, statistics.median(times) * 1000,
+        (min(times) - baseline) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    baseline = min(run([sys.executable, '-c', 'pass'], args.repeat))
+    report('python -c pass', [baseline], baseline)
+    for module in MODULES:
+        report('import %s' % module,
+               run([sys.executable, '-c', 'import %s' % module],
+                   args.repeat), baseline)
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'barcodes.txt')
+        with open(input_file, 'w') as f:
+            f.write('0100377713112102211RFXVHNPA111\n' * 100)
+        report('cli line mode (100 barcodes)', run([
+            sys.executable, '-m', 'gs123.gs123conversion',
+            '--input-format', 'lines', '-i', input_file,
+            '-o', os.path.join(directory, 'urns.txt')
+        ], args.repeat), baseline)
+
+
+if __name__ == '__main__':
+    main()
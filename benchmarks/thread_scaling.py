@@ -0,0 +1,92 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Measures how the throughput of `gs123.threaded_batch.ThreadedBatchConverter`
+changes with the number of threads.  Each thread count converts the same
+list of distinct barcodes `--repeat` times and the best run is reported
+as barcodes per second and as a speedup over one thread.  Run it with both
+a regular and a free-threaded interpreter to compare them; the interpreter
+and whether the GIL is enabled are printed first.
+
+    python benchmarks/thread_scaling.py --values 200000 --max-threads 8
+    python3.13t benchmarks/thread_scaling.py --values 200000 --max-threads 8
+"""
+import argparse
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from gs123.threaded_batch import ThreadedBatchConverter, \
+    gil_enabled  # noqa: E402
+
+
+def thread_counts(maximum):
+    """
+    Returns 1, 2, 4... up to and including the maximum.
+    """
+    counts = []
+    count = 1
+    while count < maximum:
+        counts.append(count)
+        count *= 2
+    counts.append(maximum)
+    return counts
+
+
+def measure(values, threads, chunk_size, repeat):
+    """
+    Returns the fastest time to convert the values with the threads.
+    """
+    with ThreadedBatchConverter(threads, 7,
+                                chunk_size=chunk_size) as converter:
+        # starts the threads and compiles the patterns
+        converter.convert_batch(values[:threads * chunk_size])
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            converter.convert_batch(values)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--values', type=int, default=100000)
+    parser.add_argument('--max-threads', type=int,
+                        default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print('%s %s, GIL %s, %s CPUs' % (
+        platform.python_implementation(), platform.python_version(),
+        'enabled' if gil_enabled() else 'disabled', os.cpu_count()))
+    values = [
+        '(01)00614141123452(21)%010d(17)251231(10)LOT7' % serial
+        for serial in range(args.values)
+    ]
+    baseline = None
+    for threads in thread_counts(args.max_threads):
+        seconds = measure(values, threads, args.chunk_size, args.repeat)
+        baseline = baseline or seconds
+        print('%3d threads  %10.0f barcodes/s  %5.2fx' % (
+            threads, len(values) / seconds, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+The packaging hierarchy (parent to children) of the AggregationEvents in
+an EPCIS document, built while the document is converted.  Pass an
+`AggregationIndex` to `gs123.xml_conversion.convert_xml_file` (or
+`convert_xml_string`) in its `observers` and it is filled in from the
+converted parentID and childEPCs values as the document streams past.
+"""
+from array import array
+
+# the EPCIS event elements; the values collected from an event are
+# dropped when it ends
+EVENT_NAMES = frozenset((
+    'ObjectEvent', 'AggregationEvent', 'TransactionEvent',
+    'TransformationEvent', 'AssociationEvent'
+))
+
+_NONE = -1
+
+
+class AggregationIndex:
+    """
+    A parent to children index of EPCs.  Every EPC is stored once and
+    given a number; the links between them are kept in arrays of those
+    numbers (parent, first and last child, next and previous sibling) so
+    an EPC costs its string and a few bytes, however it is linked.
+    Children are kept in the order they were added.
+
+    ADD and OBSERVE aggregation events link the children to the parent
+    (moving a child that already has a parent) and DELETE events unlink
+    the children listed, or all of the parent's children if none are.
+    A child that is the parent itself or one of its ancestors is not
+    linked, since that would make a loop; the (parent, child) pairs that
+    were skipped are kept in `conflicts`.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._epcs = []
+        self._parents = array('i')
+        self._first_children = array('i')
+        self._last_children = array('i')
+        self._next_siblings = array('i')
+        self._previous_siblings = array('i')
+        self._event_parent = None
+        self._event_children = []
+        self._event_action = None
+        self.conflicts = []
+
+    def add(self, parent: str, children) -> None:
+        """
+        Links the children to the parent.
+        :param parent: The parent EPC.
+        :param children: An iterable of child EPCs.
+        :return: None
+        """
+        parent_id = self._id(parent)
+        ancestor_ids = None
+        for child in children:
+            child_id = self._id(child)
+            if self._parents[child_id] == parent_id:
+                continue
+            if ancestor_ids is None:
+                ancestor_ids = {parent_id}
+                ancestor_id = self._parents[parent_id]
+                while ancestor_id != _NONE:
+                    ancestor_ids.add(ancestor_id)
+                    ancestor_id = self._parents[ancestor_id]
+            if child_id in ancestor_ids:
+                self.conflicts.append((parent, child))
+                continue
+            self._unlink(child_id)
+            self._link(parent_id, child_id)
+
+    def remove(self, parent: str, children=None) -> None:
+        """
+        Unlinks children from the parent.
+        :param parent: The parent EPC.
+        :param children: An iterable of child EPCs.  Default is all of the
+        parent's children.
+        :return: None
+        """
+        parent_id = self._ids.get(parent)
+        if parent_id is None:
+            return
+        if children is None:
+            child_id = self._first_children[parent_id]
+            while child_id != _NONE:
+                next_id = self._next_siblings[child_id]
+                self._unlink(child_id)
+                child_id = next_id
+            return
+        for child in children:
+            child_id = self._ids.get(child)
+            if child_id is not None and \
+                    self._parents[child_id] == parent_id:
+                self._unlink(child_id)
+
+    def parent(self, epc: str):
+        """
+        Returns the parent of an EPC or None.
+        """
+        epc_id = self._ids.get(epc)
+        if epc_id is None or self._parents[epc_id] == _NONE:
+            return None
+        return self._epcs[self._parents[epc_id]]
+
+    def children(self, epc: str) -> list:
+        """
+        Returns the children of an EPC.
+        """
+        epc_id = self._ids.get(epc)
+        ret = []
+        if epc_id is None:
+            return ret
+        child_id = self._first_children[epc_id]
+        while child_id != _NONE:
+            ret.append(self._epcs[child_id])
+            child_id = self._next_siblings[child_id]
+        return ret
+
+    def ancestors(self, epc: str) -> list:
+        """
+        Returns the parent of an EPC, its parent and so on up to the top
+        level container.
+        """
+        epc_id = self._ids.get(epc)
+        ret = []
+        if epc_id is None:
+            return ret
+        parent_id = self._parents[epc_id]
+        while parent_id != _NONE:
+            ret.append(self._epcs[parent_id])
+            parent_id = self._parents[parent_id]
+        return ret
+
+    def subtree(self, epc: str):
+        """
+        Yields every EPC below an EPC (children, their children and so
+        on) depth first, each one before its children.
+        """
+        epc_id = self._ids.get(epc)
+        if epc_id is None:
+            return
+        for descendant_id in self._walk(epc_id):
+            yield self._epcs[descendant_id]
+
+    def roots(self):
+        """
+        Yields the EPCs that have children but no parent.
+        """
+        parents = self._parents
+        first_children = self._first_children
+        for epc_id, epc in enumerate(self._epcs):
+            if parents[epc_id] == _NONE and first_children[epc_id] != _NONE:
+                yield epc
+
+    def element_end(self, element) -> None:
+        """
+        Collects the parentID, childEPCs and action values of an
+        AggregationEvent and applies the event when it ends.  Called by
+        the XML converters for every element once its values have been
+        converted.
+        :param element: An lxml element.
+        :return: None
+        """
+        name = element.tag.rpartition('}')[2]
+        if name == 'epc':
+            parent = element.getparent()
+            if element.text and parent is not None and \
+                    parent.tag.rpartition('}')[2] == 'childEPCs':
+                self._event_children.append(element.text.strip())
+        elif name == 'parentID':
+            self._event_parent = (element.text or '').strip() or None
+        elif name == 'action':
+            self._event_action = (element.text or '').strip()
+        elif name in EVENT_NAMES:
+            if name == 'AggregationEvent' and self._event_parent:
+                if self._event_action == 'DELETE':
+                    self.remove(self._event_parent,
+                                self._event_children or None)
+                else:
+                    self.add(self._event_parent, self._event_children)
+            self._event_parent = None
+            self._event_children = []
+            self._event_action = None
+
+    def save(self, path: str) -> None:
+        """
+        Writes the index to a text file with one EPC and the line number
+        of its parent (or -1) per line, parents first.  EPCs without a
+        parent or children are left out.
+        :param path: The file to create.
+        :return: None
+        """
+        lines = {}
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            for epc_id in self._top_level_ids():
+                for descendant_id in [epc_id] + list(self._walk(epc_id)):
+                    parent_id = self._parents[descendant_id]
+                    f.write('%s\t%d\n' % (
+                        self._epcs[descendant_id],
+                        lines[parent_id] if parent_id != _NONE else _NONE
+                    ))
+                    lines[descendant_id] = len(lines)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads an index written by `save`.
+        :param path: The file to read.
+        :return: A new AggregationIndex.
+        """
+        index = cls()
+        line_ids = []
+        with open(path, encoding='utf-8', newline='\n') as f:
+            for line in f:
+                epc, _, parent_line = line.rstrip('\n').rpartition('\t')
+                epc_id = index._id(epc)
+                parent_line = int(parent_line)
+                if parent_line != _NONE:
+                    index._link(line_ids[parent_line], epc_id)
+                line_ids.append(epc_id)
+        return index
+
+    def _top_level_ids(self):
+        parents = self._parents
+        first_children = self._first_children
+        for epc_id in range(len(self._epcs)):
+            if parents[epc_id] == _NONE and first_children[epc_id] != _NONE:
+                yield epc_id
+
+    def _walk(self, epc_id):
+        """
+        Yields the ids below epc_id in preorder, following the sibling
+        and parent links instead of keeping a stack.
+        """
+        first_children = self._first_children
+        next_siblings = self._next_siblings
+        parents = self._parents
+        current = first_children[epc_id]
+        while current != _NONE:
+            yield current
+            if first_children[current] != _NONE:
+                current = first_children[current]
+                continue
+            while current != epc_id and next_siblings[current] == _NONE:
+                current = parents[current]
+            if current == epc_id:
+                return
+            current = next_siblings[current]
+
+    def _id(self, epc):
+        epc_id = self._ids.get(epc)
+        if epc_id is None:
+            epc_id = self._ids[epc] = len(self._epcs)
+            self._epcs.append(epc)
+            for links in (self._parents, self._first_children,
+                          self._last_children, self._next_siblings,
+                          self._previous_siblings):
+                links.append(_NONE)
+        return epc_id
+
+    def _link(self, parent_id, child_id):
+        self._parents[child_id] = parent_id
+        last_id = self._last_children[parent_id]
+        self._previous_siblings[child_id] = last_id
+        if last_id == _NONE:
+            self._first_children[parent_id] = child_id
+        else:
+            self._next_siblings[last_id] = child_id
+        self._last_children[parent_id] = child_id
+
+    def _unlink(self, child_id):
+        parent_id = self._parents[child_id]
+        if parent_id == _NONE:
+            return
+        previous_id = self._previous_siblings[child_id]
+        next_id = self._next_siblings[child_id]
+        if previous_id == _NONE:
+            self._first_children[parent_id] = next_id
+        else:
+            self._next_siblings[previous_id] = next_id
+        if next_id == _NONE:
+            self._last_children[parent_id] = previous_id
+        else:
+            self._previous_siblings[next_id] = previous_id
+        self._parents[child_id] = _NONE
+        self._previous_siblings[child_id] = _NONE
+        self._next_siblings[child_id] = _NONE
+
+    def __contains__(self, epc):
+        return epc in self._ids
+
+    def __len__(self):
+        return len(self._epcs)
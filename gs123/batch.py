@@ -0,0 +1,307 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import time
+from gs123.conversion import BarcodeConverter, BarcodeFormat, URNConverter, \
+    URNNotValid
+from gs123.digital_link import DEFAULT_DOMAIN, get_template
+from gs123.memo import DEFAULT_MEMO_SIZE, MISSING, NOT_A_BARCODE, ValueMemo
+from gs123.regex import PatternRegistry
+
+URN_PREFIX = 'urn:epc:id:'
+
+
+def barcode_to_urn(company_prefix_length, serial_number_length, stats=None,
+                   registry=None, converter_type=BarcodeConverter,
+                   profile=None):
+    """
+    Returns a function that converts a barcode value to an EPC URN or
+    returns None if the value is not a barcode.  If a
+    `gs123.profile.ConversionProfile` is supplied it replaces the lengths
+    and the registry and the function returns its output property.
+    """
+    if profile is not None and converter_type is BarcodeConverter:
+        convert = profile.convert
+        if stats is None:
+            return convert
+
+        def convert_profiled(value):
+            return convert(value, stats)
+
+        return convert_profiled
+
+    property_name = 'epc_urn'
+    kwargs = {}
+    if profile is not None:
+        property_name = profile.property_name
+        kwargs['profile'] = profile
+
+    def convert_value(value):
+        try:
+            return getattr(converter_type(
+                value,
+                company_prefix_length=company_prefix_length,
+                max_serial_number_length=serial_number_length,
+                stats=stats,
+                registry=registry,
+                **kwargs
+            ), property_name)
+        except BarcodeConverter.BarcodeNotValid:
+            return None
+
+    return convert_value
+
+
+def urn_to_barcode(barcode_format, stats=None):
+    """
+    Returns a function that converts an EPC URN to a barcode formatted per
+    the `BarcodeFormat` or returns None if the value is not a URN.
+    """
+
+    def convert_value(value):
+        if not value or not value.startswith(URN_PREFIX):
+            if stats is not None:
+                stats.record_rejection()
+            return None
+        try:
+            return barcode_format.get_barcode_value(URNConverter(value))
+        except URNNotValid:
+            if stats is not None:
+                stats.record_rejection()
+            return None
+
+    return convert_value
+
+
+def memoize(convert_value, stats=None, memo_size=DEFAULT_MEMO_SIZE):
+    """
+    Wraps a function that takes a raw value and returns the converted
+    value (or None if the value can not be converted).  Results are
+    remembered in a `gs123.memo.ValueMemo` of `memo_size` values (zero
+    disables it) and, if a stats collector is supplied, timed and counted.
+    """
+    memo = ValueMemo(memo_size) if memo_size else None
+
+    if stats is not None:
+        uninstrumented = convert_value
+
+        def convert_value(value):
+            start = time.perf_counter()
+            try:
+                return uninstrumented(value)
+            except Exception as e:
+                stats.record_exception(e)
+                raise
+            finally:
+                stats.add_time('convert', time.perf_counter() - start)
+
+    if memo is None:
+        return convert_value
+
+    def convert_memoized(value):
+        if value is None:
+            return None
+        ret = memo.get(value)
+        if ret is MISSING:
+            if stats is not None:
+                stats.record_memo_miss()
+            ret = convert_value(value)
+            memo.put(value, NOT_A_BARCODE if ret is None else ret)
+        else:
+            if stats is not None:
+                stats.record_memo_hit()
+            if ret is NOT_A_BARCODE:
+                ret = None
+        return ret
+
+    return convert_memoized
+
+
+class BarcodeBatchConverter:
+    """
+    Converts batches of barcode values with a shared configuration,
+    `PatternRegistry` and memo so that repeated values and the dominant
+    barcode format are cheap across every batch of a file or list.
+    Invalid values are returned as None instead of raising.  The memo,
+    registry and stats collector are locked, so a converter can be shared
+    between threads.
+    """
+
+    def __init__(self, company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 property_name: str = 'epc_urn',
+                 stats=None,
+                 registry: PatternRegistry = None,
+                 memo_size: int = DEFAULT_MEMO_SIZE,
+                 profile=None):
+        """
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param property_name: The BarcodeConverter property `convert`
+        returns.  Default is epc_urn.
+        :param stats: An optional `gs123.stats.ConversionStats` instance.
+        :param registry: An optional `gs123.regex.PatternRegistry`.  A new
+        one is created if none is supplied.
+        :param memo_size: The number of distinct values to remember the
+        converted value of.  Zero disables the memo.
+        :param profile: An optional `gs123.profile.ConversionProfile`.  If
+        supplied it replaces the lengths, the property name and the
+        registry.
+        """
+        if profile is not None:
+            company_prefix_length = profile.company_prefix_length
+            serial_number_length = profile.serial_number_length
+            property_name = profile.property_name
+        self.company_prefix_length = company_prefix_length
+        self.serial_number_length = serial_number_length
+        self.property_name = property_name
+        self.profile = profile
+        self.stats = stats
+        self.registry = registry if registry is not None \
+            else PatternRegistry()
+        self.memo = ValueMemo(memo_size) if memo_size else None
+
+    def parse(self, value):
+        """
+        Returns a BarcodeConverter for the value or None if the value is
+        not a valid barcode.
+        :param value: The barcode value.
+        """
+        try:
+            return BarcodeConverter(
+                value,
+                self.company_prefix_length,
+                self.serial_number_length,
+                stats=self.stats,
+                registry=self.registry,
+                profile=self.profile
+            )
+        except BarcodeConverter.BarcodeNotValid:
+            return None
+
+    def convert(self, value):
+        """
+        Returns the configured property for the value or None if the value
+        is not a valid barcode.
+        :param value: The barcode value.
+        """
+        memo = self.memo
+        if memo is not None:
+            ret = memo.get(value)
+            if ret is not MISSING:
+                if self.stats is not None:
+                    self.stats.record_memo_hit()
+                return None if ret is NOT_A_BARCODE else ret
+            if self.stats is not None:
+                self.stats.record_memo_miss()
+        if self.profile is not None:
+            ret = self.profile.convert(value, self.stats)
+        else:
+            converter = self.parse(value)
+            ret = None if converter is None else getattr(converter,
+                                                         self.property_name)
+        if memo is not None:
+            memo.put(value, NOT_A_BARCODE if ret is None else ret)
+        return ret
+
+    def parse_batch(self, values) -> list:
+        """
+        Returns a list of BarcodeConverter instances (or None) for the
+        values.
+        :param values: An iterable of barcode values.
+        """
+        return self._timed(self.parse, values)
+
+    def convert_batch(self, values) -> list:
+        """
+        Returns a list of converted values (or None) for the values.
+        :param values: An iterable of barcode values.
+        """
+        return self._timed(self.convert, values)
+
+    def _timed(self, function, values):
+        if self.stats is None:
+            return [function(value) for value in values]
+        start = time.perf_counter()
+        ret = [function(value) for value in values]
+        self.stats.record_converted(
+            sum(1 for item in ret if item is not None))
+        self.stats.add_time('convert', time.perf_counter() - start)
+        return ret
+
+
+def convert_barcodes(values, company_prefix_length: int = 6,
+                     serial_number_length: int = 12,
+                     property_name: str = 'epc_urn',
+                     stats=None,
+                     registry: PatternRegistry = None,
+                     memo_size: int = DEFAULT_MEMO_SIZE,
+                     profile=None) -> list:
+    """
+    Converts a list of barcode values.  See `BarcodeBatchConverter` for the
+    parameters.
+    :return: A list with the converted value, or None, for each value.
+    """
+    return BarcodeBatchConverter(
+        company_prefix_length, serial_number_length, property_name, stats,
+        registry, memo_size, profile
+    ).convert_batch(values)
+
+
+def convert_urns(values, barcode_format: BarcodeFormat = None) -> list:
+    """
+    Converts a list of EPC URN values to barcodes.
+    :param values: An iterable of URN values.
+    :param barcode_format: A `gs123.conversion.BarcodeFormat`.  Default is
+    01...21... with no parenthesis.
+    :return: A list with the barcode, or None, for each value.
+    """
+    barcode_format = barcode_format or BarcodeFormat()
+    ret = []
+    for value in values:
+        try:
+            ret.append(barcode_format.get_barcode_value(URNConverter(value)))
+        except (URNNotValid, TypeError):
+            ret.append(None)
+    return ret
+
+
+def convert_to_digital_links(values, domain: str = DEFAULT_DOMAIN,
+                             stats=None) -> list:
+    """
+    Converts a list of barcodes, Digital Link URIs (for example to move
+    them to another resolver domain) and EPC URNs, in any mix, to GS1
+    Digital Link URIs.
+    :param values: An iterable of values.
+    :param domain: The resolver domain.  Default is id.gs1.org.
+    :param stats: An optional `gs123.stats.ConversionStats` instance.
+    :return: A list with the URI, or None, for each value.
+    """
+    # fails for an invalid domain before any value is converted
+    get_template(domain)
+    ret = []
+    append = ret.append
+    for value in values:
+        try:
+            if value and value.startswith(URN_PREFIX):
+                append(URNConverter(value).get_digital_link(domain))
+            else:
+                # the company prefix length does not change the URI
+                append(BarcodeConverter(value, 6, stats=stats)
+                       .get_digital_link(domain))
+        except (BarcodeConverter.BarcodeNotValid, URNNotValid):
+            append(None)
+    return ret
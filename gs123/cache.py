@@ -0,0 +1,244 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+A persistent, size bounded conversion cache kept in a local sqlite
+database.  Whole documents are stored under a hash of their content and the
+converter configuration so a resubmitted document is returned without
+being converted again.  Individual values can be stored as well so the
+identifiers that keep coming back are never converted twice.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_DOCUMENT_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_VALUES = 1000000
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS documents ('
+    'key TEXT PRIMARY KEY, output BLOB NOT NULL, size INTEGER NOT NULL, '
+    'accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed)',
+    'CREATE TABLE IF NOT EXISTS value_cache ('
+    'key TEXT PRIMARY KEY, output TEXT NOT NULL, accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS value_cache_accessed '
+    'ON value_cache (accessed)',
+)
+
+# sqlite's default limit on the number of parameters in a statement is 999
+_LOOKUP_BATCH_SIZE = 500
+
+
+class ConversionCache:
+    """
+    Stores converted documents and values in a sqlite database.  The least
+    recently used documents are evicted once their total size exceeds
+    `max_document_bytes` and the least recently used values once there are
+    more than `max_values` of them.  Counting the values is a scan of the
+    table, so they are counted once for every hundredth of `max_values`
+    values stored and there can be that many more than `max_values`
+    in between.
+
+    The `config` passed to each method identifies the converter settings
+    (for example the step class, company prefix length and barcode format)
+    so that the same input converted with different settings is stored
+    separately.  It can be any value with a stable `repr`, usually a tuple.
+
+    A cache can be shared between threads; its one connection is used
+    under a lock.
+    """
+
+    def __init__(self, path: str,
+                 max_document_bytes: int = DEFAULT_MAX_DOCUMENT_BYTES,
+                 max_values: int = DEFAULT_MAX_VALUES):
+        """
+        :param path: The database file.  It is created if it does not exist.
+        :param max_document_bytes: The maximum total size of the stored
+        documents.
+        :param max_values: The maximum number of stored values.
+        """
+        self.path = path
+        self.max_document_bytes = max_document_bytes
+        self.max_values = max_values
+        # the number of values stored since they were last counted
+        self._values_put = 0
+        self._value_count_interval = max(1, max_values // 100)
+        self._connection = sqlite3.connect(path, timeout=30,
+                                           check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+
+    def get_document(self, data, config):
+        """
+        Returns the stored output for the document or None.
+        :param data: The input document (str or bytes).
+        :param config: The converter configuration.
+        :return: The output as it was stored (str or bytes) or None.
+        """
+        key = document_key(data, config)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT output FROM documents WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute(
+                    'UPDATE documents SET accessed = ? WHERE key = ?',
+                    (time.time(), key)
+                )
+        return row[0]
+
+    def put_document(self, data, config, output) -> None:
+        """
+        Stores the output for the document and evicts the least recently
+        used documents if the cache is over its size limit.
+        :param data: The input document (str or bytes).
+        :param config: The converter configuration.
+        :param output: The converted document (str or bytes).
+        :return: None
+        """
+        size = len(output.encode('utf-8') if isinstance(output, str)
+                   else output)
+        if size > self.max_document_bytes:
+            return
+        key = document_key(data, config)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO documents (key, output, size, '
+                'accessed) VALUES (?, ?, ?, ?)',
+                (key, output, size, time.time())
+            )
+            self._evict_documents()
+
+    def get_values(self, values, config) -> dict:
+        """
+        Returns the stored outputs for the values.
+        :param values: An iterable of input values.
+        :param config: The converter configuration.
+        :return: A dictionary of the values that were found and their
+        outputs.
+        """
+        keys = {value_key(value, config): value for value in set(values)}
+        found = {}
+        key_list = list(keys)
+        with self._lock:
+            for index in range(0, len(key_list), _LOOKUP_BATCH_SIZE):
+                batch = key_list[index:index + _LOOKUP_BATCH_SIZE]
+                rows = self._connection.execute(
+                    'SELECT key, output FROM value_cache WHERE key IN (%s)'
+                    % ','.join('?' * len(batch)), batch
+                ).fetchall()
+                for key, output in rows:
+                    found[keys[key]] = output
+            if found:
+                now = time.time()
+                with self._connection:
+                    self._connection.executemany(
+                        'UPDATE value_cache SET accessed = ? WHERE key = ?',
+                        ((now, value_key(value, config)) for value in found)
+                    )
+        return found
+
+    def put_values(self, outputs: dict, config) -> None:
+        """
+        Stores the output for each value and evicts the least recently used
+        values if there are too many.
+        :param outputs: A dictionary of input values and their outputs.
+        :param config: The converter configuration.
+        :return: None
+        """
+        if not outputs:
+            return
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO value_cache (key, output, accessed) '
+                'VALUES (?, ?, ?)',
+                ((value_key(value, config), output, now)
+                 for value, output in outputs.items())
+            )
+            self._values_put += len(outputs)
+            self._evict_values()
+
+    def close(self) -> None:
+        """
+        Closes the database connection.
+        :return: None
+        """
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _evict_documents(self):
+        total = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM documents'
+        ).fetchone()[0]
+        if total <= self.max_document_bytes:
+            return
+        evicted = []
+        for key, size in self._connection.execute(
+            'SELECT key, size FROM documents ORDER BY accessed'
+        ).fetchall():
+            evicted.append((key,))
+            total -= size
+            if total <= self.max_document_bytes:
+                break
+        self._connection.executemany('DELETE FROM documents WHERE key = ?',
+                                     evicted)
+
+    def _evict_values(self):
+        if self._values_put < self._value_count_interval:
+            return
+        self._values_put = 0
+        count = self._connection.execute(
+            'SELECT COUNT(*) FROM value_cache'
+        ).fetchone()[0]
+        if count > self.max_values:
+            self._connection.execute(
+                'DELETE FROM value_cache WHERE key IN (SELECT key FROM '
+                'value_cache ORDER BY accessed LIMIT ?)',
+                (count - self.max_values,)
+            )
+
+
+def document_key(data, config) -> str:
+    """
+    Returns the cache key for a document: a SHA-256 hash of the
+    configuration and the content.
+    :param data: The document (str or bytes).
+    :param config: The converter configuration.
+    """
+    digest = hashlib.sha256(repr(config).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(data.encode('utf-8') if isinstance(data, str) else data)
+    return digest.hexdigest()
+
+
+def value_key(value, config) -> str:
+    """
+    Returns the cache key for a single value.
+    :param value: The input value.
+    :param config: The converter configuration.
+    """
+    return '%r\0%s' % (config, value)
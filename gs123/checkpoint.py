@@ -0,0 +1,136 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Sidecar checkpoint files for resumable file conversions.
+"""
+import json
+import os
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+# the number of records (or JSON tokens or XML events) between checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 100000
+
+
+class Checkpoint:
+    """
+    Records how far a file conversion has got (the input and output
+    offsets plus whatever state the converter needs to carry on) in a small
+    JSON file next to the output.  A checkpoint is only used to resume a
+    conversion of the same, unmodified input file with the same
+    configuration; anything else starts the conversion again from scratch.
+    """
+
+    def __init__(self, input_path: str, output_path: str, config,
+                 path: str = None):
+        """
+        :param input_path: The file being converted.
+        :param output_path: The file being written.
+        :param config: A JSON serializable description of the conversion
+        settings (a list or dictionary).
+        :param path: The checkpoint file.  Default is the output path with
+        a .checkpoint suffix.
+        """
+        self.input_path = input_path
+        self.output_path = output_path
+        self.config = json.loads(json.dumps(config))
+        self.path = path or output_path + CHECKPOINT_SUFFIX
+
+    def load(self):
+        """
+        Returns the saved state or None if there is no usable checkpoint.
+        The state always has an output_offset.
+        """
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        state = saved.get('state') or {}
+        if saved.get('input') != self._input_identity() or \
+                saved.get('config') != self.config or \
+                'output_offset' not in state:
+            return None
+        try:
+            if os.path.getsize(self.output_path) < state['output_offset']:
+                return None
+        except OSError:
+            return None
+        return state
+
+    def open_output(self, state=None):
+        """
+        Opens the output file for binary writing.  When resuming from a
+        state returned by `load` the output is truncated to the recorded
+        offset so anything written after the checkpoint is discarded.
+        :param state: The state to resume from or None to start over.
+        :return: A binary file object.
+        """
+        if state is None:
+            return open(self.output_path, 'wb+')
+        output_file = open(self.output_path, 'r+b')
+        output_file.truncate(state['output_offset'])
+        output_file.seek(state['output_offset'])
+        return output_file
+
+    def commit(self, output_file, **state) -> None:
+        """
+        Flushes the binary output file to disk and saves a checkpoint at its
+        current position.
+        :param output_file: The binary file object returned by
+        `open_output`.
+        :param state: Other JSON serializable values to save.
+        :return: None
+        """
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        self.save(output_file.tell(), **state)
+
+    def save(self, output_offset: int, **state) -> None:
+        """
+        Writes the state to the checkpoint file.  The file is replaced
+        atomically so a crash while saving leaves the previous checkpoint
+        in place.
+        :param output_offset: The number of bytes of output written so far
+        (and flushed).
+        :param state: Other JSON serializable values, for example the input
+        offset.
+        :return: None
+        """
+        state['output_offset'] = output_offset
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({
+                'input': self._input_identity(),
+                'config': self.config,
+                'state': state
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.path)
+
+    def remove(self) -> None:
+        """
+        Deletes the checkpoint file once the conversion is complete.
+        :return: None
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _input_identity(self):
+        info = os.stat(self.input_path)
+        return [info.st_size, info.st_mtime_ns]
@@ -13,12 +13,34 @@
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
 
-import re
+from collections import namedtuple
 from gs123 import regex
 from gs123.check_digit import calculate_check_digit
+from gs123.digital_link import DEFAULT_DOMAIN, get_template
+from gs123.elements import CHARSET_82
 
 FNC1 = '\x1D'
 
+# the characters of GS1 AI encodable character set 82 that are
+# percent-escaped in the serial number of an EPC URN
+_URN_ESCAPES = str.maketrans({
+    '"': '%22', '%': '%25', '&': '%26', '/': '%2F', '<': '%3C', '>': '%3E',
+    '?': '%3F'
+})
+
+
+def escape_urn_serial(serial_number: str) -> str:
+    """
+    Returns a serial number as it is written in an EPC URN: the characters
+    " % & / < > and ? are percent-escaped, the rest of character set 82 is
+    kept as it is.
+    :param serial_number: A serial number with only set 82 characters.
+    :return: The escaped serial number.
+    """
+    if serial_number.isalnum():
+        return serial_number
+    return serial_number.translate(_URN_ESCAPES)
+
 
 class BarcodeConverter:
     """
@@ -26,8 +48,11 @@ class BarcodeConverter:
     """
 
     def __init__(self, barcode_val: str,
-                 company_prefix_length: int,
-                 max_serial_number_length: int = 14):
+                 company_prefix_length: int = None,
+                 max_serial_number_length: int = 14,
+                 stats=None,
+                 registry: regex.PatternRegistry = None,
+                 profile=None):
         """
         Initializes a new conversion class from a serialized GTIN in either
         01...21...17...10 or (01)...(21)...(17...(10) or 01...21 or
@@ -42,7 +67,67 @@ class BarcodeConverter:
         :param max_serial_number_length: The length of the serial number if
         the app identifiers do not have parenthesis and there are 17 and 10
         fields after the serial number field.
+        :param stats: An optional `gs123.stats.ConversionStats` instance
+        that matches and rejections will be reported to.
+        :param registry: An optional `gs123.regex.PatternRegistry` used to
+        order (or pin) the patterns the barcode is matched against.
+        :param profile: An optional `gs123.profile.ConversionProfile`.  If
+        supplied its lengths and precompiled patterns are used instead of
+        the length parameters and the registry.
+        """
+        if profile is not None:
+            company_prefix_length = profile.company_prefix_length
+            max_serial_number_length = profile.serial_number_length
+        elif company_prefix_length is None:
+            raise TypeError('A company prefix length or a profile is '
+                            'required.')
+        self._initialize(company_prefix_length, max_serial_number_length)
+        if not barcode_val:
+            if stats is not None:
+                stats.record_rejection()
+            raise self.BarcodeNotValid('No barcode was present.')
+        if profile is not None:
+            match = profile.match(barcode_val, stats)
+        else:
+            match = regex.match_pattern(barcode_val,
+                                        max_serial_number_length, stats,
+                                        registry)
+        if match:
+            self._populate(match)
+        else:
+            if stats is not None:
+                stats.record_rejection()
+            raise self.BarcodeNotValid(
+                'The barcode %s was not valid against the regular expressions '
+                'available in the module.' % barcode_val
+            )
+
+    @classmethod
+    def from_match(cls, match, company_prefix_length: int,
+                   max_serial_number_length: int = 14):
+        """
+        Creates a converter from a value that has already been matched or
+        parsed, without matching it again.  This is how the converter is
+        built on a `gs123.elements.ElementString`: the constructor keeps
+        matching barcodes against the regular expressions, as they also
+        accept parenthesis around the app identifiers and fixed length
+        serial numbers followed by 17 and 10 without FNC1, which are not
+        element strings.
+        :param match: A `gs123.regex` match, a
+        `gs123.elements.ElementString` or any object with a `groupdict`
+        method that returns the same groups, for example a
+        `gs123.scanner.ScannedBarcode`.
+        :param company_prefix_length: The company prefix.
+        :param max_serial_number_length: See `__init__`.
+        :return: A new instance of the class.
         """
+        converter = cls.__new__(cls)
+        converter._initialize(company_prefix_length,
+                              max_serial_number_length)
+        converter._populate(match)
+        return converter
+
+    def _initialize(self, company_prefix_length, max_serial_number_length):
         self._company_prefix_length = company_prefix_length
         self._max_serial_number_length = max_serial_number_length
         self._gtin14 = None
@@ -59,16 +144,6 @@ class BarcodeConverter:
         self._sgtin_pattern = 'urn:epc:id:sgtin:{0}.{1}{2}.{3}'
         self._sscc_pattern = 'urn:epc:id:sscc:{0}.{1}{2}'
         self._is_gtin = False
-        if not barcode_val:
-            raise self.BarcodeNotValid('No barcode was present.')
-        match = regex.match_pattern(barcode_val, max_serial_number_length)
-        if match:
-            self._populate(match)
-        else:
-            raise self.BarcodeNotValid(
-                'The barcode %s was not valid against the regular expressions '
-                'available in the module.' % barcode_val
-            )
 
     @property
     def sscc18(self):
@@ -135,14 +210,14 @@ class BarcodeConverter:
 
     @property
     def indicator_digit(self) -> str:
-        return self._gtin14[0]
+        return self.gtin14[0]
 
     @property
     def item_reference(self) -> str:
         """
         The item reference number as taken from the barcode value.
         """
-        return self._gtin14[self._company_prefix_length + 1:13]
+        return self.gtin14[self._company_prefix_length + 1:13]
 
     @property
     def company_prefix(self) -> str:
@@ -150,10 +225,11 @@ class BarcodeConverter:
         The company prefix as taken from the barcode value.
         :return: String
         """
-        if self._gtin14:
-            ret = self._gtin14[1:self._company_prefix_length + 1]
+        gtin14 = self.gtin14
+        if gtin14:
+            ret = gtin14[1:self._company_prefix_length + 1]
         else:
-            ret = self._sscc18[1:self._company_prefix_length + 1]
+            ret = self.sscc18[1:self._company_prefix_length + 1]
         return ret
 
     @property
@@ -162,10 +238,11 @@ class BarcodeConverter:
         The original check digit supplied in the barcode.
         :return:
         """
-        if self._gtin14:
-            ret = self._gtin14[13]
+        gtin14 = self.gtin14
+        if gtin14:
+            ret = gtin14[13]
         else:
-            ret = self._sscc18[17]
+            ret = self.sscc18[17]
         return ret
 
     @property
@@ -174,12 +251,12 @@ class BarcodeConverter:
         Returns a GS1 EPC URN value for the given barcode.
         :return: String GS1 EPC URN for the barcode.
         """
-        if self._gtin14:
+        if self.gtin14:
             ret = self._sgtin_pattern.format(
                 self.company_prefix,
                 self.indicator_digit,
                 self.item_reference,
-                self.serial_number
+                escape_urn_serial(self.serial_number)
             )
         else:
             ret = self._sscc_pattern.format(
@@ -197,12 +274,12 @@ class BarcodeConverter:
           :return: String GS1 EPC URN for the Barcode
         """
 
-        if self._gtin14:
+        if self.gtin14:
             ret = self._sgtin_pattern.format(
                 self.company_prefix,
                 self.indicator_digit,
                 self.item_reference,
-                self.padded_serial_number
+                escape_urn_serial(self.padded_serial_number)
             )
         else:
             return self.epc_urn
@@ -221,9 +298,34 @@ class BarcodeConverter:
             self.company_prefix,
             self.indicator_digit,
             self.item_reference,
-            self.padded_serial_number
+            escape_urn_serial(self.padded_serial_number)
         )
 
+    @property
+    def digital_link(self) -> str:
+        """
+        Returns the GS1 Digital Link URI of the barcode on id.gs1.org.  Use
+        `get_digital_link` for another resolver domain.
+        :return: The URI as a string.
+        """
+        return self.get_digital_link()
+
+    def get_digital_link(self, domain: str = DEFAULT_DOMAIN) -> str:
+        """
+        Returns the GS1 Digital Link URI of the barcode.  The serial number
+        is kept as it is in the barcode and the expiration date and lot,
+        if any, are added as query parameters.
+        :param domain: The resolver domain, for example
+        https://example.com
+        :return: The URI as a string.
+        """
+        if self.gtin14:
+            return get_template(domain).format(
+                self.gtin14, self.serial_number_field, self.lot,
+                self.expiration_date
+            )
+        return get_template(domain).format(sscc18=self.sscc18)
+
     def _populate(self, match) -> None:
         """
         If there is an inbound barcode that produces a match,
@@ -235,13 +337,25 @@ class BarcodeConverter:
         group_dict = match.groupdict()
         self._gtin14 = group_dict.get('gtin14')
         if self.gtin14:
-            self._serial_number = str(
-                group_dict['serial_number'].strip('\x1d'))
+            serial_number = group_dict.get('serial_number')
+            if not serial_number:
+                raise self.BarcodeNotValid(
+                    'The GTIN %s has no serial number.' % self.gtin14)
+            self._serial_number = str(serial_number.strip('\x1d'))
+            if not (self._serial_number.isalnum() and
+                    self._serial_number.isascii()) and \
+                    not CHARSET_82.issuperset(self._serial_number):
+                raise self.BarcodeNotValid(
+                    'The serial number %s has characters an EPC URN can '
+                    'not encode.' % self._serial_number)
             self._padded_serial_number = self._serial_number
             self._expiration_date = group_dict.get('expiration_date')
             self._lot = group_dict.get('lot')
         else:  # this means we have an SSCC
-            self._sscc18 = group_dict['sscc18']
+            self._sscc18 = group_dict.get('sscc18')
+            if not self._sscc18:
+                raise self.BarcodeNotValid(
+                    'The barcode is neither a serialized GTIN nor an SSCC.')
             self._serial_number = self._sscc18[
                                   1 + int(self._company_prefix_length):17]
             self._extension_digit = self._sscc18[0]
@@ -250,6 +364,90 @@ class BarcodeConverter:
         pass
 
 
+class LazyBarcodeConverter(BarcodeConverter):
+    """
+    A `BarcodeConverter` that only matches the barcode when it is created.
+    Each field is extracted from the match the first time its property is
+    read and remembered after that, so checking that values are valid or
+    reading a single property from each of a large number of values does
+    no more work than it needs to.  Takes the same parameters as
+    `BarcodeConverter`.
+    """
+
+    def _populate(self, match) -> None:
+        """
+        Stores the match.  The fields are extracted on demand.
+        :param match: The Match object.
+        :return: None
+        """
+        self._match = match
+        self._values = {}
+
+    def _group(self, name):
+        # only the group asked for is read from the match
+        try:
+            return self._match.group(name)
+        except IndexError:
+            return None
+
+    @property
+    def gtin14(self) -> str:
+        values = self._values
+        if 'gtin14' not in values:
+            values['gtin14'] = self._group('gtin14')
+        return values['gtin14']
+
+    @property
+    def sscc18(self):
+        values = self._values
+        if 'sscc18' not in values:
+            values['sscc18'] = None if self.gtin14 else \
+                self._group('sscc18')
+        return values['sscc18']
+
+    @property
+    def extension_digit(self):
+        sscc18 = self.sscc18
+        return sscc18[0] if sscc18 else None
+
+    @property
+    def serial_number_field(self) -> str:
+        values = self._values
+        if 'serial_number_field' not in values:
+            if self.gtin14:
+                ret = str(self._group('serial_number').strip('\x1d'))
+            else:
+                ret = self.sscc18[1 + int(self._company_prefix_length):17]
+            values['serial_number_field'] = ret
+        return values['serial_number_field']
+
+    @property
+    def serial_number(self) -> str:
+        values = self._values
+        if 'serial_number' not in values:
+            values['serial_number'] = self.serial_number_field.lstrip('0')
+        return values['serial_number']
+
+    @property
+    def padded_serial_number(self) -> str:
+        return self.serial_number_field if self.gtin14 else None
+
+    @property
+    def lot(self) -> str:
+        return self._group('lot') if self.gtin14 else None
+
+    @property
+    def expiration_date(self) -> str:
+        return self._group('expiration_date') if self.gtin14 else None
+
+    @property
+    def epc_urn(self) -> str:
+        values = self._values
+        if 'epc_urn' not in values:
+            values['epc_urn'] = super().epc_urn
+        return values['epc_urn']
+
+
 class URNConverter(BarcodeConverter):
     """
     Converts an EPC urn to a valid barcode.
@@ -272,6 +470,12 @@ class URNConverter(BarcodeConverter):
             )
             if match:
                 self._populate(match, urn_value)
+                break
+        else:
+            raise URNNotValid(
+                'The urn %s was not valid against the regular expressions '
+                'available in the module.' % urn_value
+            )
 
     def _populate(self, match, urn_value: str):
         """
@@ -366,6 +570,21 @@ class URNConverter(BarcodeConverter):
         else:
             return self._get_sscc_barcode_val(parenthesis=parenthesis)
 
+    def get_digital_link(self, domain: str = DEFAULT_DOMAIN, lot=None,
+                         expiration=None) -> str:
+        """
+        Returns the GS1 Digital Link URI of the EPC.
+        :param domain: The resolver domain.  Default is id.gs1.org.
+        :param lot: An optional lot to add as a query parameter.
+        :param expiration: An optional YYMMDD expiration date to add as a
+        query parameter.
+        :return: The URI as a string.
+        """
+        if self.is_sgtin:
+            return get_template(domain).format(
+                self.gtin14, self.serial_number_field, lot, expiration)
+        return get_template(domain).format(sscc18=self.sscc18)
+
     def _get_gtin_barcode_val(self, lot=None, expiration=None,
                               insert_control_char=False, parenthesis=False,
                               serial_number_padding=False,
@@ -409,6 +628,64 @@ class URNConverter(BarcodeConverter):
         return format_string % calculate_check_digit(barcode)
 
 
+class BarcodeFormat(namedtuple('BarcodeFormat', [
+    'lot', 'expiration', 'insert_control_char', 'parenthesis',
+    'serial_number_padding', 'serial_number_length', 'padding_character'
+])):
+    """
+    An immutable set of `URNConverter.get_barcode_value` arguments.  Build
+    it once and use it to format every URN in a batch or document the same
+    way.
+    """
+    __slots__ = ()
+
+    def __new__(cls, lot=None, expiration=None, insert_control_char=False,
+                parenthesis=False, serial_number_padding=False,
+                serial_number_length=12, padding_character='0'):
+        return super().__new__(
+            cls, lot, expiration, insert_control_char, parenthesis,
+            serial_number_padding, serial_number_length, padding_character
+        )
+
+    def get_barcode_value(self, urn_value) -> str:
+        """
+        Converts a URN value (or an existing `URNConverter`) to a barcode
+        using this format.
+        :param urn_value: The URN string or URNConverter instance.
+        :return: The barcode value.
+        """
+        if not isinstance(urn_value, URNConverter):
+            urn_value = URNConverter(urn_value)
+        return urn_value.get_barcode_value(*self)
+
+
+class DigitalLinkFormat(namedtuple('DigitalLinkFormat', [
+    'domain', 'lot', 'expiration'
+])):
+    """
+    The `URNConverter.get_digital_link` arguments.  It can be used anywhere
+    a `BarcodeFormat` is accepted to convert URNs to Digital Link URIs
+    instead of barcodes.
+    """
+    __slots__ = ()
+
+    def __new__(cls, domain=DEFAULT_DOMAIN, lot=None, expiration=None):
+        # fails early for a domain that is not an http(s) URI
+        get_template(domain)
+        return super().__new__(cls, domain, lot, expiration)
+
+    def get_barcode_value(self, urn_value) -> str:
+        """
+        Converts a URN value (or an existing `URNConverter`) to a Digital
+        Link URI.
+        :param urn_value: The URN string or URNConverter instance.
+        :return: The URI.
+        """
+        if not isinstance(urn_value, URNConverter):
+            urn_value = URNConverter(urn_value)
+        return urn_value.get_digital_link(*self)
+
+
 class URNNotValid(Exception):
     """
     Raised by instances when the inbound urn value is malformed.
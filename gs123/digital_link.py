@@ -0,0 +1,210 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Parsing and generation of GS1 Digital Link URIs such as
+https://id.gs1.org/01/00614141123452/21/ABC123?17=251231&10=LOT7
+
+A URI is parsed into the element string it stands for, so the result is a
+`gs123.elements.ElementString` that `BarcodeConverter.from_match` and the
+rest of the module accept like any other parsed barcode.  Any domain (and
+any path in front of the primary key) is accepted when parsing; URIs are
+generated with a `DigitalLinkTemplate` for a resolver domain.
+"""
+from gs123.elements import CHARSET_82, FIXED_LENGTHS, FNC1, \
+    parse_element_string
+
+DEFAULT_DOMAIN = 'https://id.gs1.org'
+
+# the application identifiers that can start a Digital Link path
+PRIMARY_KEYS = frozenset((
+    '00', '01', '253', '255', '401', '402', '414', '417', '8003', '8004',
+    '8006', '8010', '8013', '8017', '8018'
+))
+
+# the short names Digital Link allows in place of some path identifiers
+SHORT_NAMES = {
+    'gtin': '01', 'itip': '8006', 'cpv': '22', 'lot': '10', 'ser': '21',
+    'sscc': '00', 'gln': '414', 'grai': '8003', 'giai': '8004',
+}
+
+# the characters that never need percent-encoding in a path segment or
+# query value
+_UNRESERVED = frozenset(
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~'
+)
+
+_templates = {}
+
+
+def is_digital_link(value) -> bool:
+    """
+    Returns True if the value looks like an http or https URI.
+    """
+    return value.__class__ is str and (value.startswith('https://') or
+                                       value.startswith('http://'))
+
+
+def parse_digital_link(uri: str):
+    """
+    Parses a GS1 Digital Link URI.  Path segments in front of the primary
+    key (used by some resolvers) are skipped, query parameters that are
+    not application identifiers (such as linkType) are ignored and a
+    GTIN of 8, 12 or 13 digits is padded to 14.  Percent-encoded values
+    are decoded and must then only have characters of GS1 AI encodable
+    character set 82.
+    :param uri: The URI.
+    :return: A `gs123.elements.ElementString` of the element string the
+    URI stands for, or None if it is not a valid Digital Link URI.
+    """
+    if not is_digital_link(uri):
+        return None
+    path_start = uri.find('/', uri.find('//') + 2)
+    if path_start == -1:
+        return None
+    end = uri.find('#', path_start)
+    if end == -1:
+        end = len(uri)
+    query_start = uri.find('?', path_start, end)
+    segments = uri[path_start + 1:end if query_start == -1
+                   else query_start].split('/')
+    for start, segment in enumerate(segments):
+        if SHORT_NAMES.get(segment, segment) in PRIMARY_KEYS:
+            break
+    else:
+        return None
+    if (len(segments) - start) % 2:
+        # an identifier without a value
+        return None
+    elements = [
+        (SHORT_NAMES.get(segments[index], segments[index]),
+         segments[index + 1])
+        for index in range(start, len(segments), 2)
+    ]
+    if query_start != -1:
+        for parameter in uri[query_start + 1:end].split('&'):
+            ai, _, value = parameter.partition('=')
+            if ai.isdigit():
+                elements.append((ai, value))
+    return _element_string(elements)
+
+
+def match_digital_link(uri: str):
+    """
+    Parses a GS1 Digital Link URI for conversion.  A valid URI that does
+    not identify an SSCC or a serialized GTIN (a GTIN without a serial
+    number, a GLN, a GRAI...) cannot be converted to an EPC URN and is
+    treated like any other value that does not match.
+    :param uri: The URI.
+    :return: A `gs123.elements.ElementString` or None.
+    """
+    parsed = parse_digital_link(uri)
+    if parsed is None or not parsed.convertible:
+        return None
+    return parsed
+
+
+def _element_string(elements):
+    """
+    Joins the (application identifier, value) tuples into an element
+    string and parses it, which validates the identifiers and values.
+    """
+    parts = []
+    ais = []
+    last = len(elements) - 1
+    for index, (ai, value) in enumerate(elements):
+        if '%' in value:
+            # only imported for the values that need it
+            from urllib.parse import unquote
+            value = unquote(value)
+        if ai == '01' and len(value) in (8, 12, 13):
+            value = value.zfill(14)
+        # FNC1 is not in the character set
+        if not value or not CHARSET_82.issuperset(value):
+            return None
+        parts.append(ai)
+        parts.append(value)
+        if index < last and ai[:2] not in FIXED_LENGTHS:
+            parts.append(FNC1)
+        ais.append(ai)
+    parsed = parse_element_string(''.join(parts))
+    # an identifier the parser reads differently is not valid
+    if parsed is None or list(parsed) != ais:
+        return None
+    return parsed
+
+
+def _quote(value):
+    if all(character in _UNRESERVED for character in value):
+        return value
+    from urllib.parse import quote
+    return quote(value, safe='')
+
+
+class DigitalLinkTemplate:
+    """
+    Generates Digital Link URIs for one resolver domain.  The fixed parts
+    of the URIs are built once; use `get_template` to share templates.
+    """
+    __slots__ = ('domain', '_gtin', '_sscc')
+
+    def __init__(self, domain: str = DEFAULT_DOMAIN):
+        """
+        :param domain: The scheme, host and (optionally) path the
+        identifiers are appended to, for example https://example.com/dl
+        """
+        if not is_digital_link(domain):
+            raise ValueError('The Digital Link domain %s must start with '
+                             'http:// or https://.' % domain)
+        self.domain = domain.rstrip('/')
+        self._gtin = self.domain + '/01/%s/21/%s'
+        self._sscc = self.domain + '/00/%s'
+
+    def format(self, gtin14: str = None, serial_number: str = None,
+               lot: str = None, expiration_date: str = None,
+               sscc18: str = None) -> str:
+        """
+        Returns the URI of a serialized GTIN (with the expiration date and
+        lot as query parameters) or of an SSCC.
+        :param gtin14: The GTIN-14.
+        :param serial_number: The serial number, as it is in the barcode.
+        :param lot: An optional lot.
+        :param expiration_date: An optional YYMMDD expiration date.
+        :param sscc18: The SSCC, used if there is no GTIN.
+        """
+        if not gtin14:
+            return self._sscc % sscc18
+        ret = self._gtin % (gtin14, _quote(serial_number))
+        if expiration_date and lot:
+            return '%s?17=%s&10=%s' % (ret, expiration_date, _quote(lot))
+        elif expiration_date:
+            return '%s?17=%s' % (ret, expiration_date)
+        elif lot:
+            return '%s?10=%s' % (ret, _quote(lot))
+        return ret
+
+    def __repr__(self):
+        return 'DigitalLinkTemplate(%r)' % self.domain
+
+
+def get_template(domain: str = DEFAULT_DOMAIN) -> DigitalLinkTemplate:
+    """
+    Returns the shared template for a domain.
+    """
+    template = _templates.get(domain)
+    if template is None:
+        # setdefault is atomic: if two threads build a template for a new
+        # domain at once, both return the one stored first
+        template = _templates.setdefault(domain, DigitalLinkTemplate(domain))
+    return template
@@ -0,0 +1,306 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+A general parser for GS1 element strings (application identifiers and
+their values with FNC1, sent as GS, after the variable length values).
+The parse result only records where each value starts and ends in the
+parsed str or bytes buffer; a value is sliced out of the buffer when it is
+asked for, so parsing millions of barcodes for one or two of their fields
+does not create a string for every field.
+"""
+FNC1 = '\x1d'
+
+# the number of digits in an application identifier by its first two
+# digits, where it is not two
+_AI_LENGTHS = dict.fromkeys(
+    ('23', '24', '25', '40', '41', '42', '71'), 3
+)
+_AI_LENGTHS.update(dict.fromkeys(
+    ('31', '32', '33', '34', '35', '36', '39', '43', '70', '72', '80', '81',
+     '82'), 4
+))
+
+# the data length of the application identifiers with a predefined length
+# (which are not followed by FNC1), by their first two digits
+FIXED_LENGTHS = {
+    '00': 18, '01': 14, '02': 14, '03': 14, '04': 16, '11': 6, '12': 6,
+    '13': 6, '14': 6, '15': 6, '16': 6, '17': 6, '18': 6, '19': 6, '20': 2,
+    '31': 6, '32': 6, '33': 6, '34': 6, '35': 6, '36': 6, '41': 13,
+}
+
+# the maximum data length of the variable length application identifiers
+# that are checked, any other may be up to 90 characters
+_MAX_LENGTHS = {'10': 20, '21': 20, '22': 20, '30': 8, '37': 8}
+_MAX_LENGTH = 90
+
+# GS1 AI encodable character set 82, the characters application
+# identifier values are made of
+CHARSET_82 = frozenset(
+    '!"%&\'()*+,-./0123456789:;<=>?ABCDEFGHIJKLMNOPQRSTUVWXYZ_'
+    'abcdefghijklmnopqrstuvwxyz'
+)
+
+# the names `ElementString.group` knows, with their application
+# identifier.  A three digit identifier stands for all four digit ones
+# that start with it (310 is 3100 to 3105, the net weight in kg with 0 to
+# 5 decimal places).  The first five are the groups of the `gs123.regex`
+# patterns.
+FIELD_NAMES = {
+    'gtin14': '01',
+    'serial_number': '21',
+    'expiration_date': '17',
+    'lot': '10',
+    'sscc18': '00',
+    'production_date': '11',
+    'packaging_date': '13',
+    'best_before_date': '15',
+    'variable_count': '30',
+    'net_weight_kg': '310',
+    'grai': '8003',
+}
+
+
+class ElementString:
+    """
+    The result of `parse_element_string`: the parsed buffer and a flat
+    tuple of (application identifier, start, end) offsets, one triple per
+    element in the order they were in the buffer.  Values are read from
+    the buffer when they are asked for and bytes are decoded as latin-1.
+
+    `group` and `groupdict` return the fields by the names in FIELD_NAMES,
+    so an instance can be passed to `BarcodeConverter.from_match` like a
+    regular expression match.
+    """
+    __slots__ = ('data', '_offsets')
+
+    def __init__(self, data, offsets: tuple):
+        """
+        :param data: The str or bytes buffer that was parsed.
+        :param offsets: A flat tuple of application identifier, start and
+        end offset triples.
+        """
+        self.data = data
+        self._offsets = offsets
+
+    @property
+    def offsets(self) -> list:
+        """
+        A list of (application identifier, start, end) tuples.
+        """
+        offsets = self._offsets
+        return [offsets[index:index + 3]
+                for index in range(0, len(offsets), 3)]
+
+    def span(self, application_identifier: str):
+        """
+        Returns the (start, end) offsets of a value in the buffer or None
+        if the application identifier is not in the element string.
+        """
+        index = self._find(application_identifier)
+        if index < 0:
+            return None
+        return self._offsets[index + 1], self._offsets[index + 2]
+
+    def get(self, application_identifier: str, default=None):
+        """
+        Returns the value of an application identifier.
+        :param application_identifier: For example 01 or 3103.
+        :param default: Returned if the identifier is not in the element
+        string.
+        """
+        index = self._find(application_identifier)
+        if index < 0:
+            return default
+        return self._value(index)
+
+    def items(self):
+        """
+        Yields the (application identifier, value) tuples in order.
+        """
+        offsets = self._offsets
+        for index in range(0, len(offsets), 3):
+            yield offsets[index], self._value(index)
+
+    def group(self, name: str):
+        """
+        Returns the value of a field by its FIELD_NAMES name, or None if
+        the field is not in the element string.
+        :raises IndexError: If the name is not in FIELD_NAMES, as a
+        regular expression match does for a group it does not have.
+        """
+        try:
+            application_identifier = FIELD_NAMES[name]
+        except KeyError:
+            raise IndexError('no such group %s' % name)
+        if len(application_identifier) != 3:
+            return self.get(application_identifier)
+        offsets = self._offsets
+        for index in range(0, len(offsets), 3):
+            if offsets[index][:3] == application_identifier:
+                return self._value(index)
+        return None
+
+    def groupdict(self) -> dict:
+        """
+        Returns every field in FIELD_NAMES (None for those that are not in
+        the element string).
+        """
+        return {name: self.group(name) for name in FIELD_NAMES}
+
+    @property
+    def convertible(self) -> bool:
+        """
+        True for an SSCC or a serialized GTIN (01 and 21), the element
+        strings a `BarcodeConverter` can convert.
+        """
+        return '00' in self or ('01' in self and '21' in self)
+
+    def _find(self, application_identifier):
+        offsets = self._offsets
+        for index in range(0, len(offsets), 3):
+            if offsets[index] == application_identifier:
+                return index
+        return -1
+
+    def _value(self, index):
+        offsets = self._offsets
+        value = self.data[offsets[index + 1]:offsets[index + 2]]
+        return value if value.__class__ is str else value.decode('latin-1')
+
+    def __len__(self):
+        return len(self._offsets) // 3
+
+    def __iter__(self):
+        return iter(self._offsets[0::3])
+
+    def __contains__(self, application_identifier):
+        return self._find(application_identifier) >= 0
+
+    def __getitem__(self, application_identifier):
+        index = self._find(application_identifier)
+        if index < 0:
+            raise KeyError(application_identifier)
+        return self._value(index)
+
+    def __eq__(self, other):
+        return isinstance(other, ElementString) and \
+            list(self.items()) == list(other.items())
+
+    def __repr__(self):
+        return 'ElementString(%r)' % dict(self.items())
+
+
+def parse_element_string(data, start: int = 0, end: int = None):
+    """
+    Parses an element string without a symbology identifier or leading
+    FNC1.  A GS after a predefined length value is allowed.
+    :param data: A str or bytes buffer.
+    :param start: The offset the element string starts at in the buffer.
+    :param end: The offset the element string ends at.  Default is the end
+    of the buffer.
+    :return: An ElementString or None if the data is not a valid element
+    string.
+    """
+    if data.__class__ is str:
+        table = _AI_TABLE
+        separator = FNC1
+    else:
+        table = _AI_BYTES_TABLE
+        separator = b'\x1d'
+    if end is None:
+        end = len(data)
+    offsets = []
+    append = offsets.append
+    seen = set()
+    position = start
+    while position < end:
+        if position + 2 > end:
+            return None
+        entry = table.get(data[position:position + 2])
+        if entry is None:
+            return None
+        ai, ai_length, fixed, max_length = entry
+        ai_end = position + ai_length
+        if ai_length > 2:
+            if ai_end > end:
+                return None
+            ai = data[position:ai_end]
+            if not ai.isdigit():
+                return None
+            if ai.__class__ is not str:
+                ai = ai.decode('ascii')
+        if ai in seen:
+            return None
+        seen.add(ai)
+        if fixed:
+            value_end = ai_end + fixed
+            if value_end > end or not data[ai_end:value_end].isdigit():
+                return None
+            # a separator after a predefined length value is allowed
+            position = value_end + 1 if value_end < end and \
+                data[value_end:value_end + 1] == separator else value_end
+        else:
+            value_end = data.find(separator, ai_end, end)
+            if value_end == -1:
+                value_end = end
+            if value_end == ai_end or value_end - ai_end > max_length:
+                return None
+            position = value_end + 1
+        append(ai)
+        append(ai_end)
+        append(value_end)
+    return ElementString(data, tuple(offsets)) if offsets else None
+
+
+def iter_element_strings(data):
+    """
+    Parses a str or bytes buffer with one element string per line.  Every
+    result refers to the same buffer so the lines are never copied out of
+    it.  Blank lines are skipped.
+    :param data: The buffer, for example the contents of a file.
+    :return: A generator of ElementString instances (or None for the lines
+    that are not valid element strings).
+    """
+    if data.__class__ is str:
+        newline, carriage_return = '\n', '\r'
+    else:
+        newline, carriage_return = b'\n', b'\r'
+    length = len(data)
+    position = 0
+    while position < length:
+        line_end = data.find(newline, position)
+        if line_end == -1:
+            line_end = length
+        end = line_end
+        if end > position and data[end - 1:end] == carriage_return:
+            end -= 1
+        if end > position:
+            yield parse_element_string(data, position, end)
+        position = line_end + 1
+
+
+# (application identifier for two digit identifiers, application
+# identifier length, predefined data length or 0, maximum data length) by
+# the first two digits of the application identifier
+_AI_TABLE = {
+    '%02d' % number: (
+        '%02d' % number,
+        _AI_LENGTHS.get('%02d' % number, 2),
+        FIXED_LENGTHS.get('%02d' % number, 0),
+        _MAX_LENGTHS.get('%02d' % number, _MAX_LENGTH)
+    ) for number in range(100)
+}
+_AI_BYTES_TABLE = {key.encode('ascii'): value
+                   for key, value in _AI_TABLE.items()}
@@ -0,0 +1,121 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Parses many YYMMDD dates (application identifier 17, the expiration date,
+and the other GS1 date fields) at once into a NumPy datetime64 array, and
+filters them, with the GS1 General Specifications rules:
+
+* a day of 00 is the last day of the month;
+* the century is the one that puts the year closest to today: a year
+  more than 50 years ahead of today is in the previous century and one
+  50 or more years behind is in the next.
+
+NumPy is an optional dependency (``pip install gs123[numpy]``); it is
+only imported when a function in this module is first called.
+"""
+import datetime
+from collections import namedtuple
+
+from gs123.lazy import LazyModule
+
+numpy = LazyModule('numpy')
+
+
+class ExpirationDates(namedtuple('ExpirationDates', ['dates', 'valid'])):
+    """
+    The result of `parse_expiration_dates`: a datetime64[D] array of the
+    dates (NaT where the value is not a valid date) and a boolean array
+    that is True where it is.
+    """
+    __slots__ = ()
+
+
+def parse_expiration_dates(values, today: datetime.date = None
+                           ) -> ExpirationDates:
+    """
+    Parses YYMMDD values into dates.
+    :param values: A sequence (or NumPy array) of YYMMDD strings, for
+    example the expiration_date values of converted barcodes.  Values that
+    are not six digit strings, such as None, are invalid.
+    :param today: The date the century window is based on.  Default is
+    today.
+    :return: An ExpirationDates tuple of the dates and the validity mask.
+    """
+    np = numpy
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'SU':
+        values = values.astype('U')
+        text = values.astype('U6')
+        lengths = np.char.str_len(values)
+    else:
+        values = [value if value.__class__ is str else ''
+                  for value in values]
+        text = np.array(values, dtype='U6')
+        lengths = np.fromiter(map(len, values), dtype=np.int64,
+                              count=len(values))
+    # the unicode code points of the six characters as one row per value
+    digits = text.reshape(-1).view(np.uint32).reshape(-1, 6).astype(
+        np.int64) - 48
+    valid = (lengths == 6) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    digits = np.where(valid[:, None], digits, 0)
+    year = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    day = digits[:, 4] * 10 + digits[:, 5]
+    today = today or datetime.date.today()
+    century = today.year - today.year % 100
+    difference = year - today.year % 100
+    year = year + century - 100 * (difference > 50) + \
+        100 * (difference < -49)
+    valid &= (month >= 1) & (month <= 12)
+    month = np.where(valid, month, 1)
+    month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    first_day = month_start.astype('datetime64[D]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') -
+                     first_day).astype(np.int64)
+    valid &= day <= days_in_month
+    offset = np.where(day == 0, days_in_month, day) - 1
+    dates = first_day + offset.astype('timedelta64[D]')
+    dates[~valid] = np.datetime64('NaT')
+    return ExpirationDates(dates, valid)
+
+
+def expires_before(dates, date) -> 'numpy.ndarray':
+    """
+    Returns a boolean array that is True where a date is before the date.
+    NaT (invalid) dates are never before it.
+    :param dates: A datetime64 array, for example
+    `parse_expiration_dates(values).dates`.
+    :param date: A datetime.date, a datetime64 or an ISO date string.
+    """
+    return numpy.asarray(dates) < numpy.datetime64(date, 'D')
+
+
+def expires_between(dates, start, end) -> 'numpy.ndarray':
+    """
+    Returns a boolean array that is True where a date is on or after the
+    start date and before the end date.
+    """
+    dates = numpy.asarray(dates)
+    return (dates >= numpy.datetime64(start, 'D')) & \
+        (dates < numpy.datetime64(end, 'D'))
+
+
+def expires_within(dates, days: int, today: datetime.date = None
+                   ) -> 'numpy.ndarray':
+    """
+    Returns a boolean array that is True where a date is less than the
+    number of days after today, including the dates that have passed.
+    """
+    today = numpy.datetime64(today or datetime.date.today(), 'D')
+    return numpy.asarray(dates) < today + numpy.timedelta64(days, 'D')
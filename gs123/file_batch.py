@@ -0,0 +1,342 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Conversion of many files in one run: the input files are found from
+directories and glob patterns, the output paths come from a template and
+the files are shared out between a pool of worker processes that are each
+sent the conversion profile, with its compiled patterns, once.
+"""
+import glob
+import os
+import time
+from collections import namedtuple
+from gs123.lazy import LazyModule
+from gs123.memo import DEFAULT_MEMO_SIZE
+from gs123.profile import ConversionProfile
+from gs123.stats import ConversionStats
+
+# only the converters for the input format are imported
+batch = LazyModule('gs123.batch')
+record_conversion = LazyModule('gs123.record_conversion')
+xml_conversion = LazyModule('gs123.xml_conversion')
+
+INPUT_FORMATS = ('xml', 'csv', 'jsonl', 'lines')
+
+# {dir}, {name}, {stem} and {suffix} are those of the input file
+DEFAULT_OUTPUT_TEMPLATE = '{dir}/{stem}.converted{suffix}'
+
+# the most files sent to a worker process at a time
+_MAX_CHUNK_SIZE = 16
+
+
+class FileJob(namedtuple('FileJob', ['input_path', 'output_path'])):
+    """
+    An input file and the output file it is converted to.
+    """
+    __slots__ = ()
+
+
+class BatchSummary(namedtuple('BatchSummary', [
+    'converted', 'skipped', 'failed', 'input_bytes', 'seconds', 'workers'
+])):
+    """
+    The outcome of `convert_files`.  `failed` is a list of (input path,
+    error message) tuples.
+    """
+    __slots__ = ()
+
+    @property
+    def files_per_second(self) -> float:
+        return self.converted / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.input_bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        lines = [
+            'files converted: %s' % self.converted,
+            'files skipped (up to date): %s' % self.skipped,
+            'files failed: %s' % len(self.failed),
+        ]
+        for input_path, error in self.failed:
+            lines.append('    %s: %s' % (input_path, error))
+        lines.append('input: %.1f MB' % (self.input_bytes / 1e6))
+        lines.append('elapsed: %.2f seconds with %s worker(s)' % (
+            self.seconds, self.workers))
+        lines.append('throughput: %.1f files/s, %.2f MB/s' % (
+            self.files_per_second, self.bytes_per_second / 1e6))
+        return '\n'.join(lines)
+
+
+def find_input_files(patterns) -> list:
+    """
+    Returns the sorted list of files named by the patterns.  A pattern is
+    a file, a directory (every file directly inside it that is not hidden)
+    or a glob pattern, where ** matches any number of directories.
+    :param patterns: An iterable of paths and patterns.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = (os.path.join(pattern, name)
+                     for name in os.listdir(pattern)
+                     if not name.startswith('.'))
+        else:
+            paths = glob.glob(pattern, recursive=True)
+        found.update(os.path.abspath(path) for path in paths
+                     if os.path.isfile(path))
+    return sorted(found)
+
+
+def output_path(input_path: str,
+                template: str = DEFAULT_OUTPUT_TEMPLATE) -> str:
+    """
+    Returns the output path for an input file.
+    :param input_path: The input file.
+    :param template: A `str.format` template with the {dir}, {name},
+    {stem} and {suffix} (with its dot) of the input file, for example
+    /data/out/{stem}.urns{suffix}
+    """
+    directory, name = os.path.split(os.path.abspath(input_path))
+    stem, suffix = os.path.splitext(name)
+    return os.path.abspath(template.format(dir=directory, name=name,
+                                           stem=stem, suffix=suffix))
+
+
+def is_up_to_date(input_path: str, output_file_path: str) -> bool:
+    """
+    Returns True if the output file exists and is no older than the input
+    file.
+    """
+    try:
+        return os.stat(output_file_path).st_mtime_ns >= \
+            os.stat(input_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def plan_jobs(patterns, template: str = DEFAULT_OUTPUT_TEMPLATE,
+              force: bool = False):
+    """
+    Finds the input files and works out their output paths.  Files that
+    are themselves the output of another input file (from an earlier run
+    into the same directory) are left out.
+    :param patterns: An iterable of files, directories and glob patterns.
+    :param template: The output path template, see `output_path`.
+    :param force: If true, files whose output is up to date are converted
+    again.
+    :return: A tuple of the list of FileJob instances to run and the
+    number of files skipped because their output is up to date.
+    """
+    input_paths = find_input_files(patterns)
+    outputs = {}
+    for input_path in input_paths:
+        path = output_path(input_path, template)
+        if path in outputs:
+            raise ValueError('%s and %s would both be written to %s.' % (
+                outputs[path], input_path, path))
+        outputs[path] = input_path
+    jobs = []
+    skipped = 0
+    for path, input_path in outputs.items():
+        if input_path in outputs:
+            continue
+        if path == input_path:
+            raise ValueError('%s would be overwritten by its output.'
+                             % input_path)
+        if not force and is_up_to_date(input_path, path):
+            skipped += 1
+        else:
+            jobs.append(FileJob(input_path, path))
+    jobs.sort()
+    return jobs, skipped
+
+
+def convert_files(jobs, workers: int = None, skipped: int = 0,
+                  stats: ConversionStats = None,
+                  **options) -> BatchSummary:
+    """
+    Converts the files with a pool of worker processes.  Each output is
+    written to a temporary file that replaces the output once it is
+    complete, so an interrupted run never leaves an output that looks up
+    to date.  A file that fails to convert is reported in the summary and
+    does not stop the others.
+    :param jobs: An iterable of FileJob instances.
+    :param workers: The number of worker processes.  Default is the number
+    of CPUs.  With 1 the files are converted in this process.
+    :param skipped: The number of skipped files to report in the summary.
+    :param stats: An optional `gs123.stats.ConversionStats` instance that
+    the statistics of every file are added to.
+    :param options: The `FileConverter` parameters.
+    :return: A BatchSummary.
+    """
+    jobs = list(jobs)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    collect_stats = stats is not None
+    start = time.perf_counter()
+    if workers == 1:
+        converter = FileConverter(**options)
+        results = (converter.convert(job, collect_stats) for job in jobs)
+        pool = None
+    else:
+        # a single worker converts in this process, so multiprocessing is
+        # only imported when a pool is started
+        import multiprocessing
+        pool = multiprocessing.Pool(workers, _start_worker, (options,))
+        chunk_size = max(1, min(_MAX_CHUNK_SIZE,
+                                len(jobs) // (workers * 4)))
+        results = pool.imap_unordered(
+            _run_job, ((job, collect_stats) for job in jobs), chunk_size
+        )
+    converted = 0
+    input_bytes = 0
+    failed = []
+    try:
+        for job, size, error, report in results:
+            if error is not None:
+                failed.append((job.input_path, error))
+                continue
+            converted += 1
+            input_bytes += size
+            if report is not None:
+                stats.merge(report)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    failed.sort()
+    return BatchSummary(converted, skipped, failed, input_bytes,
+                        time.perf_counter() - start, workers)
+
+
+class FileConverter:
+    """
+    Converts single files with one configuration.  The configuration is
+    held in a `gs123.profile.ConversionProfile` so the patterns are
+    compiled once for every file the instance converts.
+    """
+
+    def __init__(self, input_format: str = 'xml',
+                 urns_to_barcodes: bool = False,
+                 company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 barcode_format: str = None,
+                 memo_size: int = DEFAULT_MEMO_SIZE,
+                 columns=None,
+                 add_fields: bool = False,
+                 profile: ConversionProfile = None):
+        """
+        :param input_format: xml, csv, jsonl or lines.
+        :param urns_to_barcodes: If true EPC URNs are converted to
+        barcodes (xml only).
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length.
+        :param barcode_format: The name of a `gs123.regex.BARCODE_PATTERNS`
+        pattern to match every barcode against.
+        :param memo_size: The number of distinct values to remember the
+        conversion result of.  Zero disables the memo.
+        :param columns: The CSV columns or JSON Lines keys to convert.
+        :param add_fields: Add the parsed barcode fields to CSV and JSON
+        Lines records.
+        :param profile: An optional `gs123.profile.ConversionProfile` to
+        use instead of the lengths and the barcode format.
+        """
+        if input_format not in INPUT_FORMATS:
+            raise ValueError('Unsupported file format %s.' % input_format)
+        if input_format != 'xml' and urns_to_barcodes:
+            raise ValueError('URNs can only be converted to barcodes in '
+                             'xml files.')
+        if input_format in ('csv', 'jsonl') and not columns:
+            raise ValueError('The columns to convert are required for %s '
+                             'files.' % input_format)
+        self.input_format = input_format
+        self.urns_to_barcodes = urns_to_barcodes
+        self.memo_size = memo_size
+        self.columns = list(columns) if columns else None
+        self.add_fields = add_fields
+        self.profile = profile or ConversionProfile(company_prefix_length,
+                                                    serial_number_length,
+                                                    formats=barcode_format)
+
+    def convert_file(self, file_path: str, output_file_path: str,
+                     stats: ConversionStats = None) -> None:
+        """
+        Converts one file.
+        :param file_path: The file to convert.
+        :param output_file_path: The file to create.
+        :param stats: An optional `gs123.stats.ConversionStats` instance.
+        :return: None
+        """
+        if self.input_format != 'xml':
+            kwargs = {'add_fields': self.add_fields} \
+                if self.input_format != 'lines' else {}
+            record_conversion.convert_file(
+                file_path, output_file_path, self.input_format,
+                columns=self.columns,
+                converter=batch.BarcodeBatchConverter(
+                    stats=stats, memo_size=self.memo_size,
+                    profile=self.profile
+                ),
+                **kwargs
+            )
+        elif self.urns_to_barcodes:
+            xml_conversion.convert_xml_file_urns_to_barcodes(
+                file_path, output_file_path, stats=stats,
+                memo_size=self.memo_size
+            )
+        else:
+            xml_conversion.convert_xml_file(
+                file_path, output_file_path,
+                stats=stats,
+                memo_size=self.memo_size,
+                profile=self.profile
+            )
+
+    def convert(self, job: FileJob, collect_stats: bool = False):
+        """
+        Converts the job's file through a temporary file and catches any
+        error.
+        :return: A tuple of the job, the input size, the error message (or
+        None) and a `gs123.stats.ConversionReport` (or None).
+        """
+        stats = ConversionStats() if collect_stats else None
+        directory, name = os.path.split(job.output_path)
+        temporary_path = os.path.join(directory, '.%s.part' % name)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            size = os.path.getsize(job.input_path)
+            self.convert_file(job.input_path, temporary_path, stats)
+            os.replace(temporary_path, job.output_path)
+        except Exception as e:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return job, 0, '%s: %s' % (type(e).__name__, e), None
+        return job, size, None, \
+            stats.report() if stats is not None else None
+
+
+_worker = None
+
+
+def _start_worker(options):
+    global _worker
+    _worker = FileConverter(**options)
+
+
+def _run_job(arguments):
+    return _worker.convert(*arguments)
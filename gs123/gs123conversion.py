@@ -18,13 +18,26 @@ import sys
 import click
 
 try:
-    from gs123.xml_conversion import convert_xml_file
+    from gs123.file_batch import DEFAULT_OUTPUT_TEMPLATE, INPUT_FORMATS, \
+        FileConverter, convert_files, plan_jobs
+    from gs123.profile import ConversionProfile
+    from gs123.stats import ConversionStats
+    from gs123.regex import BARCODE_PATTERNS
+    from gs123.memo import DEFAULT_MEMO_SIZE
+    from gs123.summary import summarize_barcodes
 except ImportError:
     sys.path.append(os.path.join('../',os.path.dirname(__file__)))
-    from gs123.xml_conversion import convert_xml_file
+    from gs123.file_batch import DEFAULT_OUTPUT_TEMPLATE, INPUT_FORMATS, \
+        FileConverter, convert_files, plan_jobs
+    from gs123.profile import ConversionProfile
+    from gs123.stats import ConversionStats
+    from gs123.regex import BARCODE_PATTERNS
+    from gs123.memo import DEFAULT_MEMO_SIZE
+    from gs123.summary import summarize_barcodes
 
 
-@click.command()
+@click.group(invoke_without_command=True)
+@click.pass_context
 @click.option(
     '-i', '--input-file',
     help='An input file with barcode data to convert'
@@ -33,11 +46,231 @@ except ImportError:
     '-o', '--output-file',
     help='The output file for converted data'
 )
-def main(input_file, output_file):
-    """Console script for gs123."""
-    input_file = os.path.abspath(input_file)
-    output_file = os.path.abspath(output_file)
-    convert_xml_file(input_file, output_file)
+@click.option(
+    '-b', '--batch', multiple=True,
+    help='Convert every file in a directory or matching a glob pattern '
+         '(** matches any number of directories) instead of a single '
+         '--input-file.  May be given more than once'
+)
+@click.option(
+    '--output-template', default=DEFAULT_OUTPUT_TEMPLATE,
+    show_default=True,
+    help='The output path for each --batch file, made from the {dir}, '
+         '{name}, {stem} and {suffix} of the input file'
+)
+@click.option(
+    '-w', '--workers', type=click.IntRange(min=1),
+    help='The number of worker processes for --batch.  Default is the '
+         'number of CPUs'
+)
+@click.option(
+    '--force', is_flag=True, default=False,
+    help='Convert --batch files whose output is already up to date'
+)
+@click.option(
+    '--stats', is_flag=True, default=False,
+    help='Print conversion statistics after the conversion'
+)
+@click.option(
+    '--barcode-format',
+    type=click.Choice(sorted(BARCODE_PATTERNS)),
+    help='Skip format detection and match every barcode against this '
+         'pattern'
+)
+@click.option(
+    '--memo-size', type=int, default=DEFAULT_MEMO_SIZE, show_default=True,
+    help='The number of distinct values to remember conversion results '
+         'for (0 disables the memo)'
+)
+@click.option(
+    '--urns-to-barcodes', is_flag=True, default=False,
+    help='Convert EPC URNs to barcodes instead of barcodes to EPC URNs'
+)
+@click.option(
+    '--input-format',
+    type=click.Choice(INPUT_FORMATS), default='xml',
+    show_default=True,
+    help='The format of the input file.  lines is one barcode per line'
+)
+@click.option(
+    '--columns',
+    help='A comma separated list of the CSV columns or JSON Lines keys '
+         'to convert'
+)
+@click.option(
+    '--add-fields', is_flag=True, default=False,
+    help='Add gtin14, serial_number, lot and expiration_date columns to '
+         'CSV and JSON Lines records'
+)
+@click.option(
+    '-c', '--company-prefix-length', type=int, default=6,
+    show_default=True, help='The length of the company prefix'
+)
+@click.option(
+    '--serial-number-length', type=int, default=12, show_default=True,
+    help='The serial number length for barcodes without parenthesis that '
+         'have lot and expiry fields'
+)
+def main(context, input_file, output_file, batch, output_template, workers,
+         force, stats, barcode_format, memo_size, urns_to_barcodes,
+         input_format, columns, add_fields, company_prefix_length,
+         serial_number_length):
+    """Console script for gs123.  Converts the input file (or --batch
+    files) unless a command is given."""
+    if context.invoked_subcommand is not None:
+        return 0
+    if input_format != 'xml' and urns_to_barcodes:
+        raise click.UsageError(
+            '--urns-to-barcodes is only supported for xml input.')
+    if input_format in ('csv', 'jsonl') and not columns:
+        raise click.UsageError(
+            '--columns is required for %s input.' % input_format)
+    if batch and (input_file or output_file):
+        raise click.UsageError(
+            '--batch can not be used with --input-file or --output-file.')
+    if not batch and not (input_file and output_file):
+        raise click.UsageError(
+            '--input-file and --output-file (or --batch) are required.')
+    conversion_stats = ConversionStats() if stats else None
+    # the profile is pickled and sent to each worker process once
+    options = dict(
+        input_format=input_format,
+        urns_to_barcodes=urns_to_barcodes,
+        profile=ConversionProfile(company_prefix_length,
+                                  serial_number_length,
+                                  formats=barcode_format),
+        memo_size=memo_size,
+        columns=[column.strip() for column in (columns or '').split(',')
+                 if column.strip()],
+        add_fields=add_fields
+    )
+    if batch:
+        try:
+            jobs, skipped = plan_jobs(batch, output_template, force)
+        except (ValueError, KeyError, IndexError) as e:
+            raise click.UsageError(str(e))
+        summary = convert_files(jobs, workers, skipped, conversion_stats,
+                                **options)
+        click.echo(str(summary))
+    else:
+        FileConverter(**options).convert_file(
+            os.path.abspath(input_file), os.path.abspath(output_file),
+            conversion_stats
+        )
+    if conversion_stats is not None:
+        click.echo(str(conversion_stats.report()))
+    if batch and summary.failed:
+        sys.exit(1)
+    return 0
+
+
+@main.command()
+@click.argument('input_file', type=click.File('r', encoding='utf-8'))
+@click.option(
+    '--barcode-format',
+    type=click.Choice(sorted(BARCODE_PATTERNS)),
+    help='Skip format detection and match every barcode against this '
+         'pattern'
+)
+@click.option(
+    '--serial-number-length', type=int, default=12, show_default=True,
+    help='The serial number length for barcodes without parenthesis that '
+         'have lot and expiry fields'
+)
+@click.option(
+    '--csv', 'as_csv', is_flag=True, default=False,
+    help='Print the groups as CSV rows instead of a report'
+)
+def summarize(input_file, barcode_format, serial_number_length, as_csv):
+    """Count the barcodes in INPUT_FILE (one per line) per GTIN, lot
+    and expiration date."""
+    summary = summarize_barcodes(
+        (line.rstrip('\r\n') for line in input_file if line.strip()),
+        serial_number_length, barcode_format
+    )
+    if not as_csv:
+        click.echo(str(summary))
+        return 0
+    import csv
+    writer = csv.writer(click.get_text_stream('stdout'), lineterminator='\n')
+    writer.writerow(('gtin14', 'lot', 'expiration_date', 'count',
+                     'serial_min', 'serial_max'))
+    writer.writerows(summary.rows())
+    return 0
+
+
+@main.command()
+@click.option(
+    '--host', default='127.0.0.1', show_default=True,
+    help='The address to listen on'
+)
+@click.option(
+    '--port', type=click.IntRange(min=0), default=8123, show_default=True,
+    help='The port to listen on'
+)
+@click.option(
+    '-w', '--workers', type=click.IntRange(min=1),
+    help='The number of conversion threads.  Default is the number of CPUs'
+)
+@click.option(
+    '--max-concurrency', type=click.IntRange(min=1),
+    help='The number of requests converted at once.  Default is the '
+         'number of workers'
+)
+@click.option(
+    '--batch-size', type=click.IntRange(min=1), default=1000,
+    show_default=True, help='The number of lines converted at a time'
+)
+@click.option(
+    '--barcode-format',
+    type=click.Choice(sorted(BARCODE_PATTERNS)),
+    help='Skip format detection and match every barcode against this '
+         'pattern'
+)
+@click.option(
+    '--parenthesis', is_flag=True, default=False,
+    help='Put the application identifiers of barcodes converted from URNs '
+         'in parenthesis'
+)
+@click.option(
+    '-c', '--company-prefix-length', type=int, default=6,
+    show_default=True, help='The length of the company prefix'
+)
+@click.option(
+    '--serial-number-length', type=int, default=12, show_default=True,
+    help='The serial number length for barcodes without parenthesis that '
+         'have lot and expiry fields'
+)
+def serve(host, port, workers, max_concurrency, batch_size, barcode_format,
+          parenthesis, company_prefix_length, serial_number_length):
+    """Run an HTTP server that converts barcodes, URNs and XML
+    documents."""
+    # imported here as asyncio is slow to import
+    import asyncio
+    from gs123.conversion import BarcodeFormat
+    from gs123.server import ConversionServer
+    server = ConversionServer(
+        host, port,
+        profile=ConversionProfile(company_prefix_length,
+                                  serial_number_length,
+                                  formats=barcode_format),
+        barcode_format=BarcodeFormat(parenthesis=parenthesis),
+        workers=workers, max_concurrency=max_concurrency,
+        batch_size=batch_size
+    )
+
+    async def run():
+        await server.start()
+        click.echo('Listening on http://%s:%s' % (server.host, server.port))
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
     return 0
 
 
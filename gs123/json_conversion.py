@@ -0,0 +1,383 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Streaming conversion of EPCIS 2.0 JSON/JSON-LD documents.  The document is
+read in chunks by an incremental tokenizer and written back out token by
+token, so only the current chunk and the chain of open objects and arrays
+are ever held in memory.  Everything other than the converted values,
+including whitespace, is written out exactly as it was read.
+"""
+import json
+import re
+from io import StringIO, TextIOWrapper
+from gs123 import regex
+from gs123.batch import barcode_to_urn, urn_to_barcode, memoize
+from gs123.check_digit import calculate_check_digit
+from gs123.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from gs123.conversion import BarcodeFormat
+from gs123.memo import DEFAULT_MEMO_SIZE
+from gs123.regex import PatternRegistry
+
+# keys whose array items are EPCs
+EPC_LIST_KEYS = frozenset((
+    'epcList', 'childEPCs', 'inputEPCList', 'outputEPCList'
+))
+
+# keys whose values are EPCs
+EPC_KEYS = frozenset(('parentID',))
+
+# keys whose array items are quantity elements with an epcClass
+QUANTITY_LIST_KEYS = frozenset((
+    'quantityList', 'childQuantityList', 'inputQuantityList',
+    'outputQuantityList'
+))
+
+DEFAULT_CHUNK_SIZE = 65536
+
+_TOKEN = re.compile(
+    r'\s+|"(?:[^"\\]|\\.)*"|[{}\[\]:,]|[^\s{}\[\]:,"]+'
+)
+
+
+def convert_json_string(data, company_prefix_length: int = 6,
+                        serial_number_length: int = 12,
+                        urns_to_barcodes: bool = False,
+                        barcode_format: BarcodeFormat = None,
+                        **kwargs) -> str:
+    """
+    Converts the EPCs in an EPCIS 2.0 JSON string.  See
+    `convert_json_stream` for the parameters.
+    :param data: The JSON document as a string or bytes.
+    :return: The converted document.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    with StringIO() as output_stream:
+        convert_json_stream(StringIO(data), output_stream,
+                            company_prefix_length, serial_number_length,
+                            urns_to_barcodes, barcode_format, **kwargs)
+        return output_stream.getvalue()
+
+
+def convert_json_file(file_path: str, output_file_path: str,
+                      company_prefix_length: int = 6,
+                      serial_number_length: int = 12,
+                      urns_to_barcodes: bool = False,
+                      barcode_format: BarcodeFormat = None,
+                      checkpoint: bool = False,
+                      checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+                      **kwargs) -> None:
+    """
+    Streams an EPCIS 2.0 JSON file into a new file with the EPCs converted.
+    See `convert_json_stream` for the other parameters.
+    :param file_path: The file to convert.
+    :param output_file_path: The file to create.
+    :param checkpoint: If true the input offset, the output offset and the
+    position in the document are saved to a checkpoint file next to the
+    output file every `checkpoint_interval` tokens and an interrupted
+    conversion of the same file is resumed from there.
+    :param checkpoint_interval: The number of tokens between checkpoints.
+    :return: None
+    """
+    if checkpoint:
+        _convert_json_file_checkpointed(
+            file_path, output_file_path, company_prefix_length,
+            serial_number_length, urns_to_barcodes, barcode_format,
+            checkpoint_interval, **kwargs
+        )
+        return
+    with open(file_path, encoding='utf-8', newline='') as input_stream, \
+        open(output_file_path, 'w', encoding='utf-8',
+             newline='') as output_stream:
+        convert_json_stream(input_stream, output_stream,
+                            company_prefix_length, serial_number_length,
+                            urns_to_barcodes, barcode_format, **kwargs)
+
+
+def convert_json_stream(input_stream, output_stream,
+                        company_prefix_length: int = 6,
+                        serial_number_length: int = 12,
+                        urns_to_barcodes: bool = False,
+                        barcode_format: BarcodeFormat = None,
+                        stats=None,
+                        registry: PatternRegistry = None,
+                        memo_size: int = DEFAULT_MEMO_SIZE,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        target_keys=None,
+                        profile=None) -> None:
+    """
+    Reads an EPCIS 2.0 JSON document from the input stream and writes it to
+    the output stream with the values of the `epcList`, `childEPCs`,
+    `inputEPCList`, `outputEPCList` and `parentID` fields and the
+    `epcClass` of the quantity list fields converted.  Values that can not
+    be converted are left as they are.
+    :param input_stream: A text file object to read from.
+    :param output_stream: A text file object to write to.
+    :param company_prefix_length: The length of the company prefix.
+    :param serial_number_length: The serial number length.
+    :param urns_to_barcodes: If true URNs are converted to barcodes,
+    otherwise barcodes are converted to URNs.
+    :param barcode_format: The `gs123.conversion.BarcodeFormat` used when
+    converting URNs to barcodes.
+    :param stats: An optional `gs123.stats.ConversionStats` instance.
+    :param registry: An optional `gs123.regex.PatternRegistry`.
+    :param memo_size: The number of distinct values to remember the
+    conversion result of.  Zero disables the memo.
+    :param chunk_size: The number of characters read at a time.
+    :param target_keys: An optional set of the field names above to
+    restrict the conversion to.
+    :param profile: An optional `gs123.profile.ConversionProfile` to
+    convert the barcodes with instead of the lengths and the registry.
+    :return: None
+    """
+    _rewrite(tokenize(input_stream, chunk_size), output_stream.write,
+             *_rewrite_arguments(company_prefix_length, serial_number_length,
+                                 urns_to_barcodes, barcode_format, stats,
+                                 registry, memo_size, target_keys, profile))
+
+
+def _rewrite_arguments(company_prefix_length, serial_number_length,
+                       urns_to_barcodes, barcode_format, stats, registry,
+                       memo_size, target_keys, profile=None):
+    """
+    Returns the converters and key sets `_rewrite` is called with.
+    """
+    epc_list_keys, epc_keys, quantity_list_keys = \
+        EPC_LIST_KEYS, EPC_KEYS, QUANTITY_LIST_KEYS
+    if target_keys is not None:
+        epc_list_keys = epc_list_keys.intersection(target_keys)
+        epc_keys = epc_keys.intersection(target_keys)
+        quantity_list_keys = quantity_list_keys.intersection(target_keys)
+    if urns_to_barcodes:
+        barcode_format = barcode_format or BarcodeFormat()
+        convert_epc = urn_to_barcode(barcode_format, stats)
+        convert_class = _class_urn_to_barcode(barcode_format)
+    else:
+        if profile is not None:
+            company_prefix_length = profile.company_prefix_length
+        elif registry is None:
+            registry = PatternRegistry()
+        convert_epc = barcode_to_urn(
+            company_prefix_length, serial_number_length, stats, registry,
+            profile=profile
+        )
+        convert_class = _barcode_to_class_urn(company_prefix_length)
+    return (memoize(convert_epc, stats, memo_size),
+            memoize(convert_class, None, memo_size),
+            epc_list_keys, epc_keys, quantity_list_keys)
+
+
+def _convert_json_file_checkpointed(file_path, output_file_path,
+                                    company_prefix_length,
+                                    serial_number_length, urns_to_barcodes,
+                                    barcode_format, checkpoint_interval,
+                                    stats=None, registry=None,
+                                    memo_size=DEFAULT_MEMO_SIZE,
+                                    chunk_size=DEFAULT_CHUNK_SIZE,
+                                    target_keys=None, profile=None):
+    """
+    Converts a JSON file saving a checkpoint every `checkpoint_interval`
+    tokens.  Both files are read and written as latin-1, which maps every
+    byte to one character, so the token lengths are byte offsets that the
+    input can be seek'd to; UTF-8 text passes through unchanged.
+    """
+    checkpoint = Checkpoint(file_path, output_file_path, [
+        'json', company_prefix_length, serial_number_length,
+        urns_to_barcodes, list(barcode_format) if barcode_format else None,
+        None if target_keys is None else sorted(target_keys)
+    ] + ([] if profile is None else [profile.settings]))
+    state = checkpoint.load()
+    offset = state['input_offset'] if state else 0
+    stack = state['stack'] if state else []
+    with open(file_path, 'rb') as input_file, \
+            checkpoint.open_output(state) as output_file:
+        input_file.seek(offset)
+        input_stream = TextIOWrapper(input_file, 'latin-1', newline='')
+        output_stream = TextIOWrapper(output_file, 'latin-1', newline='')
+
+        def save(input_offset):
+            output_stream.flush()
+            checkpoint.commit(output_file, input_offset=input_offset,
+                              stack=stack)
+
+        tokens = _checkpoints(tokenize(input_stream, chunk_size), offset,
+                              save, checkpoint_interval)
+        _rewrite(tokens, output_stream.write,
+                 *_rewrite_arguments(company_prefix_length,
+                                     serial_number_length, urns_to_barcodes,
+                                     barcode_format, stats, registry,
+                                     memo_size, target_keys, profile),
+                 stack=stack)
+        output_stream.flush()
+        output_stream.detach()
+        input_stream.detach()
+    checkpoint.remove()
+
+
+def _checkpoints(tokens, offset, save, interval):
+    """
+    Passes the tokens through, calling save with the input offset of the
+    next token every `interval` tokens, once the previous token has been
+    written.
+    """
+    count = 0
+    for token in tokens:
+        count += 1
+        if count > interval:
+            save(offset)
+            count = 1
+        offset += len(token)
+        yield token
+
+
+def tokenize(input_stream, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Incrementally splits a JSON text stream into its raw tokens: structural
+    characters, strings (with their quotes and escapes), literals and
+    whitespace.  Concatenating the tokens gives back the original text.
+    :param input_stream: A text file object.
+    :param chunk_size: The number of characters read at a time.
+    :return: A generator of token strings.
+    """
+    match = _TOKEN.match
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        token = match(buffer, position)
+        # a token that runs to the end of the buffer may continue in the
+        # next chunk, as may a string with no closing quote yet
+        if token is None or (token.end() == len(buffer) and not eof):
+            if eof:
+                if position < len(buffer):
+                    raise ValueError('Invalid JSON near: %s'
+                                     % buffer[position:position + 40])
+                return
+            chunk = input_stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = token.end()
+        yield token.group()
+
+
+def _rewrite(tokens, write, convert_epc, convert_class, epc_list_keys,
+             epc_keys, quantity_list_keys, stack=None):
+    """
+    Tracks where each token sits in the document and writes the tokens,
+    converting the string values of the EPC fields.  Each entry on the
+    stack is a list of [is object, key of the container, current key,
+    expecting a key].  A stack can be passed in to start (or resume) part
+    way through a document; it is updated in place.
+    """
+    if stack is None:
+        stack = []
+    for token in tokens:
+        first = token[0]
+        if first == '"':
+            top = stack[-1] if stack else None
+            if top is not None and top[0] and top[3]:
+                top[2] = _decode(token)
+                top[3] = False
+            elif top is not None:
+                if top[0]:
+                    key = top[2]
+                    if key in epc_keys:
+                        token = _convert(token, convert_epc)
+                    elif key == 'epcClass' and \
+                            top[1] in quantity_list_keys:
+                        token = _convert(token, convert_class)
+                elif top[1] in epc_list_keys:
+                    token = _convert(token, convert_epc)
+        elif first == '{' or first == '[':
+            if not stack:
+                container_key = None
+            elif stack[-1][0]:
+                container_key = stack[-1][2]
+            else:
+                container_key = stack[-1][1]
+            stack.append([first == '{', container_key, None, first == '{'])
+        elif first == '}' or first == ']':
+            stack.pop()
+        elif first == ',':
+            if stack and stack[-1][0]:
+                stack[-1][3] = True
+        write(token)
+
+
+def _decode(token):
+    return token[1:-1] if '\\' not in token else json.loads(token)
+
+
+def _convert(token, convert):
+    value = convert(_decode(token))
+    if value is None:
+        return token
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _barcode_to_class_urn(company_prefix_length):
+    """
+    Returns a function that converts a GTIN-14 (01) barcode, with an
+    optional lot (10), to an LGTIN class URN or, without a lot, to an
+    SGTIN pattern URN.
+    """
+
+    def convert_value(value):
+        match = regex.GTIN14_LOT.match(value)
+        if not match:
+            return None
+        gtin14 = match.group('gtin14')
+        company_prefix = gtin14[1:company_prefix_length + 1]
+        item_reference = gtin14[0] + gtin14[company_prefix_length + 1:13]
+        lot = match.group('lot')
+        if lot:
+            return 'urn:epc:class:lgtin:%s.%s.%s' % (
+                company_prefix, item_reference, lot)
+        return 'urn:epc:idpat:sgtin:%s.%s.*' % (company_prefix,
+                                                item_reference)
+
+    return convert_value
+
+
+def _class_urn_to_barcode(barcode_format):
+    """
+    Returns a function that converts an LGTIN class URN or an SGTIN pattern
+    URN to a GTIN-14 (01) barcode with a lot (10) where there is one.
+    """
+    gtin_format = '(01)%s' if barcode_format.parenthesis else '01%s'
+    lot_format = '(10)%s' if barcode_format.parenthesis else '10%s'
+
+    def convert_value(value):
+        for pattern in regex.class_urn_patterns:
+            match = pattern.match(value)
+            if match:
+                break
+        else:
+            return None
+        item_reference = match.group('item_reference')
+        gtin14 = calculate_check_digit('%s%s%s' % (
+            item_reference[:1], match.group('company_prefix'),
+            item_reference[1:]))
+        if len(gtin14) != 14:
+            return None
+        ret = gtin_format % gtin14
+        lot = match.groupdict().get('lot')
+        if lot:
+            ret += lot_format % lot
+        return ret
+
+    return convert_value
@@ -0,0 +1,98 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Stand-ins for regular expressions and modules that are only compiled or
+imported the first time they are used, so importing gs123 stays cheap for
+callers that never need them.
+"""
+import importlib
+
+
+class LazyPattern:
+    """
+    A regular expression that is compiled on first use.  Compiling copies
+    the methods of the compiled pattern onto the instance, so after the
+    first call `lazy.match(value)` costs the same as it does on the
+    compiled pattern itself.
+    """
+    _METHODS = ('match', 'fullmatch', 'search', 'findall', 'finditer',
+                'sub', 'subn', 'split', 'groupindex', 'groups')
+
+    def __init__(self, pattern: str, flags: int = 0):
+        """
+        :param pattern: The regular expression.
+        :param flags: The `re` flags to compile it with.
+        """
+        self.pattern = pattern
+        self.flags = flags
+
+    def compile(self):
+        """
+        Compiles the pattern (once) and returns the compiled pattern.
+        """
+        # re (and the enum module it needs) is slow to import so it is
+        # only imported when a pattern is first used
+        import re
+        # a second thread can get here before the methods are copied;
+        # re.compile hands it the pattern it cached for the first one, so
+        # both copy the methods of the same compiled pattern
+        compiled = re.compile(self.pattern, self.flags)
+        for name in self._METHODS:
+            setattr(self, name, getattr(compiled, name))
+        return compiled
+
+    def __getattr__(self, name):
+        # only called for attributes the instance does not have yet
+        if name.startswith('__') or name not in self._METHODS:
+            raise AttributeError(name)
+        self.compile()
+        return self.__dict__[name]
+
+    def __getstate__(self):
+        # the compiled methods are not copied, they are compiled again
+        return self.pattern, self.flags
+
+    def __setstate__(self, state):
+        self.pattern, self.flags = state
+
+    def __repr__(self):
+        return 'LazyPattern(%r)' % self.pattern
+
+
+class LazyModule:
+    """
+    A module that is imported the first time one of its attributes is
+    used.  The attributes are copied onto the instance as they are looked
+    up, so only the first use of each one goes through the proxy.
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: The full name of the module, for example lxml.etree.
+        """
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        value = getattr(self.__module, name)
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self):
+        return 'LazyModule(%r)' % self.__name
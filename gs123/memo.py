@@ -0,0 +1,75 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMO_SIZE = 4096
+
+# stored for values that are known not to be barcodes
+NOT_A_BARCODE = object()
+
+# returned by `ValueMemo.get` when a value has not been seen
+MISSING = object()
+
+
+class ValueMemo:
+    """
+    A bounded, least-recently-used map of raw values to their converted
+    values (or to `NOT_A_BARCODE`).  Used for the length of a single
+    conversion call since documents tend to repeat the same identifiers
+    many times over.  A memo can be shared between threads: lookups and
+    updates are made under a lock.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MEMO_SIZE):
+        """
+        :param max_size: The maximum number of values to remember.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, value):
+        """
+        Returns the remembered result for the value or `MISSING`.
+        :param value: The raw value.
+        """
+        with self._lock:
+            result = self._values.get(value, MISSING)
+            if result is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values.move_to_end(value)
+            return result
+
+    def put(self, value, result) -> None:
+        """
+        Remembers the result for the value, evicting the least recently
+        used value if the memo is full.
+        :param value: The raw value.
+        :param result: The converted value or `NOT_A_BARCODE`.
+        :return: None
+        """
+        with self._lock:
+            self._values[value] = result
+            if len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,209 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Matching of EPC URNs and parsed barcodes against many EPC pattern URIs
+(urn:epc:idpat:sgtin:... and urn:epc:idpat:sscc:...) at once.
+"""
+import re
+import threading
+from bisect import bisect_right
+from gs123.conversion import BarcodeConverter
+
+SGTIN = 'sgtin'
+SSCC = 'sscc'
+
+WILDCARD = '*'
+
+_PATTERN = re.compile(
+    r'^urn:epc:idpat:(?P<scheme>sgtin|sscc):(?P<fields>[^:]+)$'
+)
+_RANGE = re.compile(r'^\[(?P<start>[0-9]+)-(?P<end>[0-9]+)\]$')
+
+# serializes adding ranges to, and merging the ranges of, the serial
+# matchers; both are rare next to matching, which takes no lock
+_merge_lock = threading.Lock()
+
+
+class PatternIndex:
+    """
+    An index of EPC pattern URIs.  Patterns are hashed on the URN prefix
+    up to their serial part (scheme, company prefix and item reference);
+    the serial part of each pattern is stored as a wildcard, a set of exact
+    serial numbers or a list of merged serial number intervals that is
+    searched with `bisect`.  Matching a value therefore costs a dictionary
+    lookup (plus one for the company prefix wildcards and one for the
+    scheme wildcards when there are any) and a binary search, however many
+    patterns are in the index.  An index can be matched from several
+    threads at once, including while range patterns are being added.
+    """
+
+    def __init__(self, patterns=()):
+        """
+        :param patterns: An optional iterable of pattern URIs to add.
+        """
+        self._entries = {}
+        self._company_prefix_wildcards = False
+        self._scheme_wildcards = ()
+        self._count = 0
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str) -> None:
+        """
+        Adds a pattern URI to the index, for example
+        urn:epc:idpat:sgtin:0306123.045678.*,
+        urn:epc:idpat:sgtin:0306123.045678.[1-5000] or
+        urn:epc:idpat:sscc:0306123.*
+        :param pattern: The pattern URI.
+        :return: None
+        """
+        match = _PATTERN.match(pattern)
+        if not match:
+            raise ValueError('%s is not an SGTIN or SSCC pattern URI.'
+                             % pattern)
+        scheme = match.group('scheme')
+        fields = match.group('fields').split('.')
+        if len(fields) != (3 if scheme == SGTIN else 2):
+            raise ValueError('%s does not have the right number of fields.'
+                             % pattern)
+        serial = fields.pop()
+        # a wildcard may only be followed by wildcards
+        if (WILDCARD in fields and serial != WILDCARD) or \
+                (fields[0] == WILDCARD and fields[-1] != WILDCARD):
+            raise ValueError('%s has a value after a wildcard.' % pattern)
+        self._count += 1
+        prefix = 'urn:epc:id:%s:' % scheme
+        if fields[0] == WILDCARD:
+            if prefix not in self._scheme_wildcards:
+                self._scheme_wildcards += (prefix,)
+            return
+        if fields[-1] == WILDCARD:
+            # an SGTIN company prefix wildcard
+            self._company_prefix_wildcards = True
+            fields.pop()
+        key = prefix + '.'.join(fields)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _SerialMatcher(scheme == SGTIN)
+        if serial == WILDCARD:
+            entry.any = True
+        else:
+            serial_range = _RANGE.match(serial)
+            if serial_range:
+                start = int(serial_range.group('start'))
+                end = int(serial_range.group('end'))
+                if start > end:
+                    raise ValueError('The range in %s is reversed.'
+                                     % pattern)
+                entry.add_range(start, end)
+            else:
+                entry.serials.add(serial)
+
+    def matches(self, value) -> bool:
+        """
+        Returns True if the value matches any of the patterns.
+        :param value: An SGTIN or SSCC EPC URN or a `BarcodeConverter`
+        instance.
+        """
+        if value.__class__ is not str:
+            if not isinstance(value, BarcodeConverter):
+                raise TypeError('Only EPC URNs and BarcodeConverter '
+                                'instances can be matched.')
+            value = value.epc_urn
+        prefix, _, serial = value.rpartition('.')
+        entry = self._entries.get(prefix)
+        if entry is not None and entry.matches(serial):
+            return True
+        if self._company_prefix_wildcards and \
+                value.startswith('urn:epc:id:sgtin:'):
+            entry = self._entries.get(prefix.rpartition('.')[0])
+            if entry is not None and entry.any:
+                return True
+        return bool(self._scheme_wildcards) and \
+            value.startswith(self._scheme_wildcards)
+
+    __contains__ = matches
+
+    def filter(self, values):
+        """
+        Yields the values that match any of the patterns.
+        :param values: An iterable of EPC URNs and/or `BarcodeConverter`
+        instances.
+        :return: A generator.
+        """
+        matches = self.matches
+        for value in values:
+            if matches(value):
+                yield value
+
+    def __len__(self):
+        return self._count
+
+
+class _SerialMatcher:
+    """
+    The serial number part of the patterns for one key.  The merged
+    ranges are published as one (starts, ends) tuple so a thread that
+    matches while another adds a range sees either the old ranges or the
+    new ones, never half of each.
+    """
+    __slots__ = ('sgtin', 'any', 'serials', 'merged', '_ranges')
+
+    def __init__(self, sgtin):
+        self.sgtin = sgtin
+        self.any = False
+        self.serials = set()
+        self.merged = ([], [])
+        self._ranges = []
+
+    def add_range(self, start, end):
+        with _merge_lock:
+            self._ranges.append((start, end))
+            # merged on the next match
+            self.merged = None
+
+    def matches(self, serial):
+        if self.any or serial in self.serials:
+            return True
+        if not self._ranges:
+            return False
+        merged = self.merged
+        if merged is None:
+            merged = self._merge()
+        # SGTIN serial numbers with leading zeros are not integers, SSCC
+        # serial references are fixed width so they may have them
+        if not serial.isdigit() or (self.sgtin and serial[0] == '0'
+                                    and serial != '0'):
+            return False
+        starts, ends = merged
+        number = int(serial)
+        index = bisect_right(starts, number) - 1
+        return index >= 0 and number <= ends[index]
+
+    def _merge(self):
+        with _merge_lock:
+            if self.merged is not None:
+                return self.merged
+            starts = []
+            ends = []
+            for start, end in sorted(self._ranges):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._ranges = list(zip(starts, ends))
+            self.merged = (starts, ends)
+            return self.merged
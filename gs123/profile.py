@@ -0,0 +1,257 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Conversion profiles: a company prefix length, serial number length, output
+property and set of barcode formats bundled up with the regular
+expressions they need, compiled once when the profile is created.  A
+profile can be shared by any number of converters, threads and worker
+processes and passed to every conversion function through its `profile`
+parameter.
+"""
+from gs123 import regex
+from gs123.conversion import BarcodeConverter, escape_urn_serial
+from gs123.digital_link import match_digital_link
+
+_NO_PARENS_17_10 = 'NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10'
+
+
+class ConversionProfile:
+    """
+    An immutable, picklable conversion configuration.  Unlike
+    `gs123.regex.match_pattern`, which always uses a 12 digit serial number
+    for barcodes without parenthesis that have 17 and 10 fields, the
+    profile compiles that pattern for its own serial number length (and
+    tries the 12 digit one after it).
+
+    `match(value, stats=None)` returns the regular expression match for a
+    value (or None) and `convert(value, stats=None)` returns the value of
+    the output property (or None if the value is not a barcode).  Both are
+    plain functions built when the profile is created so there are no
+    attribute lookups or pattern compiles left to do per value.
+    """
+    __slots__ = ('company_prefix_length', 'serial_number_length',
+                 'property_name', 'formats', 'match', 'convert')
+
+    def __init__(self, company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 property_name: str = 'epc_urn',
+                 formats=None):
+        """
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param property_name: The BarcodeConverter property `convert`
+        returns.  Default is epc_urn.
+        :param formats: An optional sequence of `gs123.regex.BARCODE_PATTERNS`
+        names to restrict matching to.  A single format is used for every
+        value, as if it were pinned in a `gs123.regex.PatternRegistry`.
+        With more than one the formats without a leading app identifier
+        check are tried in the order given.  Default is every format.
+        """
+        company_prefix_length = int(company_prefix_length)
+        serial_number_length = int(serial_number_length)
+        if not hasattr(BarcodeConverter, property_name):
+            raise ValueError('BarcodeConverter has no property %s.'
+                             % property_name)
+        if isinstance(formats, str):
+            formats = (formats,)
+        formats = tuple(formats) if formats else None
+        for name in formats or ():
+            if name not in regex.BARCODE_PATTERNS:
+                raise ValueError(
+                    'Unknown barcode format %s.  Valid formats are: %s' % (
+                        name, ', '.join(sorted(regex.BARCODE_PATTERNS)))
+                )
+        match = _matcher(serial_number_length, formats)
+        initialize = object.__setattr__
+        initialize(self, 'company_prefix_length', company_prefix_length)
+        initialize(self, 'serial_number_length', serial_number_length)
+        initialize(self, 'property_name', property_name)
+        initialize(self, 'formats', formats)
+        initialize(self, 'match', match)
+        initialize(self, 'convert', _converter(
+            match, company_prefix_length, serial_number_length,
+            property_name))
+
+    @property
+    def settings(self) -> tuple:
+        """
+        The parameters of the profile as a tuple.
+        """
+        return (self.company_prefix_length, self.serial_number_length,
+                self.property_name, self.formats)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ConversionProfile instances are immutable.')
+
+    def __delattr__(self, name):
+        raise AttributeError('ConversionProfile instances are immutable.')
+
+    def __reduce__(self):
+        # the patterns are compiled again when the profile is unpickled
+        return self.__class__, self.settings
+
+    def __eq__(self, other):
+        return isinstance(other, ConversionProfile) and \
+            self.settings == other.settings
+
+    def __hash__(self):
+        return hash(self.settings)
+
+    def __repr__(self):
+        return 'ConversionProfile(%r, %r, %r, %r)' % self.settings
+
+
+def _compile(name, serial_number_length):
+    """
+    Returns the match function of the named pattern.
+    """
+    legacy = regex.BARCODE_PATTERNS[name].compile().match
+    if name != _NO_PARENS_17_10 or serial_number_length == 12:
+        return legacy
+    match = regex.get_no_parens_numeric_gs1_01_21_optional_17_10(
+        serial_number_length).match
+
+    def match_either(value):
+        # the 12 digit pattern of match_pattern is tried second so values
+        # that converted before still convert
+        return match(value) or legacy(value)
+
+    return match_either
+
+
+def _matcher(serial_number_length, formats):
+    """
+    Returns a match function for the formats that follows the same steps
+    as `gs123.regex.match_pattern`.
+    """
+    if formats is not None and len(formats) == 1:
+        name = formats[0]
+        pattern = _compile(name, serial_number_length)
+
+        def match_pinned(value, stats=None):
+            if value.__class__ is not str:
+                value = str(value)
+            if value.startswith('http'):
+                matched = 'DIGITAL_LINK'
+                ret = match_digital_link(value)
+            else:
+                matched = name
+                ret = pattern(value)
+            if stats is not None:
+                if ret is not None:
+                    stats.record_match(matched)
+                else:
+                    stats.record_miss()
+            return ret
+
+        return match_pinned
+
+    fallback_names = [name for name, pattern in regex.FALLBACK_PATTERNS]
+    if formats is not None:
+        fallback_names = [name for name in formats if name in fallback_names]
+    fallback = tuple((name, _compile(name, serial_number_length))
+                     for name in fallback_names)
+
+    def compile_allowed(name):
+        if formats is None or name in formats:
+            return _compile(name, serial_number_length)
+        return None
+
+    parens_gtin = compile_allowed('SGTIN_SN_10_13_ALPHA')
+    alpha_gtin = compile_allowed('ALPHA_01_21_GTIN_NO_PARENS')
+    sscc = compile_allowed('SSCC')
+    max_alpha_length = 18 + serial_number_length
+
+    def match(value, stats=None):
+        if value.__class__ is not str:
+            value = str(value)
+        ret = None
+        name = None
+        if value.startswith('http'):
+            name = 'DIGITAL_LINK'
+            ret = match_digital_link(value)
+        elif value.startswith('(01)'):
+            if parens_gtin is not None:
+                name = 'SGTIN_SN_10_13_ALPHA'
+                ret = parens_gtin(value)
+        elif value.startswith('01'):
+            if alpha_gtin is not None and len(value) <= max_alpha_length:
+                name = 'ALPHA_01_21_GTIN_NO_PARENS'
+                ret = alpha_gtin(value)
+        elif value.startswith('(00)') or value.startswith('00'):
+            if sscc is not None:
+                name = 'SSCC'
+                ret = sscc(value)
+        if ret is None and name != 'DIGITAL_LINK':
+            for name, pattern in fallback:
+                ret = pattern(value)
+                if ret is not None:
+                    break
+        if stats is not None:
+            if ret is not None:
+                stats.record_match(name)
+            else:
+                stats.record_miss()
+        return ret
+
+    return match
+
+
+def _converter(match, company_prefix_length, serial_number_length,
+               property_name):
+    """
+    Returns the convert function of a profile.  EPC URNs are formatted
+    straight from the match, anything else is read from a BarcodeConverter
+    created from the match.
+    """
+    if property_name == 'epc_urn':
+        def convert_urn(value, stats=None):
+            ret = match(value, stats) if value else None
+            if ret is None:
+                if stats is not None:
+                    stats.record_rejection()
+                return None
+            groups = ret.groupdict()
+            gtin14 = groups.get('gtin14')
+            if gtin14:
+                return 'urn:epc:id:sgtin:%s.%s%s.%s' % (
+                    gtin14[1:company_prefix_length + 1],
+                    gtin14[0],
+                    gtin14[company_prefix_length + 1:13],
+                    escape_urn_serial(
+                        groups['serial_number'].strip('\x1d').lstrip('0'))
+                )
+            sscc18 = groups['sscc18']
+            return 'urn:epc:id:sscc:%s.%s%s' % (
+                sscc18[1:company_prefix_length + 1],
+                sscc18[0],
+                sscc18[company_prefix_length + 1:17]
+            )
+
+        return convert_urn
+
+    from_match = BarcodeConverter.from_match
+
+    def convert(value, stats=None):
+        ret = match(value, stats) if value else None
+        if ret is None:
+            if stats is not None:
+                stats.record_rejection()
+            return None
+        return getattr(from_match(ret, company_prefix_length,
+                                  serial_number_length), property_name)
+
+    return convert
@@ -0,0 +1,404 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Generation of consecutive SSCC-18 and GTIN + serial number identifiers and
+compression of serial numbers into ranges (and back again).
+
+SSCC check digits are not recalculated from scratch for every value.  The
+weighted sum of all but the last two data digits is calculated once per
+hundred values and the last two digits plus the check digit are looked up
+in a table keyed by that sum, so each value costs a single string
+concatenation.
+"""
+from collections import namedtuple
+from gs123 import regex
+from gs123.check_digit import calculate_check_digit
+from gs123.conversion import BarcodeConverter, URNConverter, URNNotValid
+
+BARCODE = 'barcode'
+SSCC18 = 'sscc18'
+URN = 'urn'
+
+DEFAULT_BLOCK_SIZE = 100000
+
+# ranges are expanded a small block at a time
+_EXPANSION_BLOCK_SIZE = 1000
+
+# the last two data digits and the check digit for each weighted sum
+# (modulo 10) of the preceding digits
+_SSCC_SUFFIXES = tuple(
+    tuple(
+        '%02d%d' % (i, (10 - (prefix_sum + i // 10 + i % 10 * 3) % 10) % 10)
+        for i in range(100)
+    )
+    for prefix_sum in range(10)
+)
+
+
+def sscc_blocks(start: str, count: int, company_prefix_length: int,
+                output: str = BARCODE, parenthesis: bool = False,
+                block_size: int = DEFAULT_BLOCK_SIZE):
+    """
+    Generates `count` consecutive SSCCs starting at `start` in lists of
+    `block_size` values.
+    :param start: The first SSCC as an 18 digit SSCC, an SSCC barcode with
+    the 00 app identifier or the 17 digits without the check digit.
+    :param count: The number of SSCCs to generate.
+    :param company_prefix_length: The length of the company prefix.
+    :param output: barcode (00 app identifier and SSCC-18), sscc18 or urn.
+    :param parenthesis: Whether or not to put parenthesis around the app
+    identifier of barcode output.
+    :param block_size: The number of values in each list.
+    :return: A generator of lists of strings.
+    """
+    data = _sscc_data(start)
+    serial_reference_length = 16 - company_prefix_length
+    serial_reference = int(data[company_prefix_length + 1:])
+    _check_range(serial_reference, count, serial_reference_length)
+    if output == URN:
+        values = _formatted_values(
+            'urn:epc:id:sscc:%s.%s%%0%dd' % (
+                data[1:company_prefix_length + 1], data[0],
+                serial_reference_length
+            ),
+            serial_reference, count, block_size
+        )
+    elif output in (BARCODE, SSCC18):
+        app_identifier = ''
+        if output == BARCODE:
+            app_identifier = '(00)' if parenthesis else '00'
+        values = _sscc_values(app_identifier, int(data), count,
+                              block_size)
+    else:
+        raise ValueError('Unsupported output %s.' % output)
+    return values
+
+
+def sgtin_blocks(gtin14: str, start_serial: int, count: int,
+                 company_prefix_length: int = None,
+                 output: str = BARCODE, parenthesis: bool = False,
+                 serial_number_length: int = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+    """
+    Generates `count` GTIN + serial number barcodes (01...21...) or SGTIN
+    URNs with consecutive numeric serial numbers in lists of `block_size`
+    values.
+    :param gtin14: The GTIN-14, including its check digit.
+    :param start_serial: The first serial number.
+    :param count: The number of values to generate.
+    :param company_prefix_length: The length of the company prefix.
+    Required for urn output.
+    :param output: barcode or urn.
+    :param parenthesis: Whether or not to put parenthesis around the app
+    identifiers of barcode output.
+    :param serial_number_length: If supplied, barcode serial numbers are
+    left padded with zeros to this length and may not exceed it.
+    :param block_size: The number of values in each list.
+    :return: A generator of lists of strings.
+    """
+    if len(gtin14) != 14 or not gtin14.isdigit() or \
+            calculate_check_digit(gtin14[:13]) != gtin14:
+        raise ValueError('%s is not a valid GTIN-14.' % gtin14)
+    if serial_number_length:
+        _check_range(start_serial, count, serial_number_length)
+    elif start_serial < 0:
+        raise ValueError('Serial numbers can not be negative.')
+    if output == URN:
+        if not company_prefix_length:
+            raise ValueError('The company prefix length is required for URN '
+                             'output.')
+        prefix = 'urn:epc:id:sgtin:%s.%s%s.' % (
+            gtin14[1:company_prefix_length + 1], gtin14[0],
+            gtin14[company_prefix_length + 1:13]
+        )
+        serial_format = '%d'
+    elif output == BARCODE:
+        prefix = ('(01)%s(21)' if parenthesis else '01%s21') % gtin14
+        serial_format = '%%0%dd' % serial_number_length \
+            if serial_number_length else '%d'
+    else:
+        raise ValueError('Unsupported output %s.' % output)
+    return _formatted_values(prefix.replace('%', '%%') + serial_format,
+                             start_serial, count, block_size)
+
+
+def sscc_range(start: str, count: int, company_prefix_length: int,
+               **kwargs) -> list:
+    """
+    Returns a list of `count` consecutive SSCCs.  See `sscc_blocks` for
+    the parameters.
+    """
+    return _concatenate(
+        sscc_blocks(start, count, company_prefix_length, **kwargs))
+
+
+def sgtin_range(gtin14: str, start_serial: int, count: int,
+                **kwargs) -> list:
+    """
+    Returns a list of `count` barcodes or URNs with consecutive serial
+    numbers.  See `sgtin_blocks` for the parameters.
+    """
+    return _concatenate(sgtin_blocks(gtin14, start_serial, count, **kwargs))
+
+
+def join_blocks(blocks, separator: str = '\n') -> str:
+    """
+    Joins the values of a generator of blocks into a single buffer with
+    each value followed by the separator.
+    :param blocks: An iterable of lists of strings.
+    :param separator: The string written after each value.
+    :return: A string.
+    """
+    return ''.join(
+        separator.join(block) + separator for block in blocks if block
+    )
+
+
+def write_blocks(blocks, output_stream, separator: str = '\n') -> int:
+    """
+    Writes the values of a generator of blocks to a text stream, one block
+    at a time, with each value followed by the separator.
+    :param blocks: An iterable of lists of strings.
+    :param output_stream: A text file object.
+    :param separator: The string written after each value.
+    :return: The number of values written.
+    """
+    count = 0
+    for block in blocks:
+        if block:
+            output_stream.write(separator.join(block))
+            output_stream.write(separator)
+            count += len(block)
+    return count
+
+
+def _sscc_data(start):
+    """
+    Returns the 17 data digits of an SSCC value.
+    """
+    if start.startswith('(00)'):
+        start = start[4:]
+    elif len(start) == 20 and start.startswith('00'):
+        start = start[2:]
+    if not start.isdigit() or len(start) not in (17, 18):
+        raise ValueError('%s is not a valid SSCC.' % start)
+    if len(start) == 18 and calculate_check_digit(start[:17]) != start:
+        raise ValueError('%s does not have a valid check digit.' % start)
+    return start[:17]
+
+
+def _check_range(start, count, length):
+    if start < 0 or count < 0:
+        raise ValueError('The start and count can not be negative.')
+    if start + count > 10 ** length:
+        raise ValueError('The range does not fit in %s digits.' % length)
+
+
+def _sscc_values(app_identifier, start, count, block_size):
+    """
+    Yields lists of `block_size` SSCCs for the 17 digit data values from
+    start to start + count.
+    """
+    suffixes = _SSCC_SUFFIXES
+    end = start + count
+    for block_start in range(start, end, block_size):
+        block_end = min(block_start + block_size, end)
+        block = []
+        value = block_start
+        while value < block_end:
+            high, low = divmod(value, 100)
+            stop = min(block_end - high * 100, 100)
+            # the digits before the last two have the same weights as they
+            # would have in a value of their own
+            digits = '%015d' % high
+            prefix_sum = sum(map(int, digits[0::2])) * 3 + \
+                sum(map(int, digits[1::2]))
+            prefix = app_identifier + digits
+            block += [prefix + suffix
+                      for suffix in suffixes[prefix_sum % 10][low:stop]]
+            value = high * 100 + stop
+        yield block
+
+
+def _formatted_values(value_format, start, count, block_size):
+    """
+    Yields lists of `block_size` values with the value format applied to
+    each number from start to start + count.
+    """
+    end = start + count
+    for block_start in range(start, end, block_size):
+        block_end = min(block_start + block_size, end)
+        yield list(map(value_format.__mod__, range(block_start, block_end)))
+
+
+def _concatenate(blocks):
+    ret = []
+    for block in blocks:
+        if ret:
+            ret += block
+        else:
+            ret = block
+    return ret
+
+
+class SerialRange(namedtuple('SerialRange', ['gtin14', 'start', 'end'])):
+    """
+    A run of consecutive integer serial numbers (start and end inclusive)
+    for a GTIN-14.
+    """
+    __slots__ = ()
+
+    @property
+    def count(self) -> int:
+        """
+        The number of serial numbers in the range.
+        """
+        return self.end - self.start + 1
+
+    def pattern_urn(self, company_prefix_length: int) -> str:
+        """
+        Returns the range as an EPC pattern URN, for example
+        urn:epc:idpat:sgtin:0306123.045678.[1-1000].
+        :param company_prefix_length: The length of the company prefix.
+        """
+        prefix = 'urn:epc:idpat:sgtin:%s.%s%s.' % (
+            self.gtin14[1:company_prefix_length + 1], self.gtin14[0],
+            self.gtin14[company_prefix_length + 1:13]
+        )
+        if self.start == self.end:
+            return '%s%d' % (prefix, self.start)
+        return '%s[%d-%d]' % (prefix, self.start, self.end)
+
+    @classmethod
+    def from_pattern_urn(cls, urn: str) -> 'SerialRange':
+        """
+        Parses an SGTIN pattern URN with a serial number range or a single
+        integer serial number.
+        :param urn: The pattern URN.
+        :return: A SerialRange.
+        """
+        match = regex.SGTIN_RANGE_PATTERN_URN.match(urn)
+        if not match:
+            raise ValueError('%s is not an SGTIN range pattern URN.' % urn)
+        item_reference = match.group('item_reference')
+        gtin14 = calculate_check_digit('%s%s%s' % (
+            item_reference[:1], match.group('company_prefix'),
+            item_reference[1:]))
+        if len(gtin14) != 14:
+            raise ValueError('The company prefix and item reference of %s '
+                             'should be 13 digits in length.' % urn)
+        serial_number = match.group('serial_number')
+        if serial_number:
+            return cls(gtin14, int(serial_number), int(serial_number))
+        start, end = int(match.group('start')), int(match.group('end'))
+        if start > end:
+            raise ValueError('The range in %s is reversed.' % urn)
+        return cls(gtin14, start, end)
+
+
+def compress_serials(values, company_prefix_length: int = 6,
+                     serial_number_length: int = 12):
+    """
+    Groups barcodes and SGTIN URNs by GTIN-14 and compresses their serial
+    numbers into runs of consecutive integers.  Duplicate values are only
+    counted once.  Values that can not be part of a range (SSCCs, serial
+    numbers that are not integers or have leading zeros and values that
+    can not be parsed) are returned separately, as they are.
+    :param values: An iterable of barcode and/or SGTIN URN values.
+    :param company_prefix_length: The length of the company prefix for
+    barcode values.
+    :param serial_number_length: The serial number length for barcode
+    values without parenthesis that have 17 and 10 fields.
+    :return: A tuple of a list of `SerialRange` instances, sorted by
+    GTIN-14 and serial number, and a list of the other values.
+    """
+    serials = {}
+    others = []
+    for value in values:
+        try:
+            if value.startswith('urn:'):
+                converter = URNConverter(value)
+                serial_number = converter.serial_number_field
+            else:
+                converter = BarcodeConverter(value, company_prefix_length,
+                                             serial_number_length)
+                serial_number = converter.serial_number_field
+        except (URNNotValid, BarcodeConverter.BarcodeNotValid):
+            others.append(value)
+            continue
+        if not converter.gtin14 or not serial_number.isdigit() or \
+                (serial_number[0] == '0' and serial_number != '0'):
+            others.append(value)
+            continue
+        serials.setdefault(converter.gtin14, set()).add(int(serial_number))
+    ranges = []
+    for gtin14 in sorted(serials):
+        numbers = sorted(serials[gtin14])
+        start = previous = numbers[0]
+        for number in numbers[1:]:
+            if number != previous + 1:
+                ranges.append(SerialRange(gtin14, start, previous))
+                start = number
+            previous = number
+        ranges.append(SerialRange(gtin14, start, previous))
+    return ranges, others
+
+
+def compress_to_pattern_urns(values, company_prefix_length: int = 6,
+                             serial_number_length: int = 12):
+    """
+    Compresses the values into EPC pattern URNs.  See `compress_serials`
+    for the parameters.
+    :return: A tuple of a list of pattern URNs and a list of the values
+    that could not be compressed.
+    """
+    ranges, others = compress_serials(values, company_prefix_length,
+                                      serial_number_length)
+    return [serial_range.pattern_urn(company_prefix_length)
+            for serial_range in ranges], others
+
+
+def expand_ranges(ranges, output: str = URN,
+                  company_prefix_length: int = None,
+                  parenthesis: bool = False,
+                  serial_number_length: int = None):
+    """
+    Lazily expands ranges back into individual values.  Nothing is
+    generated until the result is iterated over and only one block of
+    values is held in memory at a time.
+    :param ranges: An iterable of `SerialRange` instances, (gtin14, start,
+    end) tuples or SGTIN pattern URNs.
+    :param output: urn or barcode.
+    :param company_prefix_length: The length of the company prefix.
+    Required for urn output unless the ranges are pattern URNs.
+    :param parenthesis: Whether or not to put parenthesis around the app
+    identifiers of barcode output.
+    :param serial_number_length: If supplied, barcode serial numbers are
+    left padded with zeros to this length.
+    :return: A generator of strings.
+    """
+    for serial_range in ranges:
+        prefix_length = company_prefix_length
+        if isinstance(serial_range, str):
+            urn = serial_range
+            serial_range = SerialRange.from_pattern_urn(urn)
+            prefix_length = len(urn.split(':')[4].split('.')[0])
+        gtin14, start, end = serial_range
+        for block in sgtin_blocks(gtin14, start, end - start + 1,
+                                  company_prefix_length=prefix_length,
+                                  output=output, parenthesis=parenthesis,
+                                  serial_number_length=serial_number_length,
+                                  block_size=_EXPANSION_BLOCK_SIZE):
+            yield from block
@@ -0,0 +1,271 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Checks, in the same pass as the conversion, that every EPC an EPCIS
+document aggregates or ships was commissioned, either in the document or
+beforehand.
+
+The commissioned EPCs are kept in an `EPCSet` of 8 byte digests rather
+than a set of URN strings, so tens of millions of them fit in a few
+hundred megabytes.  Only the EPCs that are referenced before (or without)
+being commissioned are kept as strings, to report them.
+"""
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+
+from gs123.aggregation import EVENT_NAMES
+from gs123.xml_conversion import convert_xml_file, convert_xml_string
+
+# the elements with the EPCs the reconciliation compares.  They are always
+# converted, as a barcode would never equal the URN it converts to.
+EPC_ELEMENTS = frozenset(('epc', 'parentID'))
+
+# the digests are spread over this many sorted arrays to keep inserts cheap
+_BUCKET_BITS = 12
+_BUCKET_SHIFT = 64 - _BUCKET_BITS
+
+
+def business_step(value: str) -> str:
+    """
+    Returns the name of a CBV business step, for example commissioning,
+    from a bizStep value in the CBV 1.x URN form
+    (urn:epcglobal:cbv:bizstep:commissioning), the CBV 2.0 URI form
+    (https://ref.gs1.org/cbv/BizStep-commissioning) or the bare name.
+    """
+    value = value.strip()
+    if value.startswith('urn:'):
+        return value.rpartition(':')[2]
+    return value.rpartition('/')[2].rpartition('BizStep-')[2]
+
+
+def target_epc_elements(target_elements):
+    """
+    Returns the target elements of a conversion with the `EPC_ELEMENTS`
+    added, or None (every element) as it is.
+    """
+    if target_elements is None:
+        return None
+    return frozenset(target_elements) | EPC_ELEMENTS
+
+
+def epc_digest(epc: str) -> int:
+    """
+    Returns the 64 bit digest an `EPCSet` stores for an EPC.
+    """
+    return int.from_bytes(
+        blake2b(epc.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class EPCSet:
+    """
+    A set of EPCs that stores a 64 bit digest of each one in sorted arrays.
+    It costs about 8 bytes per EPC, and it can not be iterated since the
+    EPCs themselves are not kept.  With 64 bit digests a lookup of an EPC
+    that is not in a set of 100 million EPCs is wrongly found with a
+    probability of about one in 200 billion.
+    """
+
+    def __init__(self, epcs=()):
+        """
+        :param epcs: An optional iterable of EPCs to add.
+        """
+        self._buckets = [array('Q') for _ in range(1 << _BUCKET_BITS)]
+        self._size = 0
+        self.update(epcs)
+
+    def add(self, epc: str) -> bool:
+        """
+        Adds an EPC.
+        :return: False if the EPC was already in the set.
+        """
+        return self.add_digest(epc_digest(epc))
+
+    def add_digest(self, digest: int) -> bool:
+        """
+        Adds the `epc_digest` of an EPC.
+        :return: False if the digest was already in the set.
+        """
+        bucket = self._buckets[digest >> _BUCKET_SHIFT]
+        index = bisect_left(bucket, digest)
+        if index < len(bucket) and bucket[index] == digest:
+            return False
+        bucket.insert(index, digest)
+        self._size += 1
+        return True
+
+    def update(self, epcs) -> None:
+        """
+        Adds every EPC in an iterable.
+        """
+        for epc in epcs:
+            self.add_digest(epc_digest(epc))
+
+    def contains_digest(self, digest: int) -> bool:
+        """
+        Returns True if the `epc_digest` of an EPC is in the set.
+        """
+        bucket = self._buckets[digest >> _BUCKET_SHIFT]
+        index = bisect_left(bucket, digest)
+        return index < len(bucket) and bucket[index] == digest
+
+    def __contains__(self, epc):
+        return self.contains_digest(epc_digest(epc))
+
+    def __len__(self):
+        return self._size
+
+
+class Reconciliation:
+    """
+    Collects the EPCs of the EPCIS events as a document is converted.  The
+    EPCs of ObjectEvents with the commissioning business step are added
+    to the commissioned set; the parentID and childEPCs of ADD
+    AggregationEvents and the EPCs of every event with the shipping
+    business step must be in it by the end of the document.  Pass a
+    `Reconciliation` in the `observers` of the XML converters, or use
+    `reconcile_xml_file` and `reconcile_xml_string`.
+    """
+
+    def __init__(self, commissioned=None):
+        """
+        :param commissioned: An optional `EPCSet`, or an iterable of EPCs,
+        that were commissioned before the document.  An `EPCSet` is used
+        (and added to) as it is.
+        """
+        if not isinstance(commissioned, EPCSet):
+            commissioned = EPCSet(commissioned or ())
+        self.commissioned = commissioned
+        self.checked = 0
+        self._pending = {}
+        self._event_epcs = []
+        self._event_parent = None
+        self._event_action = None
+        self._event_step = None
+
+    @property
+    def missing(self) -> list:
+        """
+        The EPCs that were aggregated or shipped but not commissioned, in
+        the order they were first referenced.
+        """
+        return list(self._pending.values())
+
+    @property
+    def reconciled(self) -> bool:
+        """
+        True if no EPCs are missing.
+        """
+        return not self._pending
+
+    def element_end(self, element) -> None:
+        """
+        Collects the EPCs, parentID, action and business step of each
+        EPCIS event and reconciles the event when it ends.
+        :param element: An lxml element.
+        :return: None
+        """
+        name = element.tag.rpartition('}')[2]
+        if name == 'epc':
+            if element.text:
+                self._event_epcs.append(element.text.strip())
+        elif name == 'parentID':
+            self._event_parent = (element.text or '').strip() or None
+        elif name == 'action':
+            self._event_action = (element.text or '').strip()
+        elif name == 'bizStep':
+            self._event_step = business_step(element.text or '')
+        elif name in EVENT_NAMES:
+            self._end_event(name)
+            self._event_epcs = []
+            self._event_parent = None
+            self._event_action = None
+            self._event_step = None
+
+    def _end_event(self, name):
+        epcs = self._event_epcs
+        if self._event_parent:
+            epcs.append(self._event_parent)
+        if self._event_step == 'commissioning' and name == 'ObjectEvent' \
+                and self._event_action == 'ADD':
+            for epc in epcs:
+                self._commission(epc)
+        elif self._event_step == 'shipping' or (
+                name == 'AggregationEvent' and self._event_action == 'ADD'):
+            for epc in epcs:
+                self._check(epc)
+
+    def _commission(self, epc):
+        digest = epc_digest(epc)
+        self.commissioned.add_digest(digest)
+        self._pending.pop(digest, None)
+
+    def _check(self, epc):
+        self.checked += 1
+        digest = epc_digest(epc)
+        if digest not in self._pending and \
+                not self.commissioned.contains_digest(digest):
+            self._pending[digest] = epc
+
+
+def reconcile_xml_file(file_path: str,
+                       output_file_path: str,
+                       company_prefix_length: int = 6,
+                       serial_number_length: int = 12,
+                       commissioned=None,
+                       **kwargs) -> Reconciliation:
+    """
+    Converts an XML file like `gs123.xml_conversion.convert_xml_file` and
+    reconciles its commissioned EPCs with the aggregated and shipped ones
+    in the same pass.
+    :param file_path: The file to parse.
+    :param output_file_path: The new file to create.
+    :param company_prefix_length: The company prefix length.
+    :param serial_number_length: The serial number length.
+    :param commissioned: An optional `EPCSet` or iterable of EPC URNs
+    that were commissioned before the document.
+    :param kwargs: Any other `convert_xml_file` arguments.  The
+    `EPC_ELEMENTS` are added to any target_elements.
+    :return: The `Reconciliation`; its `missing` property lists the EPCs
+    that were not commissioned.
+    """
+    reconciliation = Reconciliation(commissioned)
+    observers = list(kwargs.pop('observers', None) or ())
+    kwargs['target_elements'] = target_epc_elements(
+        kwargs.get('target_elements'))
+    convert_xml_file(file_path, output_file_path, company_prefix_length,
+                     serial_number_length,
+                     observers=observers + [reconciliation], **kwargs)
+    return reconciliation
+
+
+def reconcile_xml_string(data,
+                         company_prefix_length: int = 6,
+                         serial_number_length: int = 12,
+                         commissioned=None,
+                         **kwargs) -> tuple:
+    """
+    The `convert_xml_string` version of `reconcile_xml_file`.
+    :return: A tuple of the converted XML bytes and the `Reconciliation`.
+    """
+    reconciliation = Reconciliation(commissioned)
+    observers = list(kwargs.pop('observers', None) or ())
+    kwargs['target_elements'] = target_epc_elements(
+        kwargs.get('target_elements'))
+    converted = convert_xml_string(data, company_prefix_length,
+                                   serial_number_length,
+                                   observers=observers + [reconciliation],
+                                   **kwargs)
+    return converted, reconciliation
@@ -0,0 +1,331 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Streaming converters for record oriented files: CSV, JSON Lines and plain
+text with one barcode per line.  Records are read and written in batches of
+`batch_size` so memory use does not depend on the size of the file.
+"""
+import csv
+import json
+from io import TextIOWrapper
+from itertools import islice
+from gs123.batch import BarcodeBatchConverter
+from gs123.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+
+# the BarcodeConverter properties that can be added to each record
+FIELD_NAMES = ('gtin14', 'serial_number', 'lot', 'expiration_date')
+
+DEFAULT_BATCH_SIZE = 1000
+
+# the convert_csv parameters that are not passed on to the csv module
+_CONVERTER_KWARGS = frozenset((
+    'company_prefix_length', 'serial_number_length', 'add_fields',
+    'batch_size', 'converter', 'header', 'on_batch', 'profile'
+))
+
+
+def convert_csv(input_stream, output_stream, columns,
+                company_prefix_length: int = 6,
+                serial_number_length: int = 12,
+                add_fields: bool = False,
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                converter: BarcodeBatchConverter = None,
+                header=None,
+                on_batch=None,
+                profile=None,
+                **csv_kwargs) -> int:
+    """
+    Reads CSV records (with a header row) from the input stream, converts
+    the barcodes in the named columns and writes the records to the output
+    stream.  Values that are not barcodes are left as they are.
+    :param input_stream: A text file object to read from.
+    :param output_stream: A text file object to write to.
+    :param columns: The names of the columns to convert.
+    :param company_prefix_length: The length of the company prefix.
+    :param serial_number_length: The serial number length.
+    :param add_fields: If true gtin14, serial_number, lot and
+    expiration_date columns are appended to each record.  If more than one
+    column is converted the new columns are prefixed with the column name.
+    :param batch_size: The number of records converted at a time.
+    :param converter: An optional `gs123.batch.BarcodeBatchConverter` to
+    use instead of one built from the lengths above.
+    :param header: The header row, if the input stream is positioned after
+    it (when resuming a conversion).  It is not written to the output.
+    :param on_batch: An optional function called with the number of
+    records written so far after each batch.
+    :param profile: An optional `gs123.profile.ConversionProfile` for the
+    converter to use instead of the lengths above.
+    :param csv_kwargs: Passed to `csv.reader` and `csv.writer` (for
+    example delimiter).
+    :return: The number of records written.
+    """
+    reader = csv.reader(input_stream, **csv_kwargs)
+    writer = csv.writer(output_stream, lineterminator='\n', **csv_kwargs)
+    write_header = header is None
+    if write_header:
+        try:
+            header = next(reader)
+        except StopIteration:
+            return 0
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError('The columns %s are not in the CSV header.'
+                         % ', '.join(missing))
+    indexes = [header.index(column) for column in columns]
+    if write_header:
+        writer.writerow(header + _field_columns(columns) if add_fields
+                        else header)
+    converter = converter or BarcodeBatchConverter(
+        company_prefix_length, serial_number_length, profile=profile)
+    width = len(header)
+    count = 0
+    for records in _batches(reader, batch_size):
+        if add_fields:
+            # the added columns go after the header's last column
+            for record in records:
+                if len(record) < width:
+                    record.extend([''] * (width - len(record)))
+        for record in _convert_records(records, indexes, converter,
+                                       add_fields, ''):
+            writer.writerow(record)
+        count += len(records)
+        if on_batch is not None:
+            on_batch(count)
+    return count
+
+
+def convert_jsonl(input_stream, output_stream, keys,
+                  company_prefix_length: int = 6,
+                  serial_number_length: int = 12,
+                  add_fields: bool = False,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  converter: BarcodeBatchConverter = None,
+                  on_batch=None,
+                  profile=None) -> int:
+    """
+    Reads JSON Lines records (one JSON object per line) from the input
+    stream, converts the barcodes under the named keys and writes the
+    records to the output stream.  Blank lines are skipped and lines that
+    are JSON values other than objects are written unchanged.
+    :param input_stream: A text file object to read from.
+    :param output_stream: A text file object to write to.
+    :param keys: The top-level keys to convert.
+    :param add_fields: If true gtin14, serial_number, lot and
+    expiration_date keys are added to each record.
+    See `convert_csv` for the other parameters.
+    :return: The number of records written.
+    """
+    converter = converter or BarcodeBatchConverter(
+        company_prefix_length, serial_number_length, profile=profile)
+    lines = (line for line in input_stream if line.strip())
+    count = 0
+    for batch in _batches(lines, batch_size):
+        records = [json.loads(line) for line in batch]
+        for record in _convert_records(records, keys, converter,
+                                       add_fields, None):
+            output_stream.write(json.dumps(record))
+            output_stream.write('\n')
+        count += len(records)
+        if on_batch is not None:
+            on_batch(count)
+    return count
+
+
+def convert_lines(input_stream, output_stream,
+                  company_prefix_length: int = 6,
+                  serial_number_length: int = 12,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  converter: BarcodeBatchConverter = None,
+                  on_batch=None,
+                  profile=None) -> int:
+    """
+    Converts a plain text stream with one barcode per line.  Lines that are
+    not barcodes are written out as they are.
+    See `convert_csv` for the parameters.
+    :return: The number of lines written.
+    """
+    converter = converter or BarcodeBatchConverter(
+        company_prefix_length, serial_number_length, profile=profile)
+    count = 0
+    for batch in _batches(input_stream, batch_size):
+        values = [line.rstrip('\r\n') for line in batch]
+        converted = converter.convert_batch(values)
+        output_stream.writelines(
+            '%s\n' % (new if new is not None else value)
+            for value, new in zip(values, converted)
+        )
+        count += len(values)
+        if on_batch is not None:
+            on_batch(count)
+    return count
+
+
+def convert_file(file_path: str, output_file_path: str, file_format: str,
+                 columns=None, checkpoint: bool = False,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+                 **kwargs) -> int:
+    """
+    Opens the input and output files and calls the converter for the
+    format.
+    :param file_path: The file to convert.
+    :param output_file_path: The file to create.
+    :param file_format: csv, jsonl or lines.
+    :param columns: The columns (csv) or keys (jsonl) to convert.
+    :param checkpoint: If true, the progress of the conversion is saved
+    to a checkpoint file next to the output file every
+    `checkpoint_interval` records (at the end of a batch) and a conversion
+    that was interrupted carries on from the last checkpoint.  The output
+    is the same as that of an uninterrupted conversion.
+    :param checkpoint_interval: The number of records between checkpoints.
+    :param kwargs: Passed to the converter function.
+    :return: The number of records written.
+    """
+    if file_format not in ('csv', 'jsonl', 'lines'):
+        raise ValueError('Unsupported file format %s.' % file_format)
+    if checkpoint:
+        return _convert_file_checkpointed(file_path, output_file_path,
+                                          file_format, columns,
+                                          checkpoint_interval, kwargs)
+    with open(file_path, newline='', encoding='utf-8') as input_stream, \
+        open(output_file_path, 'w', newline='',
+             encoding='utf-8') as output_stream:
+        return _convert_stream(input_stream, output_stream, file_format,
+                               columns, kwargs)
+
+
+def _convert_stream(input_stream, output_stream, file_format, columns,
+                    kwargs):
+    if file_format == 'csv':
+        return convert_csv(input_stream, output_stream, columns, **kwargs)
+    elif file_format == 'jsonl':
+        return convert_jsonl(input_stream, output_stream, columns, **kwargs)
+    return convert_lines(input_stream, output_stream, **kwargs)
+
+
+def _convert_file_checkpointed(file_path, output_file_path, file_format,
+                               columns, checkpoint_interval, kwargs):
+    """
+    Converts the file, saving the input offset, output offset and record
+    count to a checkpoint file after every `checkpoint_interval` records
+    and resuming from the last checkpoint if there is one.
+    """
+    config = dict(kwargs, file_format=file_format, columns=columns)
+    converter = config.pop('converter', None)
+    if converter is not None:
+        config['converter'] = [converter.company_prefix_length,
+                               converter.serial_number_length,
+                               converter.property_name]
+        if converter.profile is not None:
+            config['converter'].append(converter.profile.settings)
+    if config.get('profile') is not None:
+        config['profile'] = config['profile'].settings
+    checkpoint = Checkpoint(file_path, output_file_path, config)
+    state = checkpoint.load()
+    with open(file_path, 'rb') as input_file, \
+            checkpoint.open_output(state) as output_file:
+        position = [0]
+        lines = _read_lines(input_file, position)
+        records = 0
+        if state is not None:
+            if file_format == 'csv':
+                # the header is read again from the start of the file
+                csv_kwargs = {key: value for key, value in kwargs.items()
+                              if key not in _CONVERTER_KWARGS}
+                kwargs = dict(kwargs, header=next(
+                    csv.reader(lines, **csv_kwargs)))
+            input_file.seek(state['input_offset'])
+            position[0] = state['input_offset']
+            records = state['records']
+        output_stream = TextIOWrapper(output_file, encoding='utf-8',
+                                      newline='')
+        saved = [0]
+
+        def on_batch(count):
+            if count - saved[0] >= checkpoint_interval:
+                output_stream.flush()
+                checkpoint.commit(output_file, input_offset=position[0],
+                                  records=records + count)
+                saved[0] = count
+
+        count = _convert_stream(lines, output_stream, file_format, columns,
+                                dict(kwargs, on_batch=on_batch))
+        output_stream.flush()
+        output_stream.detach()
+    checkpoint.remove()
+    return records + count
+
+
+def _read_lines(input_file, position):
+    """
+    Yields the lines of a binary file decoded as UTF-8 and keeps
+    position[0] at the offset of the end of the last line yielded.
+    """
+    for line in input_file:
+        position[0] += len(line)
+        yield line.decode('utf-8')
+
+
+def _batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _field_columns(columns):
+    if len(columns) == 1:
+        return list(FIELD_NAMES)
+    return ['%s_%s' % (column, field) for column in columns
+            for field in FIELD_NAMES]
+
+
+def _convert_records(records, keys, converter, add_fields, empty):
+    """
+    Converts the values under keys (list indexes or dict keys) in a batch
+    of records, in place, and returns the records.  JSON Lines records
+    (an `empty` of None) that are not objects are returned unchanged.
+    """
+    for key_number, key in enumerate(keys):
+        values = [_get(record, key) for record in records]
+        if add_fields:
+            parsed = converter.parse_batch(values)
+            converted = [None if item is None
+                         else getattr(item, converter.property_name)
+                         for item in parsed]
+        else:
+            converted = converter.convert_batch(values)
+        for index, record in enumerate(records):
+            if converted[index] is not None:
+                record[key] = converted[index]
+            if add_fields:
+                item = parsed[index]
+                fields = [empty if item is None else getattr(item, field)
+                          for field in FIELD_NAMES]
+                if isinstance(record, dict):
+                    names = FIELD_NAMES if len(keys) == 1 else \
+                        ['%s_%s' % (key, field) for field in FIELD_NAMES]
+                    record.update(zip(names, fields))
+                elif empty is not None:
+                    record.extend(fields)
+    return records
+
+
+def _get(record, key):
+    try:
+        return record[key]
+    except (IndexError, KeyError, TypeError):
+        return None
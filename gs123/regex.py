@@ -15,7 +15,10 @@
 
 # To edit this go here: https://regex101.com/r/v9CJm9/3
 
-import re
+import threading
+
+from gs123.digital_link import is_digital_link, match_digital_link
+from gs123.lazy import LazyPattern
 
 _NUMERIC_GS1_01_21_OPTIONAL_17_10 = (r'^\(01\)(?P<gtin14>[0-9]{14})'
                                      r'\(21\)(?P<serial_number>[0-9, A-Z]{1,20})'
@@ -35,19 +38,19 @@ _NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10 = \
      r'(17(?P<expiration_date>(\d{6}))'
      r'10(?P<lot>[\x21-\x22\x25-\x2F\x30-\x39\x41-\x5A\x5F\x61-\x7A]{0,20}))?$')
 
-NUMERIC_GS1_01_21_OPTIONAL_17_10 = re.compile(
+NUMERIC_GS1_01_21_OPTIONAL_17_10 = LazyPattern(
     _NUMERIC_GS1_01_21_OPTIONAL_17_10)
 
-NO_PARENS_NUMERIC_GS1_01_21 = re.compile(_NO_PARENS_NUMERIC_GS1_01_21)
+NO_PARENS_NUMERIC_GS1_01_21 = LazyPattern(_NO_PARENS_NUMERIC_GS1_01_21)
 
 _ALPHA_01_21_GTIN_NO_PARENS = r'^01(?P<gtin14>[0-9]{14})21(?P<serial_number>[0-9,a-z,A-Z]{10,20})$'
-ALPHA_01_21_GTIN_NO_PARENS = re.compile(_ALPHA_01_21_GTIN_NO_PARENS)
+ALPHA_01_21_GTIN_NO_PARENS = LazyPattern(_ALPHA_01_21_GTIN_NO_PARENS)
 
 
 # https://regex101.com/r/RkpSY6/3/
 # universal, works with just about every pattern
 _SGTIN_SN_10_13_ALPHA = r'^(01|\(01\))(?P<gtin14>[0-9]{14})(21|\(21\))(?P<serial_number>[0-9,a-z,A-Z]{10,13})((17|\(17\))(?P<expiration_date>\d{6}))?((10|\(10\))(?P<lot>[\x21-\x22\x25-\x2F\x30-\x39\x3A-\x3F\x41-\x5A\x5F\x61-\x7A]{0,20}))?$'
-SGTIN_SN_10_13_ALPHA = re.compile(_SGTIN_SN_10_13_ALPHA)
+SGTIN_SN_10_13_ALPHA = LazyPattern(_SGTIN_SN_10_13_ALPHA)
 
 
 def get_no_parens_numeric_gs1_01_21_optional_17_10(serial_number_length=12):
@@ -61,20 +64,20 @@ def get_no_parens_numeric_gs1_01_21_optional_17_10(serial_number_length=12):
     pattern = _NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10.replace(
         '{%serial_number_length%}', str(serial_number_length)
     )
-    return re.compile(pattern)
+    return LazyPattern(pattern).compile()
 
 
 # https://regex101.com/r/H0fHK8/5
 _FNC1_SERIAL = r'^01(?P<gtin14>[0-9]{14})21(?P<serial_number>[0-9,A-Z]*?(\x1d\b))(17(?P<expiration_date>[0-9]{6})10(?P<lot>[\x21-\x22\x25-\x2F\x30-\x39\x41-\x5A\x5F\x61-\x7A]{0,20}))?'
-FNC1_SERIAL = re.compile(_FNC1_SERIAL)
+FNC1_SERIAL = LazyPattern(_FNC1_SERIAL)
 
 # https://regex101.com/r/ivtuux/1/
 _SSCC = r'^(00|\(00\))?(?P<sscc18>\d{18})$'
-SSCC = re.compile(_SSCC)
+SSCC = LazyPattern(_SSCC)
 
 #https://regex101.com/r/PsHODE/1
 _GTIN14 = r'^(01|\(01\))?(?P<gtin14>\d{14})$'
-GTIN14 = re.compile(_GTIN14)
+GTIN14 = LazyPattern(_GTIN14)
 
 # https://regex101.com/r/wjN6lC/1/
 NO_PARENS_NUMERIC_GS1_01_21_IN_DOC = r'01(?P<gtin14>[0-9]{14})21(?P<serial_number>[0-9,A-Z]{1,20})'
@@ -83,11 +86,38 @@ NO_PARENS_NUMERIC_GS1_01_21_IN_DOC = r'01(?P<gtin14>[0-9]{14})21(?P<serial_numbe
 SGTIN_URN = r'urn:epc:id:sgtin:(?P<company_prefix>[0-9]{1,12})\.(?P<item_reference>[0-9]{1,10})\.(?P<serial_number>[0-9a-zA-Z]{1,20})'
 
 # https://regex101.com/r/LiUT8U/1
-SSCC_URN = r'urn:epc:id:sscc:(?P<company_prefix>[0-9]{4,12})\.(?P<serial_number>[0-9]{1,10})'
+SSCC_URN = (r'urn:epc:id:sscc:(?P<company_prefix>[0-9]{4,12})\.'
+            r'(?P<serial_number>[0-9]{1,13})')
+
+# EPC class level identifiers as used in EPCIS quantity lists
+_GTIN14_LOT = (r'^(01|\(01\))(?P<gtin14>\d{14})'
+               r'((10|\(10\))(?P<lot>[\x21-\x22\x25-\x2F\x30-\x39\x3A-\x3F'
+               r'\x41-\x5A\x5F\x61-\x7A]{1,20}))?$')
+GTIN14_LOT = LazyPattern(_GTIN14_LOT)
+
+LGTIN_URN = (r'^urn:epc:class:lgtin:(?P<company_prefix>[0-9]{1,12})\.'
+             r'(?P<item_reference>[0-9]{1,10})\.(?P<lot>.{1,20})$')
+
+SGTIN_CLASS_PATTERN_URN = (r'^urn:epc:idpat:sgtin:'
+                           r'(?P<company_prefix>[0-9]{1,12})\.'
+                           r'(?P<item_reference>[0-9]{1,10})\.\*$')
+
+# an SGTIN pattern URN with a serial number range or a single serial number
+_SGTIN_RANGE_PATTERN_URN = (
+    r'^urn:epc:idpat:sgtin:(?P<company_prefix>[0-9]{1,12})\.'
+    r'(?P<item_reference>[0-9]{1,10})\.'
+    r'(?:\[(?P<start>[0-9]{1,20})-(?P<end>[0-9]{1,20})\]'
+    r'|(?P<serial_number>[0-9]{1,20}))$')
+SGTIN_RANGE_PATTERN_URN = LazyPattern(_SGTIN_RANGE_PATTERN_URN)
+
+class_urn_patterns = [
+    LazyPattern(LGTIN_URN),
+    LazyPattern(SGTIN_CLASS_PATTERN_URN)
+]
 
 urn_patterns = [
-    re.compile(SGTIN_URN),
-    re.compile(SSCC_URN)
+    LazyPattern(SGTIN_URN),
+    LazyPattern(SSCC_URN)
 ]
 
 patterns = [
@@ -95,42 +125,186 @@ patterns = [
     SSCC
 ]
 
-def match_pattern(barcode_val: str, max_serial_number_length=14):
+# the fallback cascade used by `match_pattern` for values that could not be
+# matched via their leading app identifier.  None of the patterns can match
+# the same value with different results (FNC1_SERIAL requires the \x1d
+# character the others exclude and a 17/10 suffix never fits within the
+# 20 character serial number of NO_PARENS_NUMERIC_GS1_01_21) so the order
+# can be changed by a `PatternRegistry` without changing the output.
+FALLBACK_PATTERNS = (
+    ('NO_PARENS_NUMERIC_GS1_01_21', NO_PARENS_NUMERIC_GS1_01_21),
+    ('NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10',
+     LazyPattern(_NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10.replace(
+         '{%serial_number_length%}', '12'))),
+    ('FNC1_SERIAL', FNC1_SERIAL),
+)
+
+# every pattern `match_pattern` can use, by name.
+BARCODE_PATTERNS = dict(
+    FALLBACK_PATTERNS,
+    SGTIN_SN_10_13_ALPHA=SGTIN_SN_10_13_ALPHA,
+    ALPHA_01_21_GTIN_NO_PARENS=ALPHA_01_21_GTIN_NO_PARENS,
+    SSCC=SSCC
+)
+
+
+class PatternRegistry:
+    """
+    Keeps hit counters for the patterns used by `match_pattern` and
+    reorders the fallback cascade so that the most frequently matched
+    formats are tried first.  Create one per converter, step or document
+    and pass it into `match_pattern` (or `BarcodeConverter`) via the
+    `registry` parameter.
+
+    The order only changes every `reorder_interval` hits and ties are
+    broken by the default order so the behavior is deterministic for any
+    given sequence of values.  If the format of the inbound values is
+    known ahead of time it can be pinned, in which case only that pattern
+    is used and detection is skipped entirely.
+
+    A registry can be shared between threads.  Hits are counted, and the
+    cascade reordered, under a lock; the cascade and the pinned format are
+    replaced rather than changed so readers always see a whole one.
+    """
+
+    def __init__(self, reorder_interval: int = 100, pinned: str = None):
+        """
+        :param reorder_interval: The number of hits after which the
+        fallback cascade is reordered.
+        :param pinned: The name of a pattern in `BARCODE_PATTERNS` to use
+        for every value.
+        """
+        self.reorder_interval = reorder_interval
+        self.hits = dict.fromkeys(BARCODE_PATTERNS, 0)
+        self.fallback_patterns = FALLBACK_PATTERNS
+        self._pending = 0
+        self._pinned = None
+        self._lock = threading.Lock()
+        if pinned:
+            self.pin(pinned)
+
+    @property
+    def pinned(self):
+        """
+        Returns a (name, compiled pattern) tuple for the pinned format or
+        None if no format is pinned.
+        """
+        return self._pinned
+
+    def pin(self, name: str) -> None:
+        """
+        Pins a known format so that every value is matched against that
+        pattern only.
+        :param name: The name of a pattern in `BARCODE_PATTERNS`.
+        :return: None
+        """
+        try:
+            self._pinned = (name, BARCODE_PATTERNS[name])
+        except KeyError:
+            raise ValueError(
+                'Unknown barcode format %s.  Valid formats are: %s' % (
+                    name, ', '.join(sorted(BARCODE_PATTERNS)))
+            )
+
+    def unpin(self) -> None:
+        """
+        Removes any pinned format.
+        :return: None
+        """
+        self._pinned = None
+
+    def record_hit(self, name: str) -> None:
+        """
+        Records a match for the named pattern and reorders the fallback
+        cascade every `reorder_interval` hits.
+        :param name: The name of the pattern that matched.
+        :return: None
+        """
+        with self._lock:
+            self.hits[name] += 1
+            self._pending += 1
+            if self._pending >= self.reorder_interval:
+                self._reorder()
+
+    def reorder(self) -> None:
+        """
+        Sorts the fallback cascade by descending hit count.
+        :return: None
+        """
+        with self._lock:
+            self._reorder()
+
+    def _reorder(self):
+        self._pending = 0
+        defaults = [name for name, pattern in FALLBACK_PATTERNS]
+        self.fallback_patterns = tuple(sorted(
+            FALLBACK_PATTERNS,
+            key=lambda item: (-self.hits[item[0]], defaults.index(item[0]))
+        ))
+
+
+def match_pattern(barcode_val: str, max_serial_number_length=14,
+                  stats=None, registry: PatternRegistry = None):
     """
     Will use the regular expressions in this module to find common barcode
     components and return the match.  For an example of how to use this see
-    the `gs123.conversion.BarcodeConverter._populate` function.
+    the `gs123.conversion.BarcodeConverter._populate` function.  The
+    fallback pattern for values without parenthesis that have 17 and 10
+    fields always has a 12 digit serial number, as it always has; a
+    `gs123.profile.ConversionProfile` compiles it for other lengths.
+    GS1 Digital Link URIs are parsed with
+    `gs123.digital_link.match_digital_link` instead of the patterns.
     :param barcode_val: The value to match.
+    :param stats: An optional `gs123.stats.ConversionStats` instance to
+    record which pattern matched.
+    :param registry: An optional `PatternRegistry` that orders the fallback
+    patterns by hit rate or pins a single format.
     :return: A regex match or none.
     """
+    if is_digital_link(barcode_val):
+        match = match_digital_link(barcode_val)
+        if stats is not None:
+            if match is not None:
+                stats.record_match('DIGITAL_LINK')
+            else:
+                stats.record_miss()
+        return match
     match = False
-    matches = []
+    name = None
     barcode_val = str(barcode_val)
-    if barcode_val.startswith('(01)'):
+    # read once, another thread can unpin the registry at any time
+    pinned = registry.pinned if registry is not None else None
+    if pinned:
+        name, pattern = pinned
+        match = pattern.match(barcode_val)
+    elif barcode_val.startswith('(01)'):
+        name = 'SGTIN_SN_10_13_ALPHA'
         match = SGTIN_SN_10_13_ALPHA.match(
             barcode_val
         )
     elif barcode_val.startswith('01'):
         if len(barcode_val) <= 18 + max_serial_number_length:
+            name = 'ALPHA_01_21_GTIN_NO_PARENS'
             match = ALPHA_01_21_GTIN_NO_PARENS.match(
                 barcode_val
             )
     elif barcode_val.startswith('(00)') or barcode_val.startswith('00'):
+        name = 'SSCC'
         match = SSCC.match(
             barcode_val
         )
-    if not match:
-        if not match:
-            match = NO_PARENS_NUMERIC_GS1_01_21.match(
-                barcode_val
-            )
-        if not match:
-            match = get_no_parens_numeric_gs1_01_21_optional_17_10(
-            ).match(
-                barcode_val
-            )
-        if not match:
-            match = FNC1_SERIAL.match(
-                barcode_val
-            )
+    if not match and not pinned:
+        fallback_patterns = FALLBACK_PATTERNS if registry is None \
+            else registry.fallback_patterns
+        for name, pattern in fallback_patterns:
+            match = pattern.match(barcode_val)
+            if match:
+                break
+    if match and registry is not None:
+        registry.record_hit(name)
+    if stats is not None:
+        if match:
+            stats.record_match(name)
+        else:
+            stats.record_miss()
     return match
@@ -0,0 +1,201 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Decoding of raw scanner payloads: the data a handheld or line scanner
+transmits, with an optional symbology identifier (]C1, ]d2, ]Q3...) in
+front, FNC1 characters sent as GS (or some other separator) and sometimes
+a leading FNC1 as well.  Each payload is split into its GS1 application
+identifiers in one pass and the result can be handed straight to
+`gs123.conversion.BarcodeConverter.from_match`, so the barcode does not
+have to be cleaned up and matched against the regular expressions again.
+"""
+from gs123.conversion import BarcodeConverter, FNC1
+from gs123.elements import ElementString, FIXED_LENGTHS, \
+    parse_element_string
+
+# the symbology identifiers of the GS1 symbologies (ISO/IEC 15424)
+GS1_SYMBOLOGIES = {
+    ']C1': 'GS1-128',
+    ']e0': 'GS1 DataBar',
+    ']d2': 'GS1 DataMatrix',
+    ']Q3': 'GS1 QR Code',
+    ']J1': 'GS1 DotCode',
+}
+
+# the ways scanners and scanner logs are known to send FNC1: the GS
+# character, the text <GS> and the 0xE8 FNC1 codeword of some keyboard
+# wedge settings
+DEFAULT_SEPARATORS = (FNC1, '<GS>', '\xe8')
+
+
+class ScannedBarcode:
+    """
+    The symbology identifier and parsed element string of one decoded
+    scanner payload.  The values are read from the
+    `gs123.elements.ElementString` when they are asked for and `groupdict`
+    returns the groups of the `gs123.regex` patterns, so the instance can
+    be passed to `BarcodeConverter.from_match`.
+    """
+    __slots__ = ('symbology', 'elements')
+
+    def __init__(self, symbology, elements: ElementString):
+        """
+        :param symbology: The symbology identifier (for example ]d2) or
+        None if the payload did not start with one.
+        :param elements: The `gs123.elements.ElementString` of the payload.
+        """
+        self.symbology = symbology
+        self.elements = elements
+
+    @property
+    def is_gs1(self) -> bool:
+        """
+        True if the symbology identifier is that of a GS1 symbology.  A
+        payload without an identifier is assumed to be GS1 data.
+        """
+        return self.symbology is None or self.symbology in GS1_SYMBOLOGIES
+
+    def get(self, application_identifier: str, default=None):
+        """
+        Returns the value of an application identifier.
+        :param application_identifier: For example 01 or 3103.
+        :param default: Returned if the identifier is not in the payload.
+        """
+        return self.elements.get(application_identifier, default)
+
+    @property
+    def element_string(self) -> str:
+        """
+        The payload without its symbology identifier and with GS after
+        every variable length value that is not the last.
+        """
+        parts = []
+        last = len(self.elements) - 1
+        for index, (ai, value) in enumerate(self.elements.items()):
+            parts.append(ai + value)
+            if index < last and ai[:2] not in FIXED_LENGTHS:
+                parts.append(FNC1)
+        return ''.join(parts)
+
+    @property
+    def convertible(self) -> bool:
+        """
+        True for an SSCC or a serialized GTIN (01 and 21).
+        """
+        return self.elements.convertible
+
+    def groupdict(self) -> dict:
+        """
+        Returns the fields in the form of a `gs123.regex` match, see
+        `gs123.elements.ElementString.groupdict`.
+        """
+        return self.elements.groupdict()
+
+    def group(self, name: str):
+        """
+        Returns one of the `groupdict` fields or None.
+        """
+        return self.elements.group(name)
+
+    def __eq__(self, other):
+        return isinstance(other, ScannedBarcode) and \
+            self.symbology == other.symbology and \
+            self.elements == other.elements
+
+    def __repr__(self):
+        return 'ScannedBarcode(%r, %r)' % (self.symbology, self.elements)
+
+
+def decode_payload(payload, separators=DEFAULT_SEPARATORS):
+    """
+    Decodes one scanner payload.
+    :param payload: The payload as str or bytes (decoded as latin-1 so
+    every byte is kept).  A trailing line break is ignored.
+    :param separators: The strings that stand for FNC1 in the payload.
+    :return: A ScannedBarcode or None if the payload is not a valid GS1
+    element string.
+    """
+    if payload.__class__ is bytes:
+        payload = payload.decode('latin-1')
+    payload = payload.rstrip('\r\n')
+    symbology = None
+    if payload[:1] == ']' and len(payload) >= 3:
+        symbology = payload[:3]
+        payload = payload[3:]
+    for separator in separators:
+        if separator != FNC1 and separator in payload:
+            payload = payload.replace(separator, FNC1)
+    elements = parse_element_string(payload.strip(FNC1))
+    if elements is None:
+        return None
+    return ScannedBarcode(symbology, elements)
+
+
+def decode_payloads(payloads, separators=DEFAULT_SEPARATORS):
+    """
+    Decodes a batch of scanner payloads.
+    :param payloads: An iterable of str and/or bytes payloads.
+    :param separators: The strings that stand for FNC1 in the payloads.
+    :return: A generator of ScannedBarcode instances (or None for the
+    payloads that are not valid).
+    """
+    for payload in payloads:
+        yield decode_payload(payload, separators)
+
+
+def read_scanner_log(input_stream, separators=DEFAULT_SEPARATORS):
+    """
+    Decodes a scanner log with one payload per line.  Blank lines are
+    skipped.
+    :param input_stream: A binary (or text) file object.
+    :param separators: The strings that stand for FNC1 in the log.
+    :return: A generator of ScannedBarcode instances (or None).
+    """
+    for line in input_stream:
+        if line.strip():
+            yield decode_payload(line, separators)
+
+
+def convert_payloads(payloads, company_prefix_length: int,
+                     property_name: str = 'epc_urn',
+                     separators=DEFAULT_SEPARATORS,
+                     stats=None) -> list:
+    """
+    Decodes scanner payloads and converts them with `BarcodeConverter`.
+    :param payloads: An iterable of str and/or bytes payloads.
+    :param company_prefix_length: The length of the company prefix.
+    :param property_name: The BarcodeConverter property to return for
+    each payload.  Default is epc_urn.
+    :param separators: The strings that stand for FNC1 in the payloads.
+    :param stats: An optional `gs123.stats.ConversionStats` instance.
+    :return: A list of the property values, with None for the payloads
+    that are not an SSCC or a serialized GTIN.
+    """
+    from_match = BarcodeConverter.from_match
+    ret = []
+    append = ret.append
+    for payload in payloads:
+        scanned = decode_payload(payload, separators)
+        if scanned is None or not scanned.convertible:
+            if stats is not None:
+                stats.record_miss()
+                stats.record_rejection()
+            append(None)
+            continue
+        if stats is not None:
+            stats.record_match('SCANNER_PAYLOAD')
+        append(getattr(from_match(scanned, company_prefix_length),
+                       property_name))
+    return ret
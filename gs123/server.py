@@ -0,0 +1,572 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+A small HTTP/1.1 conversion server built on asyncio, so that several
+services can share one process that has already imported gs123 and
+compiled its patterns rather than each paying for it.  The endpoints are:
+
+* ``POST /barcodes``: barcodes to EPC URNs;
+* ``POST /urns``: EPC URNs to barcodes;
+* ``POST /xml/barcodes``: the barcodes of an XML document to EPC URNs;
+* ``POST /xml/urns``: the EPC URNs of an XML document to barcodes;
+* ``GET /health``: the number of workers and of requests in progress.
+
+The value endpoints take one value per line and answer with one line per
+line, empty where the value could not be converted, or a JSON array (with
+a ``Content-Type`` of application/json), answered with a JSON array with
+null for those values.  Lines are converted `batch_size` at a time as the
+body arrives and the XML documents are converted as they are parsed, so
+the responses are sent in chunks while the requests are still being read.
+
+Request bodies may be sent with a Content-Length or chunked, and
+connections are kept alive between requests.  The values are converted by
+a pool of threads that is started, and has converted a value of each
+kind, before the first request is accepted.  At most `max_concurrency`
+requests are converted at once and the others wait without their bodies
+being read.  Every response chunk is drained to the socket before the
+next one is made, so a slow client slows down its own conversion instead
+of filling the server's memory.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from gs123.batch import memoize, urn_to_barcode
+from gs123.conversion import BarcodeFormat
+from gs123.memo import DEFAULT_MEMO_SIZE
+from gs123.profile import ConversionProfile
+from gs123.xml_conversion import convert_xml_chunks, \
+    convert_xml_chunks_urns_to_barcodes
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8123
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_BODY_SIZE = 64 * 1024 * 1024
+DEFAULT_KEEP_ALIVE_TIMEOUT = 15
+
+# the size of the pieces request bodies are read in, and of the XML
+# output that is collected before it is sent as a chunk
+_CHUNK_SIZE = 64 * 1024
+_MAX_LINE = 64 * 1024
+_MAX_HEADERS = 100
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    505: 'HTTP Version Not Supported',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """
+    Raised while a request is handled to answer it with an error status.
+    """
+
+    def __init__(self, status: int, message: str = None):
+        super().__init__(message or _REASONS[status])
+        self.status = status
+
+
+class ConversionServer:
+    """
+    The conversion server.  Call `start` to start the worker threads and
+    listen for connections, then `serve_forever`, and `close` to stop.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 profile: ConversionProfile = None,
+                 barcode_format: BarcodeFormat = None,
+                 workers: int = None,
+                 max_concurrency: int = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 memo_size: int = DEFAULT_MEMO_SIZE,
+                 max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+                 keep_alive_timeout: float = DEFAULT_KEEP_ALIVE_TIMEOUT):
+        """
+        :param host: The address to listen on.
+        :param port: The port to listen on.  Zero picks a free port, which
+        is stored in `port` once the server has started.
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param profile: An optional `gs123.profile.ConversionProfile` that
+        replaces the lengths.
+        :param barcode_format: The `gs123.conversion.BarcodeFormat` URNs
+        are converted to.  Default is 01...21... with no parenthesis.
+        :param workers: The number of conversion threads.  Default is the
+        number of CPUs.
+        :param max_concurrency: The number of requests converted at once.
+        Default is the number of workers.
+        :param batch_size: The number of lines converted at a time.
+        :param memo_size: The number of distinct values each request
+        remembers the converted value of.  Zero disables the memo.
+        :param max_body_size: The largest JSON body accepted, in bytes.
+        Line and XML bodies are streamed and have no limit.
+        :param keep_alive_timeout: The seconds an idle connection is kept
+        open for.
+        """
+        self.host = host
+        self.port = port
+        self.profile = profile or ConversionProfile(company_prefix_length,
+                                                    serial_number_length)
+        self.barcode_format = barcode_format or BarcodeFormat()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.batch_size = batch_size
+        self.memo_size = memo_size
+        self.max_body_size = max_body_size
+        self.keep_alive_timeout = keep_alive_timeout
+        self.active = 0
+        self._routes = {
+            '/barcodes': self._convert_barcodes,
+            '/urns': self._convert_urns,
+            '/xml/barcodes': self._convert_xml_barcodes,
+            '/xml/urns': self._convert_xml_urns,
+        }
+        self._server = None
+        self._executor = None
+        self._limit = None
+        self._connections = set()
+
+    async def start(self) -> None:
+        """
+        Starts the worker threads, has each of them convert a value of
+        every kind and starts listening.
+        """
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix='gs123-serve')
+        # the threads wait for each other so that every one is started
+        barrier = threading.Barrier(self.workers)
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self._warm_up, barrier)
+            for _ in range(self.workers)
+        ))
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=_MAX_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """
+        Accepts connections until the server is closed or cancelled.
+        """
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stops listening, closes the open connections and stops the worker
+        threads.
+        """
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    def _warm_up(self, barrier):
+        convert_xml_chunks(
+            [b'<epc>0100614141123452211234567890</epc>'], BytesIO(),
+            profile=self.profile)
+        convert_xml_chunks_urns_to_barcodes(
+            [b'<epc>urn:epc:id:sgtin:0614141.012345.1234567890</epc>'],
+            BytesIO(), self.barcode_format)
+        barrier.wait()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request_line = await asyncio.wait_for(
+                        reader.readline(), self.keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                if request_line in (b'\r\n', b'\n'):
+                    continue
+                keep_alive = await self._handle_request(request_line,
+                                                        reader, writer)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            # the client went away or sent a line over the limit
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        """
+        Answers one request and returns True if the connection can be
+        used for another one.
+        """
+        response = _Response(writer)
+        try:
+            method, target, version, headers = await _read_head(
+                request_line, reader)
+            response = _Response(writer, version, _keep_alive(version,
+                                                              headers))
+            body = _Body(reader, writer, headers)
+            path = urlsplit(target).path
+            if path == '/health':
+                if method != 'GET':
+                    raise HTTPError(405)
+                await response.send(200, 'application/json', json.dumps({
+                    'status': 'ok', 'workers': self.workers,
+                    'active': self.active,
+                }).encode('utf-8'))
+                return response.keep_alive and body.done
+            handler = self._routes.get(path)
+            if handler is None:
+                raise HTTPError(404)
+            if method != 'POST':
+                raise HTTPError(405)
+            async with self._limit:
+                self.active += 1
+                try:
+                    await handler(body, response, headers)
+                finally:
+                    self.active -= 1
+            return response.keep_alive
+        except HTTPError as e:
+            if response.started:
+                # the status has been sent, so the response is cut short
+                return False
+            response.keep_alive = False
+            await response.send(e.status, 'text/plain; charset=utf-8',
+                                ('%s\n' % e).encode('utf-8'))
+            return False
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception:
+            logger.exception('Error converting %s', request_line)
+            if not response.started:
+                response.keep_alive = False
+                await response.send(500, 'text/plain; charset=utf-8',
+                                    b'Internal Server Error\n')
+            return False
+
+    async def _convert_barcodes(self, body, response, headers):
+        await self._convert_values(body, response, headers, memoize(
+            self.profile.convert, memo_size=self.memo_size))
+
+    async def _convert_urns(self, body, response, headers):
+        await self._convert_values(body, response, headers, memoize(
+            urn_to_barcode(self.barcode_format), memo_size=self.memo_size))
+
+    async def _convert_xml_barcodes(self, body, response, headers):
+        await self._convert_xml(body, response, lambda chunks, output: (
+            convert_xml_chunks(chunks, output, profile=self.profile,
+                               memo_size=self.memo_size)))
+
+    async def _convert_xml_urns(self, body, response, headers):
+        await self._convert_xml(body, response, lambda chunks, output: (
+            convert_xml_chunks_urns_to_barcodes(
+                chunks, output, self.barcode_format,
+                memo_size=self.memo_size)))
+
+    async def _convert_values(self, body, response, headers, convert):
+        """
+        Converts a JSON array, or the lines of the body a batch at a time.
+        """
+        loop = asyncio.get_running_loop()
+        content_type = headers.get('content-type', '')
+        if content_type.split(';')[0].strip().lower() == 'application/json':
+            data = await body.read_all(self.max_body_size)
+            try:
+                values = json.loads(data.decode('utf-8'))
+            except ValueError as e:
+                raise HTTPError(400, 'The body is not valid JSON: %s' % e)
+            if not isinstance(values, list):
+                raise HTTPError(400, 'The body is not a JSON array.')
+            converted = await loop.run_in_executor(
+                self._executor, _convert_list, convert, values)
+            await response.send(200, 'application/json',
+                                json.dumps(converted).encode('utf-8'))
+            return
+        response.content_type = 'text/plain; charset=utf-8'
+        lines = []
+        pending = b''
+        while True:
+            data = await body.read()
+            if data:
+                lines.extend((pending + data).split(b'\n'))
+                pending = lines.pop()
+                if len(pending) > _MAX_LINE:
+                    raise HTTPError(400, 'A line is longer than %s bytes.'
+                                    % _MAX_LINE)
+            elif pending:
+                lines.append(pending)
+            if lines and (len(lines) >= self.batch_size or not data):
+                await response.write(await loop.run_in_executor(
+                    self._executor, _convert_lines, convert, lines))
+                lines = []
+            if not data:
+                break
+        await response.finish()
+
+    async def _convert_xml(self, body, response, convert_chunks):
+        """
+        Converts the XML document in a worker thread that reads the body
+        from, and writes the output to, the connection through the event
+        loop.  The thread waits for every piece of the body to be read and
+        every chunk of the output to be drained.
+        """
+        loop = asyncio.get_running_loop()
+        response.content_type = 'application/xml'
+        output = _ResponseFile(response, loop)
+
+        def chunks():
+            while True:
+                data = asyncio.run_coroutine_threadsafe(body.read(),
+                                                        loop).result()
+                if not data:
+                    return
+                yield data
+
+        def convert():
+            convert_chunks(chunks(), output)
+            output.flush()
+
+        try:
+            await loop.run_in_executor(self._executor, convert)
+        except SyntaxError as e:
+            raise HTTPError(400, 'The body is not a valid XML document: %s'
+                            % e)
+        await response.finish()
+
+
+class _Body:
+    """
+    The body of a request, read one piece at a time.
+    """
+
+    def __init__(self, reader, writer, headers):
+        self._reader = reader
+        self._writer = writer
+        self._chunked = 'chunked' in headers.get('transfer-encoding',
+                                                 '').lower()
+        try:
+            self._remaining = 0 if self._chunked else int(
+                headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, 'The Content-Length is not a number.')
+        if self._remaining < 0:
+            raise HTTPError(400, 'The Content-Length is negative.')
+        self._continue = headers.get('expect', '').lower() == '100-continue'
+        self.done = not self._chunked and not self._remaining
+
+    async def read(self) -> bytes:
+        """
+        Returns the next piece of the body, or no bytes at its end.
+        """
+        if self.done:
+            return b''
+        if self._continue:
+            self._continue = False
+            self._writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        reader = self._reader
+        if self._chunked and not self._remaining:
+            line = await reader.readline()
+            try:
+                size = int(line.split(b';')[0].strip(), 16)
+            except ValueError:
+                raise HTTPError(400, 'Malformed chunk size.')
+            if not size:
+                # the trailer fields, if any, are ignored
+                while (await reader.readline()).strip():
+                    pass
+                self.done = True
+                return b''
+            self._remaining = size
+        data = await reader.read(min(self._remaining, _CHUNK_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b'', self._remaining)
+        self._remaining -= len(data)
+        if not self._remaining:
+            if self._chunked:
+                await reader.readexactly(2)
+            else:
+                self.done = True
+        return data
+
+    async def read_all(self, max_size: int) -> bytes:
+        """
+        Returns the whole body.
+        """
+        ret = bytearray()
+        while True:
+            data = await self.read()
+            if not data:
+                return bytes(ret)
+            ret += data
+            if len(ret) > max_size:
+                raise HTTPError(413, 'The body is larger than %s bytes.'
+                                % max_size)
+
+
+class _Response:
+    """
+    Writes a response, either whole or as a series of chunks.  The status
+    line and headers of a chunked response are sent with its first chunk
+    so that an error found before then can still be answered with an
+    error status.
+    """
+
+    def __init__(self, writer, version='HTTP/1.1', keep_alive=False):
+        self._writer = writer
+        self.chunked = version == 'HTTP/1.1'
+        self.keep_alive = keep_alive
+        self.content_type = 'application/octet-stream'
+        self.started = False
+
+    async def send(self, status: int, content_type: str, body: bytes):
+        """
+        Sends a whole response.
+        """
+        self._start(status, content_type, len(body))
+        self._writer.write(body)
+        await self._writer.drain()
+
+    async def write(self, data: bytes) -> None:
+        """
+        Sends a chunk of a 200 response and waits for it to be drained.
+        """
+        if not self.started:
+            self._start(200, self.content_type)
+        if not data:
+            return
+        if self.chunked:
+            self._writer.writelines((b'%x\r\n' % len(data), data, b'\r\n'))
+        else:
+            self._writer.write(data)
+        await self._writer.drain()
+
+    async def finish(self) -> None:
+        """
+        Ends a chunked response.
+        """
+        if not self.started:
+            self._start(200, self.content_type)
+        if self.chunked:
+            self._writer.write(b'0\r\n\r\n')
+        await self._writer.drain()
+
+    def _start(self, status, content_type, length=None):
+        self.started = True
+        lines = ['HTTP/1.1 %s %s' % (status, _REASONS[status]),
+                 'Content-Type: %s' % content_type]
+        if length is not None:
+            lines.append('Content-Length: %s' % length)
+        elif self.chunked:
+            lines.append('Transfer-Encoding: chunked')
+        else:
+            # the end of the body is the end of the connection
+            self.keep_alive = False
+        lines.append('Connection: %s' % (
+            'keep-alive' if self.keep_alive else 'close'))
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode(
+            'latin-1'))
+
+
+class _ResponseFile:
+    """
+    A file for a worker thread to write a response to.  The output is
+    sent in chunks of at least `_CHUNK_SIZE` bytes and each `write` that
+    sends one waits for it to be drained.
+    """
+
+    def __init__(self, response, loop):
+        self._response = response
+        self._loop = loop
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= _CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            asyncio.run_coroutine_threadsafe(self._response.write(data),
+                                             self._loop).result()
+
+
+async def _read_head(request_line, reader):
+    """
+    Returns the method, target, version and headers (with lower case
+    names) of a request.
+    """
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'Malformed request line.')
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise HTTPError(505)
+    headers = {}
+    while True:
+        try:
+            line = await reader.readline()
+        except ValueError:
+            raise HTTPError(431)
+        if not line:
+            raise ConnectionResetError('The request head is incomplete.')
+        if line in (b'\r\n', b'\n'):
+            return method, target, version, headers
+        if len(headers) >= _MAX_HEADERS:
+            raise HTTPError(431)
+        name, separator, value = line.decode('latin-1').partition(':')
+        if not separator:
+            raise HTTPError(400, 'Malformed header.')
+        headers[name.strip().lower()] = value.strip()
+
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return 'close' not in connection
+    return 'keep-alive' in connection
+
+
+def _convert_lines(convert, lines):
+    ret = []
+    append = ret.append
+    for line in lines:
+        value = convert(line.decode('utf-8', 'replace').rstrip('\r'))
+        append(value or '')
+    ret.append('')
+    return '\n'.join(ret).encode('utf-8')
+
+
+def _convert_list(convert, values):
+    return [convert(value) if value.__class__ is str else None
+            for value in values]
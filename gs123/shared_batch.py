@@ -0,0 +1,328 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Converts large lists of barcodes with a pool of worker processes that
+read the barcodes from, and write the converted values to, shared memory.
+
+The barcodes are copied once into a shared byte buffer with an array of
+their offsets, and every value gets an output slot (as long as the
+barcode plus `SLOT_PADDING` bytes) in a second buffer with an array of
+the output lengths.  The workers are only sent the names of the buffers
+and the start and end index of the values to convert, and only send back
+the number of values they converted, so no barcodes or URNs are pickled.
+"""
+import os
+import time
+from array import array
+from itertools import accumulate
+
+from gs123.profile import ConversionProfile
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# the bytes an output value may be longer than its barcode; a barcode
+# converts to a URN at most 15 characters longer
+SLOT_PADDING = 24
+
+# output lengths of the values that are not barcodes and of the values
+# that did not fit their slot, which are converted again by the caller
+_NOT_CONVERTED = -1
+_TOO_LONG = -2
+
+# the convert function of a worker process
+_convert = None
+
+
+class SharedBatch:
+    """
+    The shared memory buffers of one batch of values: the encoded values
+    and their offsets, and the output slots and output lengths.  Values
+    are encoded as latin-1, and values that are not strings are read as
+    `str(value)`, as `ConversionProfile.convert` reads them.  None and
+    other false values are stored as empty values, which are not
+    converted.  Values that can not be encoded are stored as empty values
+    too and are converted by the caller in `results`.  Use as a context
+    manager, or call `close`, to free the memory.
+    """
+
+    def __init__(self, values):
+        """
+        :param values: A sequence of barcode values.
+        """
+        from multiprocessing import shared_memory
+        encoded = []
+        append = encoded.append
+        # the values, by index, that can not be encoded as latin-1
+        self._unencoded = {}
+        for index, value in enumerate(values):
+            if not value:
+                append(b'')
+                continue
+            if value.__class__ is not str:
+                value = str(value)
+            try:
+                append(value.encode('latin-1'))
+            except UnicodeEncodeError:
+                self._unencoded[index] = value
+                append(b'')
+        self.size = len(encoded)
+        offsets = array('q', [0])
+        offsets.extend(accumulate(map(len, encoded)))
+        data_size = offsets[-1]
+        self._blocks = [
+            shared_memory.SharedMemory(create=True, size=size)
+            for size in (
+                max(1, data_size),
+                offsets.itemsize * len(offsets),
+                max(1, data_size + SLOT_PADDING * self.size),
+                max(4, 4 * self.size),
+            )
+        ]
+        data, offset_block, _, _ = self._blocks
+        data.buf[:data_size] = b''.join(encoded)
+        offset_block.buf[:offsets.itemsize * len(offsets)] = \
+            offsets.tobytes()
+
+    @property
+    def key(self) -> tuple:
+        """
+        The names of the buffers and the number of values, which is all a
+        worker needs to attach to the batch.
+        """
+        return tuple(block.name for block in self._blocks) + (self.size,)
+
+    def results(self, convert) -> list:
+        """
+        Returns the converted value, or None, of every value.
+        :param convert: The function to convert the values that did not
+        fit their output slot, and the values that could not be encoded,
+        with.
+        """
+        views = _views([block.buf for block in self._blocks], self.size)
+        data, offsets, output, lengths = views
+        unencoded = self._unencoded
+        try:
+            ret = []
+            append = ret.append
+            for index in range(self.size):
+                length = lengths[index]
+                if length == _NOT_CONVERTED:
+                    append(convert(unencoded[index])
+                           if index in unencoded else None)
+                    continue
+                if length == _TOO_LONG:
+                    append(convert(str(
+                        data[offsets[index]:offsets[index + 1]], 'latin-1')))
+                    continue
+                start = offsets[index] + SLOT_PADDING * index
+                append(str(output[start:start + length], 'latin-1'))
+            return ret
+        finally:
+            _release(views)
+
+    def close(self) -> None:
+        """
+        Frees the shared memory.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedBatchConverter:
+    """
+    A pool of worker processes that convert batches of barcodes through
+    shared memory.  The pool is started, and the profile sent to each
+    worker, when the converter is created and reused for every batch.
+    Use as a context manager, or call `close`, to stop the workers.
+    """
+
+    def __init__(self, workers: int = None,
+                 company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 profile: ConversionProfile = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param workers: The number of worker processes.  Default is the
+        number of CPUs.
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param profile: An optional `gs123.profile.ConversionProfile` that
+        replaces the lengths.  Its output property must be a string.
+        :param chunk_size: The number of values in each slice sent to a
+        worker.
+        """
+        # multiprocessing.Pool imports the pool machinery and its queues,
+        # which SharedBatch (and importing the module) does not need
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        # the workers share the tracker of this process, which forgets the
+        # buffers they attach to when this process frees them, rather than
+        # starting trackers of their own that would report them as leaked
+        resource_tracker.ensure_running()
+        self.profile = profile or ConversionProfile(company_prefix_length,
+                                                    serial_number_length)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = multiprocessing.Pool(self.workers, _start_worker,
+                                          (self.profile,))
+
+    def convert_batch(self, values, stats=None) -> list:
+        """
+        Converts the values.
+        :param values: A sequence of barcode values.
+        :param stats: An optional `gs123.stats.ConversionStats` instance.
+        Only the converted count and the time are collected.
+        :return: A list with the converted value, or None, for each value.
+        """
+        start = time.perf_counter()
+        with SharedBatch(values) as batch:
+            key = batch.key
+            converted = sum(self._pool.imap_unordered(_convert_slice, (
+                (key, index, min(index + self.chunk_size, batch.size))
+                for index in range(0, batch.size, self.chunk_size)
+            )))
+            ret = batch.results(self.profile.convert)
+        if stats is not None:
+            stats.record_converted(converted)
+            stats.add_time('convert', time.perf_counter() - start)
+        return ret
+
+    def close(self) -> None:
+        """
+        Stops the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def convert_barcodes_shared(values, workers: int = None,
+                            company_prefix_length: int = 6,
+                            serial_number_length: int = 12,
+                            profile: ConversionProfile = None,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            stats=None) -> list:
+    """
+    Converts a list of barcodes with a new `SharedBatchConverter`.  See
+    the class for the parameters.
+    :return: A list with the converted value, or None, for each value.
+    """
+    with SharedBatchConverter(workers, company_prefix_length,
+                              serial_number_length, profile,
+                              chunk_size) as converter:
+        return converter.convert_batch(values, stats)
+
+
+def _views(buffers, size):
+    data, offsets, output, lengths = buffers
+    return [data, offsets.cast('q')[:size + 1], output,
+            lengths.cast('i')[:size]]
+
+
+def _release(views):
+    for view in views[1::2]:
+        view.release()
+
+
+def _start_worker(profile):
+    global _convert
+    _convert = profile.convert
+
+
+def _attach(key):
+    """
+    Attaches the worker to the buffers of a batch and returns them with
+    their views.
+    """
+    from multiprocessing import shared_memory
+    blocks = [shared_memory.SharedMemory(name) for name in key[:4]]
+    return blocks, _views([block.buf for block in blocks], key[4])
+
+
+def _detach(blocks, views):
+    """
+    Releases the views of a batch and closes the worker's handles to its
+    buffers.
+    """
+    _release(views)
+    for block in blocks:
+        block.close()
+
+
+def _convert_slice(task):
+    """
+    Converts the values from start to end of a batch and returns the
+    number that were converted.  The slice is decoded, and its output
+    assembled, in one piece so the shared buffers are read and written
+    once per slice rather than once per value.
+    """
+    key, start, end = task
+    blocks, views = _attach(key)
+    try:
+        return _convert_views(views, start, end)
+    finally:
+        # a worker is not told when the last slice of a batch is done, so
+        # it closes the buffers after every slice rather than keeping a
+        # freed batch mapped until its next one
+        _detach(blocks, views)
+
+
+def _convert_views(views, start, end):
+    data, offsets, output, lengths = views
+    convert = _convert
+    base = offsets[start]
+    text = str(data[base:offsets[end]], 'latin-1')
+    output_base = base + SLOT_PADDING * start
+    slots = bytearray(offsets[end] + SLOT_PADDING * end - output_base)
+    slot_lengths = array('i', bytes(4 * (end - start)))
+    converted = 0
+    value_end = 0
+    for index in range(end - start):
+        value_start = value_end
+        value_end = offsets[start + index + 1] - base
+        ret = convert(text[value_start:value_end]) \
+            if value_end > value_start else None
+        if ret is None:
+            slot_lengths[index] = _NOT_CONVERTED
+            continue
+        converted += 1
+        try:
+            ret = ret.encode('latin-1')
+        except (AttributeError, UnicodeEncodeError):
+            slot_lengths[index] = _TOO_LONG
+            continue
+        if len(ret) > value_end - value_start + SLOT_PADDING:
+            slot_lengths[index] = _TOO_LONG
+            continue
+        slot = value_start + SLOT_PADDING * index
+        slots[slot:slot + len(ret)] = ret
+        slot_lengths[index] = len(ret)
+    output[output_base:output_base + len(slots)] = slots
+    lengths[start:end] = slot_lengths
+    return converted
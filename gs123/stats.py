@@ -0,0 +1,224 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import threading
+from collections import Counter, namedtuple
+
+TIMING_PHASES = ('parse', 'convert', 'serialize')
+
+
+class ConversionStats:
+    """
+    Opt-in statistics collector for barcode conversions.  Pass an instance
+    into `gs123.regex.match_pattern`, the `BarcodeConverter` class or the
+    `gs123.xml_conversion` functions via their `stats` parameter and they
+    will report what they matched, rejected and how long each phase took.
+    When no collector is passed in nothing is recorded, so the hot path
+    only pays for a single `is not None` check.
+
+    Every counter is updated under the collector's lock, through the
+    `record_*`, `add_time` and `merge` methods, so one collector can be
+    shared by every thread of a converter.  Threads that record a lot of
+    values can instead count in a collector of their own and `merge` its
+    report into the shared one when they are done, which is what
+    `gs123.threaded_batch` does.
+    """
+
+    def __init__(self):
+        self.matches = Counter()
+        self.misses = 0
+        self.rejections = 0
+        self.exceptions = Counter()
+        self.elements = 0
+        self.attributes = 0
+        self.converted = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.timings = dict.fromkeys(TIMING_PHASES, 0.0)
+        self._lock = threading.Lock()
+
+    def record_match(self, pattern_name: str) -> None:
+        """
+        Records a successful regular expression match.
+        :param pattern_name: The name of the pattern in `gs123.regex`
+        that matched.
+        :return: None
+        """
+        with self._lock:
+            self.matches[pattern_name] += 1
+
+    def record_miss(self) -> None:
+        """
+        Records a value that did not match any of the patterns.
+        :return: None
+        """
+        with self._lock:
+            self.misses += 1
+
+    def record_rejection(self) -> None:
+        """
+        Records a value that was rejected as not being a valid barcode.
+        :return: None
+        """
+        with self._lock:
+            self.rejections += 1
+
+    def record_exception(self, exception: BaseException) -> None:
+        """
+        Records an unexpected exception raised during conversion.
+        :param exception: The exception that was raised.
+        :return: None
+        """
+        with self._lock:
+            self.exceptions[type(exception).__name__] += 1
+
+    def record_element(self) -> None:
+        """
+        Records an XML element that was visited.
+        :return: None
+        """
+        with self._lock:
+            self.elements += 1
+
+    def record_attributes(self, count: int) -> None:
+        """
+        Records the XML attributes of an element that were visited.
+        :param count: The number of attributes.
+        :return: None
+        """
+        with self._lock:
+            self.attributes += count
+
+    def record_converted(self, count: int = 1) -> None:
+        """
+        Records values that were converted.
+        :param count: The number of values.
+        :return: None
+        """
+        with self._lock:
+            self.converted += count
+
+    def record_memo_hit(self) -> None:
+        """
+        Records a value that was answered from a memo.
+        :return: None
+        """
+        with self._lock:
+            self.memo_hits += 1
+
+    def record_memo_miss(self) -> None:
+        """
+        Records a value that was not in a memo.
+        :return: None
+        """
+        with self._lock:
+            self.memo_misses += 1
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        """
+        Adds elapsed time to one of the timing phases.
+        :param phase: parse, convert or serialize.
+        :param seconds: The elapsed time in seconds.
+        :return: None
+        """
+        with self._lock:
+            self._add_time(phase, seconds)
+
+    def merge(self, report: 'ConversionReport') -> None:
+        """
+        Adds the values of a report, for example one sent back by a worker
+        process, to this collector.
+        :param report: A ConversionReport instance.
+        :return: None
+        """
+        with self._lock:
+            self.matches.update(report.matches)
+            self.misses += report.misses
+            self.rejections += report.rejections
+            self.exceptions.update(report.exceptions)
+            self.elements += report.elements
+            self.attributes += report.attributes
+            self.converted += report.converted
+            self.memo_hits += report.memo_hits
+            self.memo_misses += report.memo_misses
+            for phase, seconds in report.timings.items():
+                self._add_time(phase, seconds)
+
+    def _add_time(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def report(self) -> 'ConversionReport':
+        """
+        Returns an immutable snapshot of the statistics collected so far.
+        :return: A ConversionReport instance.
+        """
+        with self._lock:
+            return ConversionReport(
+                matches=dict(self.matches),
+                misses=self.misses,
+                rejections=self.rejections,
+                exceptions=dict(self.exceptions),
+                elements=self.elements,
+                attributes=self.attributes,
+                converted=self.converted,
+                memo_hits=self.memo_hits,
+                memo_misses=self.memo_misses,
+                timings=dict(self.timings)
+            )
+
+
+class ConversionReport(namedtuple('ConversionReport', [
+    'matches', 'misses', 'rejections', 'exceptions', 'elements',
+    'attributes', 'converted', 'memo_hits', 'memo_misses', 'timings'
+])):
+    """
+    A snapshot of the values collected by a `ConversionStats` instance.
+    """
+    __slots__ = ()
+
+    @property
+    def memo_hit_rate(self) -> float:
+        """
+        The fraction of memo lookups that were answered from the memo.
+        """
+        lookups = self.memo_hits + self.memo_misses
+        return self.memo_hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Returns the report as a plain dictionary (for logging or JSON).
+        """
+        return dict(self._asdict())
+
+    def __str__(self):
+        lines = [
+            'elements visited: %s' % self.elements,
+            'attributes visited: %s' % self.attributes,
+            'values converted: %s' % self.converted,
+            'pattern misses: %s' % self.misses,
+            'rejections: %s' % self.rejections,
+            'exceptions: %s' % sum(self.exceptions.values()),
+        ]
+        for name, count in sorted(self.exceptions.items()):
+            lines.append('    %s: %s' % (name, count))
+        lines.append('memo hit rate: %.2f%% (%s hits, %s misses)' % (
+            self.memo_hit_rate * 100, self.memo_hits, self.memo_misses))
+        lines.append('matches:')
+        for name, count in sorted(self.matches.items()):
+            lines.append('    %s: %s' % (name, count))
+        lines.append('timings (seconds):')
+        for phase, seconds in self.timings.items():
+            lines.append('    %s: %.6f' % (phase, seconds))
+        return '\n'.join(lines)
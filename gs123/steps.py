@@ -12,9 +12,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
-
-from gs123.xml_conversion import BarcodeConverter, convert_xml_string
-from gs123.conversion import URNConverter
+import json
+import time
+from gs123.cache import ConversionCache
+from gs123.xml_conversion import BarcodeConverter, convert_xml_string, \
+    convert_xml_urns_to_barcodes
+from gs123.conversion import BarcodeFormat, URNConverter
+from gs123.json_conversion import convert_json_string
+from gs123.profile import ConversionProfile
+from gs123.reconciliation import Reconciliation, target_epc_elements
+from gs123.stats import ConversionStats
 from quartet_capture import models
 from quartet_capture.rules import Step, RuleContext
 
@@ -42,12 +49,42 @@ class BaseConversionClass(Step):
                                     "has lot and expiry fields. "
                                     "Default is 12.",
             "Company Prefix Length": "The length of the company prefix.  "
-                                     "Default is 6."
+                                     "Default is 6.",
+            "Collect Statistics": "Whether or not to collect conversion "
+                                  "statistics (pattern matches, rejections "
+                                  "and timings) and write them to the task "
+                                  "log.  Default is False.",
+            "Barcode Format": "The name of a pattern in "
+                              "gs123.regex.BARCODE_PATTERNS to use for "
+                              "every value.  Skips format detection when "
+                              "all inbound barcodes share one layout.  "
+                              "Default is blank (detect the format).",
+            "Cache Path": "The path of a sqlite database file used to "
+                          "cache converted documents and values across "
+                          "tasks so resubmitted data is not converted "
+                          "again.  Default is blank (no cache)."
         }
         self.company_prefix_length, \
         self.context_key, \
         self.serial_number_length, \
         self.use_context_key = self._get_parameter_values()
+        self.collect_statistics = self.get_or_create_parameter(
+            'Collect Statistics',
+            'False',
+            self.declared_parameters['Collect Statistics']
+        ).lower() == 'true'
+        barcode_format = self.get_or_create_parameter(
+            'Barcode Format',
+            '',
+            self.declared_parameters['Barcode Format']
+        )
+        # the patterns are compiled once for every value the step converts
+        self.profile = ConversionProfile(
+            self.company_prefix_length,
+            self.serial_number_length,
+            formats=barcode_format or None
+        )
+        self.cache_path = self.get_parameter('Cache Path', '')
 
     @property
     def declared_parameters(self):
@@ -56,6 +93,40 @@ class BaseConversionClass(Step):
     def on_failure(self):
         pass
 
+    def _create_stats(self):
+        """
+        Returns a new statistics collector if the Collect Statistics step
+        parameter is true, otherwise None.
+        """
+        return ConversionStats() if self.collect_statistics else None
+
+    def _log_stats(self, stats):
+        """
+        Writes the conversion statistics report to the task log.
+        """
+        if stats is not None:
+            self.info('Conversion statistics:\n%s', str(stats.report()))
+
+    def _open_cache(self):
+        """
+        Returns a ConversionCache if the Cache Path step parameter is set,
+        otherwise None.
+        """
+        return ConversionCache(self.cache_path) if self.cache_path else None
+
+    def cache_config(self) -> tuple:
+        """
+        Returns the settings that affect the output of the step.  Cached
+        output is only reused for the same settings.  Override this to add
+        any settings a subclass introduces.
+        """
+        return (
+            '%s.%s' % (self.__class__.__module__, self.__class__.__name__),
+            str(self.company_prefix_length),
+            str(self.serial_number_length),
+            self.profile.formats[0] if self.profile.formats else None
+        )
+
     def _get_parameter_values(self):
         """
         Checks all the step parameters for configured or default values
@@ -111,13 +182,25 @@ class ListBarcodeConversionStep(BaseConversionClass):
             "The name of the property to access on the instance.  Check the" \
             " properties on the BarcodeConverter class for available options."
         self.prop_name = self.get_parameter('Property', 'epc_urn')
+        self.stats = None
 
     def execute(self, data, rule_context: RuleContext):
         self.info('Task parameters: %s',
                   str(self.get_task_parameters(rule_context)))
         to_process = data or rule_context.context.get(self.context_key)
         if isinstance(to_process, list):
-            converted = [self.convert(item) for item in to_process]
+            self.stats = self._create_stats()
+            start = time.perf_counter()
+            cache = self._open_cache()
+            if cache is None:
+                converted = [self.convert(item) for item in to_process]
+            else:
+                with cache:
+                    converted = self._convert_cached(to_process, cache)
+            if self.stats is not None:
+                self.stats.record_converted(len(converted))
+                self.stats.add_time('convert', time.perf_counter() - start)
+                self._log_stats(self.stats)
             if data:
                 self.info('Inbound data was converted.  Returning back '
                           'to rule.')
@@ -129,6 +212,48 @@ class ListBarcodeConversionStep(BaseConversionClass):
         else:
             self.warning('No list data was provided for conversion.')
 
+    def cache_config(self) -> tuple:
+        return super().cache_config() + (self.prop_name,)
+
+    def _convert_cached(self, to_process, cache):
+        """
+        Converts the list, looking the whole list up in the cache first,
+        then the values, and storing the list and the values that were
+        converted.  Only lists of strings and None are stored as a whole.
+        """
+        config = self.cache_config()
+        document = self._dump_list(to_process)
+        if document is not None:
+            output = cache.get_document(document, config)
+            if output is not None:
+                self.info('The list was returned from the cache.')
+                return json.loads(output)
+        found = cache.get_values(
+            [item for item in to_process if isinstance(item, str)], config)
+        converted = [found[item] if item in found else self.convert(item)
+                     for item in to_process]
+        cache.put_values({
+            item: value for item, value in zip(to_process, converted)
+            if item not in found and isinstance(item, str) and
+            isinstance(value, str)
+        }, config)
+        if found:
+            self.info('%s values were returned from the cache.', len(found))
+        output = self._dump_list(converted)
+        if document is not None and output is not None:
+            cache.put_document(document, config, output)
+        return converted
+
+    @staticmethod
+    def _dump_list(values):
+        """
+        Returns the values as a JSON array, or None if any of them is not
+        a string or None.
+        """
+        if all(value is None or isinstance(value, str) for value in values):
+            return json.dumps(values)
+        return None
+
     def convert(self, data):
         """
         Will convert the data parameter to a urn value and return.
@@ -138,8 +263,8 @@ class ListBarcodeConversionStep(BaseConversionClass):
         """
         prop_val = BarcodeConverter(
             data,
-            self.company_prefix_length,
-            self.serial_number_length
+            stats=self.stats,
+            profile=self.profile
         ).__getattribute__(self.prop_name)
         return prop_val if isinstance(prop_val, str) else prop_val()
 
@@ -178,6 +303,40 @@ class XMLBarcodeConversionStep(BaseConversionClass):
     urn) data.
     """
 
+    def __init__(self, db_task: models.Task, **kwargs):
+        super().__init__(db_task, **kwargs)
+        self._declared_parameters["Target Elements"] = \
+            "A comma separated list of element names (without namespace " \
+            "prefixes) to restrict the conversion to, for example " \
+            "epc,parentID.  Default is blank (convert every element)."
+        target_elements = self.get_parameter('Target Elements', '')
+        self.target_elements = frozenset(
+            name.strip() for name in target_elements.split(',')
+            if name.strip()
+        ) or None
+
+    def cache_config(self) -> tuple:
+        return super().cache_config() + (
+            tuple(sorted(self.target_elements or ())),
+        )
+
+    def convert_document(self, barcode_xml, stats=None) -> bytes:
+        """
+        Converts the XML and returns the converted document.  Override this
+        to convert the XML (or another document type) differently.
+        :param barcode_xml: The XML string to convert.
+        :param stats: An optional ConversionStats instance.
+        :return: The converted XML as bytes.
+        """
+        return convert_xml_string(
+            barcode_xml,
+            int(self.company_prefix_length),
+            int(self.serial_number_length),
+            stats=stats,
+            target_elements=self.target_elements,
+            profile=self.profile
+        )
+
     def execute(self, data, rule_context: RuleContext):
         if self.use_context_key:
             barcode_xml = rule_context.context.get(self.context_key, None)
@@ -186,13 +345,29 @@ class XMLBarcodeConversionStep(BaseConversionClass):
         else:
             barcode_xml = data
         if barcode_xml:
-            converted_data = convert_xml_string(
-                barcode_xml,
-                int(self.company_prefix_length),
-                int(self.serial_number_length)
-            ).decode('utf-8')
-            self.info('Barcode data has been filtered and replaced where '
-                      'possible.')
+            stats = self._create_stats()
+            cache = self._open_cache()
+            converted_data = None
+            try:
+                if cache is not None:
+                    converted_data = cache.get_document(barcode_xml,
+                                                        self.cache_config())
+                if converted_data is None:
+                    converted_data = self.convert_document(
+                        barcode_xml, stats
+                    ).decode('utf-8')
+                    self.info('Barcode data has been filtered and replaced '
+                              'where possible.')
+                    self._log_stats(stats)
+                    if cache is not None:
+                        cache.put_document(barcode_xml, self.cache_config(),
+                                           converted_data)
+                else:
+                    self.info('The converted data was returned from the '
+                              'cache.')
+            finally:
+                if cache is not None:
+                    cache.close()
             if not self.use_context_key and converted_data:
                 return converted_data
             else:
@@ -201,3 +376,151 @@ class XMLBarcodeConversionStep(BaseConversionClass):
             self.warning('No XML was found in the Rule Context under the '
                          'context key %s or the rule had no inbound data.'
                          % self.context_key)
+
+
+class EPCsNotCommissioned(Exception):
+    """
+    Raised by the `XMLReconciliationStep` when EPCs that were aggregated
+    or shipped were never commissioned.
+    """
+    pass
+
+
+class XMLReconciliationStep(XMLBarcodeConversionStep):
+    """
+    Converts the XML like the `XMLBarcodeConversionStep` and, in the same
+    pass, checks that every EPC aggregated or shipped in the document was
+    commissioned in it or is in the rule context under the Commissioned
+    Context Key.  See `gs123.reconciliation.Reconciliation`.  The
+    missing EPCs are put in the rule context and, unless Fail On Missing
+    is False, the step fails.  The cache is not used since the document
+    is always converted, and the epc and parentID elements are converted
+    whatever the Target Elements are.
+    """
+
+    def __init__(self, db_task: models.Task, **kwargs):
+        super().__init__(db_task, **kwargs)
+        self._declared_parameters["Commissioned Context Key"] = \
+            "The rule context key of a list (or a " \
+            "gs123.reconciliation.EPCSet) of EPC URNs commissioned before " \
+            "this document.  Default is blank (none)."
+        self._declared_parameters["Missing Context Key"] = \
+            "The rule context key the EPCs that were not commissioned are " \
+            "put in.  Default is MISSING_EPCS."
+        self._declared_parameters["Fail On Missing"] = \
+            "Whether or not to fail the step if any EPCs were not " \
+            "commissioned.  Default is True."
+        self.commissioned_context_key = self.get_parameter(
+            'Commissioned Context Key', '')
+        self.missing_context_key = self.get_parameter(
+            'Missing Context Key', 'MISSING_EPCS')
+        self.fail_on_missing = self.get_parameter(
+            'Fail On Missing', 'True').lower() == 'true'
+        self.target_elements = target_epc_elements(self.target_elements)
+        self.reconciliation = None
+
+    def _open_cache(self):
+        return None
+
+    def convert_document(self, barcode_xml, stats=None) -> bytes:
+        return convert_xml_string(
+            barcode_xml,
+            int(self.company_prefix_length),
+            int(self.serial_number_length),
+            stats=stats,
+            target_elements=self.target_elements,
+            profile=self.profile,
+            observers=[self.reconciliation]
+        )
+
+    def execute(self, data, rule_context: RuleContext):
+        commissioned = None
+        if self.commissioned_context_key:
+            commissioned = rule_context.context.get(
+                self.commissioned_context_key)
+        self.reconciliation = Reconciliation(commissioned)
+        ret = super().execute(data, rule_context)
+        missing = self.reconciliation.missing
+        rule_context.context[self.missing_context_key] = missing
+        self.info('%s aggregated or shipped EPCs were checked against %s '
+                  'commissioned EPCs.', self.reconciliation.checked,
+                  len(self.reconciliation.commissioned))
+        if missing:
+            message = '%s EPCs were not commissioned: %s' % (
+                len(missing), ', '.join(missing[:100]))
+            if self.fail_on_missing:
+                self.error(message)
+                raise EPCsNotCommissioned(message)
+            self.warning(message)
+        return ret
+
+
+class XMLURNConversionStep(XMLBarcodeConversionStep):
+    """
+    The reverse of the `XMLBarcodeConversionStep`.  Will look in the rule
+    context (or the rule data) for XML with EPC URN values in it and
+    replace them with GS1 barcode values.
+    """
+
+    def __init__(self, db_task: models.Task, **kwargs):
+        super().__init__(db_task, **kwargs)
+        self._declared_parameters["Parenthesis"] = \
+            "Whether or not to put parenthesis around the app identifiers " \
+            "in the barcodes.  Default is False."
+        self._declared_parameters["Serial Number Padding"] = \
+            "Whether or not to left pad SGTIN serial numbers with zeros to " \
+            "the Serial Number Length.  Default is False."
+        self.barcode_format = BarcodeFormat(
+            parenthesis=self.get_parameter(
+                'Parenthesis', 'False').lower() == 'true',
+            serial_number_padding=self.get_parameter(
+                'Serial Number Padding', 'False').lower() == 'true',
+            serial_number_length=int(self.serial_number_length)
+        )
+
+    def cache_config(self) -> tuple:
+        return super().cache_config() + tuple(self.barcode_format)
+
+    def convert_document(self, barcode_xml, stats=None) -> bytes:
+        return convert_xml_urns_to_barcodes(
+            barcode_xml,
+            self.barcode_format,
+            stats=stats,
+            target_elements=self.target_elements
+        )
+
+
+class JSONBarcodeConversionStep(XMLBarcodeConversionStep):
+    """
+    The EPCIS 2.0 JSON/JSON-LD version of the `XMLBarcodeConversionStep`.
+    Converts the barcodes in the epcList, childEPCs, inputEPCList,
+    outputEPCList, parentID and quantity list epcClass fields to URNs.
+    The Target Elements parameter restricts the conversion to the named
+    fields.
+    """
+
+    def convert_document(self, barcode_json, stats=None) -> bytes:
+        return convert_json_string(
+            barcode_json,
+            int(self.company_prefix_length),
+            int(self.serial_number_length),
+            stats=stats,
+            target_keys=self.target_elements,
+            profile=self.profile
+        ).encode('utf-8')
+
+
+class JSONURNConversionStep(XMLURNConversionStep):
+    """
+    The reverse of the `JSONBarcodeConversionStep`.  Converts the EPC URNs
+    in an EPCIS 2.0 JSON/JSON-LD document to GS1 barcode values.
+    """
+
+    def convert_document(self, barcode_json, stats=None) -> bytes:
+        return convert_json_string(
+            barcode_json,
+            urns_to_barcodes=True,
+            barcode_format=self.barcode_format,
+            stats=stats,
+            target_keys=self.target_elements
+        ).encode('utf-8')
@@ -0,0 +1,200 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Counts barcodes per GTIN, lot and expiration date in one pass, keeping
+only a few values per group rather than an object per barcode.
+
+Every barcode is matched by the profile on its own.  Where its fields are
+depends on the barcode and not only on its length and the text around
+them: the serial number ranges and the optional 17 and 10 fields of the
+patterns can split the same text in more than one way, and a barcode can
+be matched by an earlier pattern of the format cascade than a barcode of
+the same layout before it.  Reusing the offsets (or the pattern) of an
+earlier barcode would count some barcodes differently depending on what
+came before them.  When a batch is known to be in one format, pass that
+format in `formats` so format detection is skipped for every barcode.
+"""
+from collections import namedtuple
+
+from gs123.elements import FNC1
+from gs123.profile import ConversionProfile
+
+# the fields a layout is made of, in the order they are reported
+_FIELDS = ('gtin14', 'serial_number', 'expiration_date', 'lot', 'sscc18')
+
+
+class SummaryRow(namedtuple('SummaryRow', [
+    'gtin14', 'lot', 'expiration_date', 'count', 'serial_min', 'serial_max'
+])):
+    """
+    The barcode count and the lowest and highest serial number of one
+    GTIN, lot and expiration date.
+    """
+    __slots__ = ()
+
+
+class BarcodeSummary:
+    """
+    Per GTIN, lot and expiration date counts of barcodes.  Numeric serial
+    numbers are ordered by their numeric value and come before the
+    alphanumeric ones, which are ordered as strings.  SSCCs are counted
+    but not grouped, and values that are not serialized GTIN or SSCC
+    barcodes are counted as invalid.
+    """
+
+    def __init__(self, serial_number_length: int = 12, formats=None,
+                 profile: ConversionProfile = None):
+        """
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param formats: An optional sequence of `gs123.regex.BARCODE_PATTERNS`
+        names to restrict matching to.  A single format skips format
+        detection, which is faster for a batch known to be in one format.
+        :param profile: An optional `gs123.profile.ConversionProfile` to
+        match the barcodes with instead of the length and formats.
+        """
+        self.profile = profile or ConversionProfile(
+            serial_number_length=serial_number_length, formats=formats)
+        self.groups = {}
+        self.total = 0
+        self.invalid = 0
+        self.ssccs = 0
+
+    def add(self, value) -> None:
+        """
+        Counts a barcode.
+        :param value: The barcode.
+        :return: None
+        """
+        self.total += 1
+        if value.__class__ is not str:
+            self.invalid += 1
+            return
+        match = self.profile.match(value)
+        if match is None:
+            self.invalid += 1
+            return
+        gtin14, serial_number, expiration_date, lot, sscc18 = _fields(match)
+        if gtin14 is None or serial_number is None:
+            if sscc18 is not None and gtin14 is None:
+                self.ssccs += 1
+            else:
+                self.invalid += 1
+            return
+        serial_number = serial_number.strip(FNC1)
+        if serial_number.isdigit():
+            stripped = serial_number.lstrip('0')
+            serial_key = (0, len(stripped), stripped, serial_number)
+        else:
+            serial_key = (1, 0, serial_number, serial_number)
+        key = (gtin14, lot, expiration_date)
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [1, serial_key, serial_key]
+            return
+        group[0] += 1
+        if serial_key < group[1]:
+            group[1] = serial_key
+        elif serial_key > group[2]:
+            group[2] = serial_key
+
+    def update(self, values) -> 'BarcodeSummary':
+        """
+        Counts every barcode in an iterable.
+        :return: The summary.
+        """
+        add = self.add
+        for value in values:
+            add(value)
+        return self
+
+    def merge(self, other: 'BarcodeSummary') -> None:
+        """
+        Adds the counts of another summary, for example of another batch.
+        :param other: A BarcodeSummary.
+        :return: None
+        """
+        self.total += other.total
+        self.invalid += other.invalid
+        self.ssccs += other.ssccs
+        for key, (count, low, high) in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = [count, low, high]
+                continue
+            group[0] += count
+            group[1] = min(group[1], low)
+            group[2] = max(group[2], high)
+
+    def rows(self) -> list:
+        """
+        Returns a SummaryRow for every group, ordered by GTIN, expiration
+        date and lot.
+        """
+        return [
+            SummaryRow(gtin14, lot, expiration_date, count, low[-1], high[-1])
+            for (gtin14, lot, expiration_date), (count, low, high) in sorted(
+                self.groups.items(),
+                key=lambda item: (item[0][0], item[0][2] or '',
+                                  item[0][1] or '')
+            )
+        ]
+
+    def __str__(self):
+        lines = [
+            'barcodes: %s' % self.total,
+            'groups: %s' % len(self.groups),
+            'ssccs: %s' % self.ssccs,
+            'invalid: %s' % self.invalid,
+        ]
+        for row in self.rows():
+            lines.append('    %s lot %s expires %s: %s (serial numbers %s '
+                         'to %s)' % (row.gtin14, row.lot,
+                                     row.expiration_date, row.count,
+                                     row.serial_min, row.serial_max))
+        return '\n'.join(lines)
+
+
+def _fields(match):
+    """
+    Returns the values of the `_FIELDS` groups of a match, None for the
+    groups that are empty or that the pattern does not have.
+    """
+    fields = []
+    for name in _FIELDS:
+        try:
+            field = match.group(name)
+        except IndexError:
+            field = None
+        fields.append(field or None)
+    return fields
+
+
+def summarize_barcodes(values, serial_number_length: int = 12,
+                       formats=None,
+                       profile: ConversionProfile = None) -> BarcodeSummary:
+    """
+    Counts barcodes per GTIN, lot and expiration date in one pass.
+    :param values: An iterable of barcodes, for example the lines of a
+    file.
+    :param serial_number_length: The serial number length for barcodes
+    without parenthesis and with 17 and 10 fields.
+    :param formats: An optional sequence of `gs123.regex.BARCODE_PATTERNS`
+    names to restrict matching to.
+    :param profile: An optional `gs123.profile.ConversionProfile`.
+    :return: A BarcodeSummary.
+    """
+    return BarcodeSummary(serial_number_length, formats, profile).update(
+        values)
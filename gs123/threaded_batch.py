@@ -0,0 +1,143 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+"""
+Converts large lists of barcodes with a pool of threads that share one
+`gs123.profile.ConversionProfile`.  A profile holds no mutable state, so
+the threads convert their slices of the list without any locking and
+only their statistics are merged, under the collector's lock, at the end.
+
+On an interpreter with the GIL only one thread runs Python code at a time
+and the pool is no faster than converting in one thread; use
+`gs123.shared_batch.SharedBatchConverter` there.  On a free-threaded
+interpreter (3.13t and later) the threads run in parallel and the values
+are never copied between processes.
+"""
+import os
+import sys
+import time
+
+from gs123.profile import ConversionProfile
+from gs123.stats import ConversionStats
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def gil_enabled() -> bool:
+    """
+    Returns False if the running interpreter is free-threaded and was not
+    started with the GIL enabled, True otherwise.
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+class ThreadedBatchConverter:
+    """
+    A pool of threads that convert batches of barcodes.  The pool is
+    started when the converter is created and reused for every batch, and
+    a converter can be used by several threads at once.  Use as a context
+    manager, or call `close`, to stop the threads.
+    """
+
+    def __init__(self, threads: int = None,
+                 company_prefix_length: int = 6,
+                 serial_number_length: int = 12,
+                 profile: ConversionProfile = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param threads: The number of threads.  Default is the number of
+        CPUs.
+        :param company_prefix_length: The length of the company prefix.
+        :param serial_number_length: The serial number length for barcodes
+        without parenthesis and with 17 and 10 fields.
+        :param profile: An optional `gs123.profile.ConversionProfile` that
+        replaces the lengths.
+        :param chunk_size: The number of values in each slice converted by
+        a thread.
+        """
+        # concurrent.futures takes as long to import as the rest of gs123,
+        # so importing this module does not import it
+        from concurrent.futures import ThreadPoolExecutor
+        self.profile = profile or ConversionProfile(company_prefix_length,
+                                                    serial_number_length)
+        self.threads = threads or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(
+            self.threads, thread_name_prefix='gs123-convert')
+
+    def convert_batch(self, values, stats: ConversionStats = None) -> list:
+        """
+        Converts the values.
+        :param values: A sequence of barcode values.
+        :param stats: An optional `gs123.stats.ConversionStats` instance.
+        Each slice is recorded in a collector of its own, which is merged
+        into this one.
+        :return: A list with the converted value, or None, for each value.
+        """
+        start = time.perf_counter()
+        convert = self._convert_slice if stats is None \
+            else self._convert_slice_with_stats
+        ret = []
+        for converted in self._executor.map(convert, (
+            values[index:index + self.chunk_size]
+            for index in range(0, len(values), self.chunk_size)
+        )):
+            if stats is not None:
+                converted, report = converted
+                stats.merge(report)
+            ret.extend(converted)
+        if stats is not None:
+            stats.add_time('convert', time.perf_counter() - start)
+        return ret
+
+    def close(self) -> None:
+        """
+        Stops the threads.
+        """
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _convert_slice(self, values):
+        convert = self.profile.convert
+        return [convert(value) for value in values]
+
+    def _convert_slice_with_stats(self, values):
+        stats = ConversionStats()
+        convert = self.profile.convert
+        ret = [convert(value, stats) for value in values]
+        stats.converted = len(ret) - ret.count(None)
+        return ret, stats.report()
+
+
+def convert_barcodes_threaded(values, threads: int = None,
+                              company_prefix_length: int = 6,
+                              serial_number_length: int = 12,
+                              profile: ConversionProfile = None,
+                              chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              stats: ConversionStats = None) -> list:
+    """
+    Converts a list of barcodes with a new `ThreadedBatchConverter`.  See
+    the class for the parameters.
+    :return: A list with the converted value, or None, for each value.
+    """
+    with ThreadedBatchConverter(threads, company_prefix_length,
+                                serial_number_length, profile,
+                                chunk_size) as converter:
+        return converter.convert_batch(values, stats)
@@ -12,78 +12,590 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
-import re
-from io import BytesIO, StringIO
-from lxml import etree
-from gs123.conversion import BarcodeConverter
+import time
+from io import BytesIO
+from gs123.batch import barcode_to_urn, urn_to_barcode, memoize
+from gs123.conversion import BarcodeConverter, BarcodeFormat
+from gs123.lazy import LazyModule
+from gs123.memo import DEFAULT_MEMO_SIZE
+from gs123.regex import PatternRegistry
+
+# lxml is only imported once a document is converted
+etree = LazyModule('lxml.etree')
 
 
 def convert_xml_string(data: str,
                        company_prefix_length: int = 6,
-                       serial_number_length: int = 12):
+                       serial_number_length: int = 12,
+                       stats=None,
+                       registry: PatternRegistry = None,
+                       memo_size: int = DEFAULT_MEMO_SIZE,
+                       target_elements=None,
+                       profile=None,
+                       observers=None):
     """
     Converts all matching barcode patterns in an xml string.
     :param data: The data with barcode data
     :param company_prefix_length: The company prefix length
     :param serial_number_length: The serial number length
+    :param stats: An optional `gs123.stats.ConversionStats` instance to
+    collect conversion statistics with.
+    :param registry: An optional `gs123.regex.PatternRegistry`.  If none
+    is supplied a new one is used for the document so that the most common
+    barcode format in the document is tried first.
+    :param memo_size: The number of distinct values to remember the
+    conversion result of while the document is converted.  Zero disables
+    the memo.
+    :param target_elements: An optional collection of element local names
+    (for example `('epc', 'parentID')`).  If supplied only the text and
+    attributes of those elements are converted.
+    :param profile: An optional `gs123.profile.ConversionProfile` to
+    convert the values with instead of the lengths and the registry.
+    :param observers: An optional iterable of objects, such as a
+    `gs123.aggregation.AggregationIndex`, whose `element_end` method is
+    called with every element once its values have been converted.
     :return: The data string with the converted values inserted.
     """
-    if isinstance(data, bytes):
-        elements = etree.iterparse(BytesIO(data),
-                                   events=('start', 'end',),
-                                   remove_comments=True)
-    elif isinstance(data, str):
-        elements = etree.iterparse(BytesIO(data.encode('utf-8')),
-                                   events=('start', 'end',),
-                                   remove_comments=True)
-
-    with StringIO('') as output_file:
-        _parse_xml(company_prefix_length, elements,
-                   serial_number_length)
-        return (etree.tostring(elements.root))
+    convert = memoize(
+        _barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                        registry, profile),
+        stats, memo_size
+    )
+    return _convert_xml_string(data, convert, stats, target_elements,
+                               _element_end(observers))
 
 
 def convert_xml_file(file_path: str,
                      output_file_path: str,
                      company_prefix_length: int = 6,
-                     serial_number_length: int = 12):
+                     serial_number_length: int = 12,
+                     stats=None,
+                     registry: PatternRegistry = None,
+                     memo_size: int = DEFAULT_MEMO_SIZE,
+                     target_elements=None,
+                     checkpoint: bool = False,
+                     checkpoint_interval: int = None,
+                     profile=None,
+                     observers=None):
     """
     Converts an inbound XML file into an outbound XML file with all of the
-    barcodes converted to EPC URN values.
+    barcodes converted to EPC URN values.  The file is streamed: elements
+    are written to the output file as soon as they are complete and then
+    discarded, so memory use does not grow with the size of the file.
     :param file_path: The file to parse.
     :param output_file_path: The new file to create.
     :param company_prefix_length: The length of the company prefix in the
     barcodes. Default is 6.
     :param serial_number_length: The serial number length.  Default is 12.
+    :param stats: An optional `gs123.stats.ConversionStats` instance to
+    collect conversion statistics with.
+    :param registry: An optional `gs123.regex.PatternRegistry`.  If none
+    is supplied a new one is used for the file.
+    :param memo_size: The number of distinct values to remember the
+    conversion result of while the file is converted.  Zero disables
+    the memo.
+    :param target_elements: An optional collection of element local names.
+    If supplied only the text and attributes of those elements are
+    converted.
+    :param checkpoint: If true the progress is saved to a checkpoint file
+    next to the output file every `checkpoint_interval` parse events and
+    an interrupted conversion of the same file is resumed from there.
+    :param checkpoint_interval: The number of parse events between
+    checkpoints.  Default is `gs123.checkpoint.DEFAULT_CHECKPOINT_INTERVAL`.
+    :param profile: An optional `gs123.profile.ConversionProfile` to
+    convert the values with instead of the lengths and the registry.
+    :param observers: An optional iterable of objects, such as a
+    `gs123.aggregation.AggregationIndex`, whose `element_end` method is
+    called with every element (before it is written and discarded) once
+    its values have been converted.  Can not be combined with checkpoints
+    since the part of a resumed file that was already converted is not
+    converted again.
+    :return: None.
+    """
+    element_end = _element_end(observers)
+    if checkpoint and element_end:
+        raise ValueError('Observers can not be used with checkpoints.')
+    convert = memoize(
+        _barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                        registry, profile),
+        stats, memo_size
+    )
+    if checkpoint:
+        settings = [company_prefix_length, serial_number_length] \
+            if profile is None else [profile.settings]
+        checkpoint, checkpoint_interval = _checkpoint(
+            file_path, output_file_path,
+            ['xml-urns'] + settings + [_sorted_targets(target_elements)],
+            checkpoint_interval
+        )
+    _convert_xml_file(file_path, output_file_path, convert, stats,
+                      target_elements, checkpoint or None,
+                      checkpoint_interval, element_end)
+
+
+def convert_xml_urns_to_barcodes(data: str,
+                                 barcode_format: BarcodeFormat = None,
+                                 stats=None,
+                                 memo_size: int = DEFAULT_MEMO_SIZE,
+                                 target_elements=None):
+    """
+    The reverse of `convert_xml_string`: converts all of the EPC URN values
+    in an xml string to GS1 barcode values.
+    :param data: The xml string or bytes with URN values.
+    :param barcode_format: A `gs123.conversion.BarcodeFormat` describing
+    how the barcodes should be formatted.  Default is 01...21... with no
+    parenthesis.
+    :param stats: An optional `gs123.stats.ConversionStats` instance.
+    :param memo_size: The number of distinct values to remember the
+    conversion result of.  Zero disables the memo.
+    :param target_elements: An optional collection of element local names
+    to restrict the conversion to.
+    :return: The converted xml as bytes.
+    """
+    convert = memoize(
+        urn_to_barcode(barcode_format or BarcodeFormat(), stats),
+        stats, memo_size
+    )
+    return _convert_xml_string(data, convert, stats, target_elements)
+
+
+def convert_xml_file_urns_to_barcodes(file_path: str,
+                                      output_file_path: str,
+                                      barcode_format: BarcodeFormat = None,
+                                      stats=None,
+                                      memo_size: int = DEFAULT_MEMO_SIZE,
+                                      target_elements=None,
+                                      checkpoint: bool = False,
+                                      checkpoint_interval: int = None):
+    """
+    The reverse of `convert_xml_file`: streams an inbound XML file into an
+    outbound XML file with all of the EPC URN values converted to GS1
+    barcode values.
+    :param file_path: The file to parse.
+    :param output_file_path: The new file to create.
+    :param barcode_format: A `gs123.conversion.BarcodeFormat` describing
+    how the barcodes should be formatted.
+    :param stats: An optional `gs123.stats.ConversionStats` instance.
+    :param memo_size: The number of distinct values to remember the
+    conversion result of.  Zero disables the memo.
+    :param target_elements: An optional collection of element local names
+    to restrict the conversion to.
+    :param checkpoint: If true the conversion can be resumed, see
+    `convert_xml_file`.
+    :param checkpoint_interval: The number of parse events between
+    checkpoints.  Default is `gs123.checkpoint.DEFAULT_CHECKPOINT_INTERVAL`.
     :return: None.
     """
-    elements = etree.iterparse(file_path, events=('start', 'end',),
+    barcode_format = barcode_format or BarcodeFormat()
+    convert = memoize(
+        urn_to_barcode(barcode_format, stats),
+        stats, memo_size
+    )
+    if checkpoint:
+        checkpoint, checkpoint_interval = _checkpoint(
+            file_path, output_file_path,
+            ['xml-barcodes', list(barcode_format),
+             _sorted_targets(target_elements)],
+            checkpoint_interval
+        )
+    _convert_xml_file(file_path, output_file_path, convert, stats,
+                      target_elements, checkpoint or None,
+                      checkpoint_interval)
+
+
+def convert_xml_chunks(chunks, output_file,
+                       company_prefix_length: int = 6,
+                       serial_number_length: int = 12,
+                       stats=None,
+                       registry: PatternRegistry = None,
+                       memo_size: int = DEFAULT_MEMO_SIZE,
+                       target_elements=None,
+                       profile=None,
+                       observers=None):
+    """
+    Converts an XML document that arrives in pieces, for example the body
+    of an HTTP request, writing the converted document to the output file
+    as it goes.  The pieces are fed to a pull parser and the output is
+    streamed as `convert_xml_file` streams it, so neither the input nor
+    the output is ever held in memory as a whole.
+    :param chunks: An iterable of bytes.
+    :param output_file: An object with a `write` method that takes bytes.
+    See `convert_xml_file` for the other parameters.
+    :return: None.
+    """
+    convert = memoize(
+        _barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                        registry, profile),
+        stats, memo_size
+    )
+    _stream_xml(_pull_events(chunks), output_file, convert, stats,
+                target_elements, element_end=_element_end(observers))
+
+
+def convert_xml_chunks_urns_to_barcodes(chunks, output_file,
+                                        barcode_format: BarcodeFormat = None,
+                                        stats=None,
+                                        memo_size: int = DEFAULT_MEMO_SIZE,
+                                        target_elements=None):
+    """
+    The reverse of `convert_xml_chunks`: converts the EPC URN values of an
+    XML document that arrives in pieces to GS1 barcode values.
+    :param chunks: An iterable of bytes.
+    :param output_file: An object with a `write` method that takes bytes.
+    See `convert_xml_file_urns_to_barcodes` for the other parameters.
+    :return: None.
+    """
+    convert = memoize(
+        urn_to_barcode(barcode_format or BarcodeFormat(), stats),
+        stats, memo_size
+    )
+    _stream_xml(_pull_events(chunks), output_file, convert, stats,
+                target_elements)
+
+
+def _pull_events(chunks):
+    """
+    Yields the start, end and pi events of a document fed to a pull parser
+    one piece at a time.
+    """
+    parser = etree.XMLPullParser(events=('start', 'end', 'pi'),
+                                 remove_comments=True)
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _convert_xml_string(data, convert, stats=None, target_elements=None,
+                        element_end=None):
+    """
+    Converts the values in an in-memory document and returns the
+    serialized result.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    elements = etree.iterparse(BytesIO(data),
+                               events=('start', 'end',),
                                remove_comments=True)
-    with open(output_file_path, 'wb+') as output_file:
-        _parse_xml(company_prefix_length, elements,
-                   serial_number_length)
-        output_file.write(etree.tostring(elements.root))
+    _convert_tree(elements, convert, stats, target_elements, element_end)
+    start = time.perf_counter()
+    ret = etree.tostring(elements.root)
+    if stats is not None:
+        stats.add_time('serialize', time.perf_counter() - start)
+    return ret
+
+
+def _checkpoint(file_path, output_file_path, config, checkpoint_interval):
+    """
+    Returns the `gs123.checkpoint.Checkpoint` of a conversion and the
+    interval to save it at.
+    """
+    # gs123.checkpoint imports json, which conversions without checkpoints
+    # never need
+    from gs123.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+    if checkpoint_interval is None:
+        checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
+    return (Checkpoint(file_path, output_file_path, config),
+            checkpoint_interval)
+
+
+def _convert_xml_file(file_path, output_file_path, convert, stats=None,
+                      target_elements=None, checkpoint=None,
+                      checkpoint_interval=None, element_end=None):
+    """
+    Streams the file at file_path into output_file_path converting values
+    along the way.  With a `gs123.checkpoint.Checkpoint` the conversion
+    resumes from the last checkpoint if there is a usable one.  The parser
+    state can not be saved so the part of the input that was already
+    converted is parsed again, but it is neither converted nor written.
+    """
+    elements = etree.iterparse(file_path, events=('start', 'end', 'pi'),
+                               remove_comments=True)
+    if checkpoint is None:
+        with open(output_file_path, 'wb+') as output_file:
+            _stream_xml(elements, output_file, convert, stats,
+                        target_elements, element_end=element_end)
+            output_file.flush()
+        return
+    state = checkpoint.load()
+    with checkpoint.open_output(state) as output_file:
+        _stream_xml(
+            elements, output_file, convert, stats, target_elements,
+            skip_events=state['events'] if state else 0,
+            checkpoint=lambda events: checkpoint.commit(output_file,
+                                                        events=events),
+            checkpoint_interval=checkpoint_interval
+        )
         output_file.flush()
+    checkpoint.remove()
+
+
+def _barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                    registry, profile):
+    """
+    Returns the barcode converter for a document, with a new registry for
+    the document if neither a registry nor a profile is supplied.
+    """
+    if registry is None and profile is None:
+        registry = PatternRegistry()
+    return barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                          registry, profile=profile)
+
+
+def _element_end(observers):
+    """
+    Returns the `element_end` methods of the observers, or None.
+    """
+    if observers is None:
+        return None
+    return [observer.element_end for observer in observers] or None
+
+
+def _sorted_targets(target_elements):
+    return None if target_elements is None else sorted(target_elements)
 
 
 def _parse_xml(company_prefix_length, elements,
-               serial_number_length, converter_type=BarcodeConverter):
+               serial_number_length, converter_type=BarcodeConverter,
+               stats=None, registry=None, memo_size=DEFAULT_MEMO_SIZE,
+               target_elements=None):
+    """
+    Walks the iterparse events and replaces any barcode values found in
+    element text or attribute values with EPC URNs.
+    """
+    convert = memoize(
+        barcode_to_urn(company_prefix_length, serial_number_length, stats,
+                       registry, converter_type),
+        stats, memo_size
+    )
+    _convert_tree(elements, convert, stats, target_elements)
+
+
+def _convert_tree(elements, convert, stats=None, target_elements=None,
+                  element_end=None):
+    """
+    Walks the iterparse events and converts the element text and attribute
+    values in place, passing each element to the `element_end` functions
+    on its end event.  If a stats collector is supplied the time spent in
+    the converter is reported as `convert` and the rest of the walk (the
+    parsing itself) as `parse`.
+    """
+    start = time.perf_counter()
+    if stats is not None:
+        convert_time = stats.timings['convert']
     for event, element in elements:
-        try:
-            if event == 'end':
-                bc = converter_type(
-                    element.text,
-                    company_prefix_length=company_prefix_length,
-                    max_serial_number_length=serial_number_length
-                )
-                element.text = bc.epc_urn
-            for name, value in element.items():
-                bc = converter_type(
-                    value,
-                    company_prefix_length=company_prefix_length,
-                    max_serial_number_length=serial_number_length
-                )
-                element.set(name, bc.epc_urn)
-
-        except BarcodeConverter.BarcodeNotValid:
-            pass
+        _convert_element(event, element, convert, stats, target_elements)
+        if element_end is not None and event == 'end':
+            for observe in element_end:
+                observe(element)
+    if stats is not None:
+        convert_time = stats.timings['convert'] - convert_time
+        stats.add_time('parse', time.perf_counter() - start - convert_time)
+
+
+def _convert_element(event, element, convert, stats=None,
+                     target_elements=None):
+    """
+    Converts the text of an element on its end event and its attributes on
+    both events.  If the text is not convertible the attributes are left
+    alone and the attributes are converted up to the first one that is
+    not convertible.
+    """
+    if target_elements is not None and \
+            element.tag.rpartition('}')[2] not in target_elements:
+        return
+    if event == 'end':
+        if stats is not None:
+            stats.record_element()
+        value = convert(element.text)
+        if value is None:
+            return
+        element.text = value
+        if stats is not None:
+            stats.record_converted()
+    elif stats is not None:
+        stats.record_attributes(len(element.attrib))
+    for name, value in element.items():
+        value = convert(value)
+        if value is None:
+            break
+        element.set(name, value)
+        if stats is not None:
+            stats.record_converted()
+
+
+def _stream_xml(elements, output_file, convert, stats=None,
+                target_elements=None, skip_events=0, checkpoint=None,
+                checkpoint_interval=None, element_end=None):
+    """
+    Converts the iterparse events (which must include 'start', 'end' and
+    'pi') and writes the document to the output file as it goes.  An
+    element's start tag is written once its first child starts (or, for
+    leaf elements, along with the rest of the element on its end event)
+    and every element is removed from the tree once its tail has been
+    written, so only the chain of open elements is ever kept in memory.
+    The output is the same as `etree.tostring` of the converted tree.
+
+    The first `skip_events` events are replayed without converting or
+    writing anything, which rebuilds the writer's state when resuming from
+    a checkpoint.  If a checkpoint function is supplied it is called with
+    the number of events processed every `checkpoint_interval` events,
+    straight after an element has been closed.  The `element_end`
+    functions are called with each element on its end event, after its
+    values are converted and before it is written.
+    """
+    write = output_file.write
+    element_stats = stats
+    replaying = skip_events > 0
+    if replaying:
+        resume_write, resume_convert = write, convert
+        write, convert, element_stats = _discard, _not_converted, None
+    events = 0
+    saved = 0
+    event = None
+    start = time.perf_counter()
+    if stats is not None:
+        convert_time = stats.timings['convert']
+    stack = []
+    pending = None
+
+    def write_open_parent():
+        # the parent's text ends where its first child (or pi) begins
+        entry = stack[-1]
+        if not entry[1]:
+            parent = entry[0]
+            _convert_element('end', parent, convert, element_stats,
+                             target_elements)
+            write(_start_tag(parent))
+            if parent.text:
+                write(_escape_text(parent.text))
+            entry[1] = True
+
+    for next_event, element in elements:
+        if replaying and events == skip_events:
+            write, convert, element_stats = \
+                resume_write, resume_convert, stats
+            replaying = False
+        elif checkpoint is not None and event == 'end' and \
+                events - saved >= checkpoint_interval and not replaying:
+            checkpoint(events)
+            saved = events
+        event = next_event
+        events += 1
+        if pending is not None:
+            if pending.tail:
+                write(_escape_text(pending.tail))
+            parent = pending.getparent()
+            pending.clear()
+            if parent is not None:
+                parent.remove(pending)
+            pending = None
+        if event == 'start':
+            _convert_element(event, element, convert, element_stats,
+                             target_elements)
+            if stack:
+                write_open_parent()
+            stack.append([element, False])
+        elif event == 'end':
+            element, started = stack.pop()
+            if not started:
+                _convert_element(event, element, convert, element_stats,
+                                 target_elements)
+            if element_end is not None:
+                for observe in element_end:
+                    observe(element)
+            if not started:
+                if element.text is None:
+                    write(_start_tag(element, empty=True))
+                    pending = element
+                    continue
+                write(_start_tag(element))
+                write(_escape_text(element.text))
+            write(b'</' + _qualified_name(element) + b'>')
+            pending = element
+        elif stack:
+            # processing instructions outside of the root element are not
+            # part of the serialized root
+            write_open_parent()
+            write(etree.tostring(element, with_tail=False))
+            pending = element
+    if stats is not None:
+        convert_time = stats.timings['convert'] - convert_time
+        stats.add_time('parse', time.perf_counter() - start - convert_time)
+
+
+def _discard(data):
+    pass
+
+
+def _not_converted(value):
+    return None
+
+
+_TEXT_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#13;'
+})
+
+_ATTRIBUTE_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'
+})
+
+_XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+
+def _escape_text(text: str) -> bytes:
+    return text.translate(_TEXT_ESCAPES).encode('ascii', 'xmlcharrefreplace')
+
+
+def _escape_attribute(value: str) -> str:
+    return value.translate(_ATTRIBUTE_ESCAPES)
+
+
+def _qualified_name(element) -> bytes:
+    local_name = element.tag.rpartition('}')[2]
+    if element.prefix:
+        local_name = '%s:%s' % (element.prefix, local_name)
+    return local_name.encode('ascii', 'xmlcharrefreplace')
+
+
+def _start_tag(element, empty=False) -> bytes:
+    """
+    Serializes the start tag of an element along with any namespace
+    declarations it adds to those of its parent.
+    """
+    parts = ['<', _qualified_name(element).decode('ascii')]
+    nsmap = element.nsmap
+    parent = element.getparent()
+    parent_nsmap = parent.nsmap if parent is not None else {}
+    for prefix, uri in nsmap.items():
+        if prefix not in parent_nsmap or parent_nsmap[prefix] != uri:
+            parts.append(' xmlns:%s="%s"' % (prefix, _escape_attribute(uri))
+                         if prefix else
+                         ' xmlns="%s"' % _escape_attribute(uri))
+    generated = {}
+    for name, value in element.items():
+        if name[0] == '{':
+            uri, name = name[1:].split('}', 1)
+            if uri == _XML_NAMESPACE:
+                prefix = 'xml'
+            else:
+                prefix = next((p for p, u in nsmap.items()
+                               if u == uri and p), None) or \
+                    generated.get(uri)
+            if prefix is None:
+                # the namespace is only bound as the default one, which
+                # does not apply to attributes, so it is given a prefix
+                index = len(generated)
+                prefix = 'ns%d' % index
+                while prefix in nsmap or prefix in generated.values():
+                    index += 1
+                    prefix = 'ns%d' % index
+                generated[uri] = prefix
+                parts.append(' xmlns:%s="%s"' % (prefix,
+                                                 _escape_attribute(uri)))
+            name = '%s:%s' % (prefix, name)
+        parts.append(' %s="%s"' % (name, _escape_attribute(value)))
+    parts.append('/>' if empty else '>')
+    return ''.join(parts).encode('ascii', 'xmlcharrefreplace')
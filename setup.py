@@ -63,10 +63,11 @@ setup(
                 "to and from others.",
     entry_points={
         'console_scripts': [
-            'gs123=gs123.cli:main',
+            'gs123=gs123.gs123conversion:main',
         ],
     },
     install_requires=requirements,
+    extras_require={'numpy': ['numpy']},
     license="GNU General Public License v3",
     long_description=readme,
     include_package_data=True,
@@ -0,0 +1,135 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import tempfile
+
+from django.test import TestCase
+
+from gs123.aggregation import AggregationIndex
+from gs123.xml_conversion import convert_xml_file, convert_xml_string
+
+PALLET = '00050991510019004305'
+CASE = '00050991510019004312'
+ITEMS = ['0100377713112102211RFXVHNPA111', '0100377713112102212FWA6AVK7614']
+PALLET_URN = 'urn:epc:id:sscc:5099151.0001900430'
+CASE_URN = 'urn:epc:id:sscc:5099151.0001900431'
+ITEM_URNS = ['urn:epc:id:sgtin:0377713.011210.1RFXVHNPA111',
+             'urn:epc:id:sgtin:0377713.011210.2FWA6AVK7614']
+
+
+def _event(parent, children, action='ADD', name='AggregationEvent'):
+    return (
+        '<%s><action>%s</action><parentID>%s</parentID><childEPCs>%s'
+        '</childEPCs></%s>' % (
+            name, action, parent,
+            ''.join('<epc>%s</epc>' % child for child in children), name)
+    )
+
+
+DOCUMENT = (
+    '<epcis:EPCISDocument xmlns:epcis="urn:epcglobal:epcis:xsd:1">'
+    '<EPCISBody><EventList>%s</EventList></EPCISBody>'
+    '</epcis:EPCISDocument>' % ''.join((
+        _event(CASE, ITEMS),
+        _event(PALLET, [CASE]),
+        _event(PALLET, ['0100377713112102213NOTINCASE'],
+               name='TransactionEvent'),
+    ))
+)
+
+
+class TestAggregationIndex(TestCase):
+    """Tests for the `gs123.aggregation` module."""
+
+    def test_xml(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'in.xml')
+            with open(input_path, 'w') as f:
+                f.write(DOCUMENT)
+            index = AggregationIndex()
+            convert_xml_file(input_path, os.path.join(directory, 'out.xml'),
+                             7, observers=[index])
+            with self.assertRaises(ValueError):
+                convert_xml_file(input_path,
+                                 os.path.join(directory, 'out.xml'), 7,
+                                 checkpoint=True, observers=[index])
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.parent(CASE_URN), PALLET_URN)
+        self.assertEqual(index.children(CASE_URN), ITEM_URNS)
+        self.assertEqual(index.ancestors(ITEM_URNS[1]),
+                         [CASE_URN, PALLET_URN])
+        self.assertEqual(list(index.subtree(PALLET_URN)),
+                         [CASE_URN] + ITEM_URNS)
+        self.assertEqual(list(index.roots()), [PALLET_URN])
+        self.assertIsNone(index.parent(PALLET_URN))
+        self.assertNotIn(PALLET, index)
+        string_index = AggregationIndex()
+        convert_xml_string(DOCUMENT, 7, observers=[string_index])
+        self.assertEqual(list(string_index.subtree(PALLET_URN)),
+                         list(index.subtree(PALLET_URN)))
+
+    def test_changes(self):
+        index = AggregationIndex()
+        index.add('pallet', ['case1', 'case2'])
+        index.add('case1', ['a', 'b', 'c'])
+        index.add('case2', ['d'])
+        index.add('case2', ['b'])
+        self.assertEqual(index.children('case1'), ['a', 'c'])
+        self.assertEqual(index.children('case2'), ['d', 'b'])
+        index.remove('case1', ['c', 'd'])
+        self.assertEqual(index.children('case1'), ['a'])
+        self.assertEqual(index.parent('d'), 'case2')
+        self.assertEqual(list(index.subtree('pallet')),
+                         ['case1', 'a', 'case2', 'd', 'b'])
+        index.remove('case2')
+        self.assertEqual(index.children('case2'), [])
+        self.assertIsNone(index.parent('b'))
+        self.assertEqual(list(index.subtree('unknown')), [])
+        convert_xml_string(
+            '<EventList>%s</EventList>' % _event('pallet', [], 'DELETE'),
+            observers=[index]
+        )
+        self.assertEqual(list(index.roots()), ['case1'])
+
+    def test_cycles(self):
+        index = AggregationIndex()
+        index.add('pallet', ['case'])
+        index.add('case', ['item'])
+        index.add('case', ['pallet', 'case', 'other'])
+        index.add('item', ['pallet'])
+        self.assertEqual(index.conflicts, [
+            ('case', 'pallet'), ('case', 'case'), ('item', 'pallet')])
+        self.assertEqual(index.ancestors('item'), ['case', 'pallet'])
+        self.assertEqual(list(index.subtree('pallet')),
+                         ['case', 'item', 'other'])
+        self.assertEqual(list(index.roots()), ['pallet'])
+
+    def test_save(self):
+        index = AggregationIndex()
+        index.add('case1', ['a', 'bé'])
+        index.add('pallet', ['case2', 'case1'])
+        index.add('case2', ['c'])
+        index.add('lonely', [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.txt')
+            index.save(path)
+            loaded = AggregationIndex.load(path)
+        self.assertEqual(list(loaded.subtree('pallet')),
+                         list(index.subtree('pallet')))
+        self.assertEqual(loaded.children('case1'), ['a', 'bé'])
+        self.assertEqual(loaded.parent('c'), 'case2')
+        self.assertEqual(len(loaded), 6)
+        self.assertNotIn('lonely', loaded)
@@ -0,0 +1,143 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import tempfile
+
+from django.test import TestCase
+from quartet_capture import models
+from quartet_capture.rules import Rule
+
+from gs123.cache import ConversionCache
+
+
+class TestConversionCache(TestCase):
+    """Tests for the persistent conversion cache."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.cache_dir.name, 'cache.db')
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_documents(self):
+        with ConversionCache(self.cache_path) as cache:
+            self.assertIsNone(cache.get_document('<a/>', ('xml', 6)))
+            cache.put_document('<a/>', ('xml', 6), '<b/>')
+            self.assertEqual(cache.get_document(b'<a/>', ('xml', 6)), '<b/>')
+            self.assertIsNone(cache.get_document('<a/>', ('xml', 7)))
+        # the cache persists
+        with ConversionCache(self.cache_path) as cache:
+            self.assertEqual(cache.get_document('<a/>', ('xml', 6)), '<b/>')
+
+    def test_document_eviction(self):
+        with ConversionCache(self.cache_path,
+                             max_document_bytes=10) as cache:
+            cache.put_document('1', (), '1234')
+            cache.put_document('2', (), '1234')
+            cache.get_document('1', ())
+            cache.put_document('3', (), '1234')
+            self.assertEqual(cache.get_document('1', ()), '1234')
+            self.assertIsNone(cache.get_document('2', ()))
+            self.assertEqual(cache.get_document('3', ()), '1234')
+            cache.put_document('4', (), '12345678901')
+            self.assertIsNone(cache.get_document('4', ()))
+
+    def test_values(self):
+        with ConversionCache(self.cache_path, max_values=2) as cache:
+            cache.put_values({'a': '1', 'b': '2'}, ('list',))
+            self.assertEqual(cache.get_values(['a', 'b', 'c'], ('list',)),
+                             {'a': '1', 'b': '2'})
+            self.assertEqual(cache.get_values(['a'], ('other',)), {})
+            cache.put_values({'c': '3'}, ('list',))
+            self.assertEqual(len(cache.get_values(['a', 'b', 'c'],
+                                                  ('list',))), 2)
+
+    def test_value_count_interval(self):
+        # the values are only counted once per hundredth of max_values
+        # values stored
+        counts = []
+        with ConversionCache(self.cache_path, max_values=1000) as cache:
+            cache._connection.set_trace_callback(
+                lambda statement: counts.append(statement)
+                if 'COUNT(*)' in statement else None
+            )
+            for index in range(100):
+                cache.put_values({index: str(index)}, ('list',))
+            self.assertEqual(len(counts), 10)
+            cache.put_values({index: str(index) for index in range(2000)},
+                             ('list',))
+            self.assertEqual(len(cache.get_values(range(2000), ('list',))),
+                             1000)
+
+    def test_steps(self):
+        data = '<sns><sn>0100377713112102211RFXVHNPA111</sn></sns>'
+        for step_class in ('XMLBarcodeConversionStep',
+                           'ListBarcodeConversionStep'):
+            db_rule = models.Rule.objects.create(name=step_class)
+            db_step = models.Step.objects.create(
+                name='convert', order=1, rule=db_rule,
+                step_class='gs123.steps.%s' % step_class
+            )
+            models.StepParameter.objects.create(
+                name='Cache Path', value=self.cache_path, step=db_step
+            )
+            rule_data = data if step_class.startswith('XML') else \
+                ['0100377713112102211RFXVHNPA111']
+            for run in range(2):
+                db_task = models.Task.objects.create(rule=db_rule,
+                                                     status='QUEUED')
+                c_rule = Rule(db_task.rule, db_task)
+                c_rule.execute(rule_data)
+                self.assertIn('urn:epc:id:sgtin:037771.0311210.1RFXVHNPA111',
+                              c_rule.data)
+            self.assertTrue(models.TaskMessage.objects.filter(
+                task=db_task, message__contains='cache'
+            ).exists())
+
+    def test_list_document(self):
+        # a resubmitted list is returned as a whole, and a list that only
+        # shares values with a stored one is converted value by value
+        db_rule = models.Rule.objects.create(name='list')
+        db_step = models.Step.objects.create(
+            name='convert', order=1, rule=db_rule,
+            step_class='gs123.steps.ListBarcodeConversionStep'
+        )
+        models.StepParameter.objects.create(
+            name='Cache Path', value=self.cache_path, step=db_step
+        )
+        barcodes = ['0100377713112102211RFXVHNPA111',
+                    '0100377713112102211RFXVHNPA112']
+        urns = ['urn:epc:id:sgtin:037771.0311210.1RFXVHNPA111',
+                'urn:epc:id:sgtin:037771.0311210.1RFXVHNPA112']
+        for rule_data, expected, message in (
+            (barcodes, urns, None),
+            (barcodes, urns, 'The list was returned from the cache.'),
+            (barcodes[:1], urns[:1],
+             '1 values were returned from the cache.'),
+        ):
+            db_task = models.Task.objects.create(rule=db_rule,
+                                                 status='QUEUED')
+            c_rule = Rule(db_task.rule, db_task)
+            c_rule.execute(rule_data)
+            self.assertEqual(c_rule.data, expected)
+            messages = models.TaskMessage.objects.filter(task=db_task)
+            self.assertEqual(
+                messages.filter(message__contains='cache').exists(),
+                message is not None
+            )
+            if message is not None:
+                self.assertTrue(messages.filter(message=message).exists())
@@ -0,0 +1,255 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from gs123 import json_conversion, xml_conversion
+from gs123.batch import BarcodeBatchConverter, memoize
+from gs123.checkpoint import Checkpoint, CHECKPOINT_SUFFIX
+from gs123.record_conversion import convert_file
+
+BARCODE = '010077722011210221%s'
+URN = 'urn:epc:id:sgtin:0777220.011210.%s'
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FailingConverter(BarcodeBatchConverter):
+    """Raises once `fail_after` values have been converted."""
+
+    def __init__(self, fail_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_after = fail_after
+
+    def convert(self, value):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise Interrupted()
+            self.fail_after -= 1
+        return super().convert(value)
+
+
+def failing_memoize(fail_after):
+    """Returns a replacement for `memoize` whose converters raise once
+    `fail_after` values have been converted."""
+    remaining = [fail_after]
+
+    def wrapper(convert_value, stats=None, memo_size=0):
+        convert = memoize(convert_value, stats, memo_size)
+
+        def failing(value):
+            if remaining[0] == 0:
+                raise Interrupted()
+            remaining[0] -= 1
+            return convert(value)
+
+        return failing
+
+    return wrapper
+
+
+def interrupted(module, fail_after, function, *args):
+    """Calls the function with the module's memoize replaced."""
+    with mock.patch.object(module, 'memoize', failing_memoize(fail_after)):
+        return function(*args)
+
+
+class TestCheckpoint(TestCase):
+    """Tests for resumable, checkpointed file conversion."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, data):
+        with open(self.path(name), 'w', encoding='utf-8', newline='') as f:
+            f.write(data)
+        return self.path(name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    def assertResumes(self, input_path, convert, interrupted_convert):
+        """Converts the file without checkpoints, then interrupts a
+        checkpointed conversion, resumes it and compares the outputs."""
+        convert(input_path, self.path('expected'), False)
+        with self.assertRaises(Interrupted):
+            interrupted_convert(input_path, self.path('output'))
+        self.assertTrue(os.path.exists(self.path('output')
+                                       + CHECKPOINT_SUFFIX))
+        self.assertGreater(len(self.read('output')), 0)
+        convert(input_path, self.path('output'), True)
+        self.assertEqual(self.read('output'), self.read('expected'))
+        self.assertFalse(os.path.exists(self.path('output')
+                                        + CHECKPOINT_SUFFIX))
+
+    def serials(self, count):
+        return ['%s%06dX' % ('1', number) for number in range(count)]
+
+    def test_lines(self):
+        input_path = self.write('input.txt', ''.join(
+            '%s\r\n' % (BARCODE % serial if number % 7 else 'garbage')
+            for number, serial in enumerate(self.serials(1000))
+        ))
+
+        def convert(input_path, output_path, checkpoint,
+                    converter=FailingConverter()):
+            return convert_file(input_path, output_path, 'lines',
+                                checkpoint=checkpoint,
+                                checkpoint_interval=200, batch_size=50,
+                                converter=converter)
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: convert(
+                input_path, output_path, True, FailingConverter(730))
+        )
+
+    def test_csv(self):
+        input_path = self.write('input.csv', 'id,barcode\r\n' + ''.join(
+            '%d,"%s"\r\n' % (number, BARCODE % serial if number % 5
+                             else 'multi\nline')
+            for number, serial in enumerate(self.serials(1000))
+        ))
+
+        def convert(input_path, output_path, checkpoint,
+                    converter=FailingConverter()):
+            count = convert_file(input_path, output_path, 'csv',
+                                 ['barcode'], checkpoint=checkpoint,
+                                 checkpoint_interval=200, batch_size=50,
+                                 converter=converter)
+            self.assertEqual(count, 1000)
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: convert(
+                input_path, output_path, True, FailingConverter(510))
+        )
+
+    def test_jsonl(self):
+        input_path = self.write('input.jsonl', ''.join(
+            '%s\n' % json.dumps({'id': number, 'barcode': BARCODE % serial})
+            for number, serial in enumerate(self.serials(1000))
+        ))
+
+        def convert(input_path, output_path, checkpoint,
+                    converter=FailingConverter()):
+            return convert_file(input_path, output_path, 'jsonl',
+                                ['barcode'], checkpoint=checkpoint,
+                                checkpoint_interval=200, batch_size=50,
+                                converter=converter)
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: convert(
+                input_path, output_path, True, FailingConverter(999))
+        )
+
+    def test_xml(self):
+        input_path = self.write('input.xml', (
+            '<?xml version="1.0"?>\n<root><!-- c -->\n%s</root>\n'
+        ) % ''.join(
+            '  <group code="%s"><SerialNo>%s</SerialNo>text</group>\n'
+            % (BARCODE % serial, BARCODE % serial)
+            for serial in self.serials(500)
+        ))
+
+        def convert(input_path, output_path, checkpoint):
+            xml_conversion.convert_xml_file(input_path, output_path,
+                                            checkpoint=checkpoint,
+                                            checkpoint_interval=100)
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: interrupted(
+                xml_conversion, 701, convert, input_path, output_path, True)
+        )
+
+    def test_xml_urns_to_barcodes(self):
+        input_path = self.write('input.xml', '<root>%s</root>' % ''.join(
+            '<epc>%s</epc>' % (URN % serial) for serial in self.serials(300)
+        ))
+
+        def convert(input_path, output_path, checkpoint):
+            xml_conversion.convert_xml_file_urns_to_barcodes(
+                input_path, output_path, checkpoint=checkpoint,
+                checkpoint_interval=50
+            )
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: interrupted(
+                xml_conversion, 200, convert, input_path, output_path, True)
+        )
+        self.assertIn(('<epc>%s</epc>' % (BARCODE % '1000000X')).encode(),
+                      self.read('output'))
+
+    def test_json(self):
+        input_path = self.write('input.json', json.dumps({
+            'type': 'EPCISDocument',
+            'comment': 'café \\ "quoted"',
+            'eventList': [{
+                'type': 'ObjectEvent',
+                'epcList': [BARCODE % serial for serial in self.serials(100)],
+                'quantityList': [{'epcClass': '0100777220112102'}]
+            } for _ in range(5)]
+        }, indent=2, ensure_ascii=False))
+
+        def convert(input_path, output_path, checkpoint):
+            json_conversion.convert_json_file(input_path, output_path, 7,
+                                              checkpoint=checkpoint,
+                                              checkpoint_interval=100,
+                                              chunk_size=64)
+
+        self.assertResumes(
+            input_path, convert,
+            lambda input_path, output_path: interrupted(
+                json_conversion, 321, convert, input_path, output_path, True)
+        )
+        self.assertIn(URN.encode('ascii') % b'1000099X', self.read('output'))
+
+    def test_checkpoint_invalidated(self):
+        input_path = self.write('input.txt', 'one\n')
+        checkpoint = Checkpoint(input_path, self.path('output'), ['a', 1])
+        self.write('output', 'abc')
+        checkpoint.save(2, records=1)
+        self.assertEqual(checkpoint.load(),
+                         {'output_offset': 2, 'records': 1})
+        # a different configuration
+        self.assertIsNone(Checkpoint(input_path, self.path('output'),
+                                     ['a', 2]).load())
+        # the output is shorter than the recorded offset
+        checkpoint.save(4, records=1)
+        self.assertIsNone(checkpoint.load())
+        # the input has changed
+        checkpoint.save(2, records=1)
+        self.write('input.txt', 'two\n\n')
+        self.assertIsNone(checkpoint.load())
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(checkpoint.path))
+        checkpoint.remove()
@@ -0,0 +1,183 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import json
+
+from django.test import TestCase
+
+from gs123.batch import convert_barcodes, convert_to_digital_links, \
+    convert_urns
+from gs123.conversion import BarcodeConverter, DigitalLinkFormat, \
+    URNConverter
+from gs123.digital_link import DigitalLinkTemplate, parse_digital_link
+from gs123.elements import parse_element_string
+from gs123.json_conversion import convert_json_string
+from gs123.profile import ConversionProfile
+from gs123.stats import ConversionStats
+from gs123.xml_conversion import convert_xml_string, \
+    convert_xml_urns_to_barcodes
+
+LINK = 'https://id.gs1.org/01/00614141123452/21/ABC123?17=251231&10=LOT7'
+BARCODE = '(01)00614141123452(21)ABC1234567(17)251231(10)LOT7'
+URN = 'urn:epc:id:sgtin:0614141.012345.ABC123'
+SSCC_LINK = 'https://id.gs1.org/00/106141411234567897'
+SSCC_URN = 'urn:epc:id:sscc:0614141.1123456789'
+# valid links that are neither a serialized GTIN nor an SSCC
+UNSERIALIZED_LINKS = [
+    'https://id.gs1.org/01/09506000134352',
+    'https://id.gs1.org/01/09506000134352/10/ABC',
+    'https://id.gs1.org/414/9506000134352',
+    'https://id.gs1.org/8003/012345678905',
+]
+
+
+class TestDigitalLink(TestCase):
+    """Tests for the `gs123.digital_link` module."""
+
+    def test_parse(self):
+        parsed = parse_digital_link(LINK)
+        self.assertEqual(dict(parsed.items()), {
+            '01': '00614141123452', '21': 'ABC123', '17': '251231',
+            '10': 'LOT7'})
+        for link in (
+            'https://example.com/some/path/gtin/00614141123452/ser/ABC123'
+            '?10=LOT7&17=251231&linkType=gs1:pip',
+            'http://example.com/01/614141123452/21/ABC123?17=251231&10=LOT7'
+            '#fragment',
+        ):
+            self.assertEqual(dict(parse_digital_link(link).items()),
+                             dict(parsed.items()), link)
+        self.assertEqual(
+            parse_digital_link('https://id.gs1.org/01/00614141123452/21/'
+                               'A%2FB').get('21'), 'A/B')
+        for link in ('https://id.gs1.org/', 'https://id.gs1.org/01',
+                     'https://id.gs1.org/01/123/21/ABC',
+                     'https://id.gs1.org/99/00614141123452',
+                     'https://id.gs1.org/01/00614141123452?17=2512',
+                     'ftp://id.gs1.org/01/00614141123452', '01', None):
+            self.assertIsNone(parse_digital_link(link), link)
+
+    def test_converters(self):
+        converter = BarcodeConverter(LINK, 7)
+        self.assertEqual(converter.epc_urn, URN)
+        self.assertEqual(converter.lot, 'LOT7')
+        self.assertEqual(converter.digital_link, LINK)
+        self.assertEqual(BarcodeConverter(SSCC_LINK, 7).epc_urn, SSCC_URN)
+        self.assertEqual(
+            BarcodeConverter(BARCODE, 7).get_digital_link(
+                'https://example.com/'),
+            'https://example.com/01/00614141123452/21/ABC1234567'
+            '?17=251231&10=LOT7')
+        self.assertEqual(URNConverter(URN).get_digital_link(
+            lot='LOT7', expiration='251231'), LINK)
+        self.assertEqual(URNConverter(SSCC_URN).get_digital_link(),
+                         SSCC_LINK)
+        self.assertEqual(
+            DigitalLinkTemplate('https://example.com').format(
+                '00614141123452', 'A/B', 'L 1'),
+            'https://example.com/01/00614141123452/21/A%2FB?10=L%201')
+        with self.assertRaises(ValueError):
+            DigitalLinkFormat('example.com')
+
+    def test_batch(self):
+        stats = ConversionStats()
+        values = [LINK, BARCODE, SSCC_LINK, 'https://example.com/', None]
+        self.assertEqual(
+            convert_barcodes(values, 7, stats=stats),
+            [URN, 'urn:epc:id:sgtin:0614141.012345.ABC1234567', SSCC_URN,
+             None, None]
+        )
+        self.assertEqual(stats.matches['DIGITAL_LINK'], 2)
+        self.assertEqual(
+            convert_barcodes(values, profile=ConversionProfile(7)),
+            convert_barcodes(values, 7)
+        )
+        self.assertEqual(
+            convert_to_digital_links([URN, BARCODE, LINK, 'x'],
+                                     'https://example.com'),
+            ['https://example.com/01/00614141123452/21/ABC123',
+             'https://example.com/01/00614141123452/21/ABC1234567'
+             '?17=251231&10=LOT7',
+             'https://example.com/01/00614141123452/21/ABC123'
+             '?17=251231&10=LOT7',
+             None]
+        )
+        self.assertEqual(convert_urns([SSCC_URN], DigitalLinkFormat()),
+                         [SSCC_LINK])
+
+    def test_xml(self):
+        document = '<epcList><epc>%s</epc><epc>%s</epc></epcList>' % (
+            LINK.replace('&', '&amp;'), BARCODE)
+        converted = convert_xml_string(document, 7).decode('utf-8')
+        self.assertIn('<epc>%s</epc>' % URN, converted)
+        self.assertIn('ABC1234567</epc>', converted)
+        links = convert_xml_urns_to_barcodes(
+            '<epcList><epc>%s</epc></epcList>' % URN,
+            DigitalLinkFormat('https://example.com')).decode('utf-8')
+        self.assertIn('https://example.com/01/00614141123452/21/ABC123<',
+                      links)
+
+    def test_not_convertible(self):
+        for link in UNSERIALIZED_LINKS:
+            self.assertIsNotNone(parse_digital_link(link), link)
+            with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+                BarcodeConverter(link, 7)
+            self.assertIsNone(ConversionProfile(7).convert(link), link)
+            self.assertIsNone(ConversionProfile(
+                7, formats='SSCC').convert(link), link)
+        with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+            BarcodeConverter.from_match(
+                parse_digital_link(UNSERIALIZED_LINKS[1]), 7)
+        stats = ConversionStats()
+        values = UNSERIALIZED_LINKS + [LINK]
+        self.assertEqual(convert_barcodes(values, 7, stats=stats),
+                         [None] * 4 + [URN])
+        self.assertEqual(stats.misses, 4)
+        self.assertEqual(
+            convert_barcodes(values, profile=ConversionProfile(7)),
+            [None] * 4 + [URN])
+        # the links are left as they are and the rest of the document is
+        # still converted
+        document = '<epcList>%s<epc>%s</epc></epcList>' % (
+            ''.join('<epc>%s</epc>' % link for link in UNSERIALIZED_LINKS),
+            BARCODE)
+        converted = convert_xml_string(document, 7).decode('utf-8')
+        for link in UNSERIALIZED_LINKS:
+            self.assertIn('<epc>%s</epc>' % link, converted)
+        self.assertIn('ABC1234567</epc>', converted)
+        converted = json.loads(convert_json_string(json.dumps({
+            'epcList': UNSERIALIZED_LINKS + [LINK]}), 7))
+        self.assertEqual(converted['epcList'], UNSERIALIZED_LINKS + [URN])
+
+    def test_urn_serial_escaping(self):
+        link = 'https://id.gs1.org/01/00614141123452/21/12%2F3%25%3F%22A'
+        urn = 'urn:epc:id:sgtin:0614141.012345.12%2F3%25%3F%22A'
+        self.assertEqual(parse_digital_link(link).get('21'), '12/3%?"A')
+        self.assertEqual(BarcodeConverter(link, 7).epc_urn, urn)
+        self.assertEqual(BarcodeConverter(link, 7).padded_epc_urn, urn)
+        self.assertEqual(ConversionProfile(7).convert(link), urn)
+        self.assertEqual(convert_barcodes([link], 7), [urn])
+        # round trip back to the link with the serial as it was
+        self.assertEqual(BarcodeConverter(link, 7).digital_link, link)
+        self.assertEqual(BarcodeConverter.from_match(
+            parse_element_string('0100614141123452' '21A-B.C_(1)*+,:;=!'),
+            7).epc_urn, 'urn:epc:id:sgtin:0614141.012345.A-B.C_(1)*+,:;=!')
+        # characters outside GS1 AI encodable character set 82
+        for serial in ('A%20B', '%C3%A9', 'A%1DB'):
+            self.assertIsNone(parse_digital_link(
+                'https://id.gs1.org/01/00614141123452/21/' + serial))
+        with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+            BarcodeConverter.from_match(
+                parse_element_string('0100614141123452' '21A\xe9B'), 7)
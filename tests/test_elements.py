@@ -0,0 +1,98 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter, LazyBarcodeConverter
+from gs123.elements import ElementString, iter_element_strings, \
+    parse_element_string
+
+GS = '\x1d'
+BARCODE = ('0100614141123452' + '11240101' + '13240102' + '15260101'
+           + '3103000250' + '3012' + GS + '8003006141411234561234' + GS
+           + '10LOT7' + GS + '21ABC123')
+
+
+class TestElements(TestCase):
+    """Tests for the `gs123.elements` module."""
+
+    def test_offsets(self):
+        parsed = parse_element_string(BARCODE)
+        self.assertEqual(len(parsed), 9)
+        self.assertEqual(list(parsed), ['01', '11', '13', '15', '3103', '30',
+                                        '8003', '10', '21'])
+        self.assertEqual(parsed.offsets[0], ('01', 2, 16))
+        self.assertEqual(parsed.span('21'), (len(BARCODE) - 6, len(BARCODE)))
+        self.assertIsNone(parsed.span('17'))
+        self.assertIs(parsed.data, BARCODE)
+        self.assertEqual(parsed['3103'], '000250')
+        self.assertEqual(parsed.get('17', 'none'), 'none')
+        self.assertIn('8003', parsed)
+        with self.assertRaises(KeyError):
+            parsed['17']
+
+    def test_fields(self):
+        parsed = parse_element_string(BARCODE)
+        self.assertEqual(parsed.group('production_date'), '240101')
+        self.assertEqual(parsed.group('packaging_date'), '240102')
+        self.assertEqual(parsed.group('best_before_date'), '260101')
+        self.assertEqual(parsed.group('net_weight_kg'), '000250')
+        self.assertEqual(parsed.group('variable_count'), '12')
+        self.assertEqual(parsed.group('grai'), '006141411234561234')
+        self.assertIsNone(parsed.group('expiration_date'))
+        with self.assertRaises(IndexError):
+            parsed.group('not_a_field')
+        groups = parsed.groupdict()
+        self.assertEqual(groups['gtin14'], '00614141123452')
+        self.assertEqual(groups['serial_number'], 'ABC123')
+        self.assertIsNone(groups['sscc18'])
+
+    def test_bytes(self):
+        parsed = parse_element_string(BARCODE.encode('ascii'))
+        self.assertEqual(parsed, parse_element_string(BARCODE))
+        self.assertEqual(parsed.offsets, parse_element_string(BARCODE).offsets)
+        self.assertEqual(parsed.group('lot'), 'LOT7')
+
+    def test_converter(self):
+        for converter_type in (BarcodeConverter, LazyBarcodeConverter):
+            converter = converter_type.from_match(
+                parse_element_string(BARCODE), 7)
+            self.assertEqual(converter.epc_urn,
+                             'urn:epc:id:sgtin:0614141.012345.ABC123')
+            self.assertEqual(converter.lot, 'LOT7')
+            self.assertIsNone(converter.expiration_date)
+        sscc = LazyBarcodeConverter.from_match(
+            parse_element_string(b'00106141411234567897'), 7)
+        self.assertEqual(sscc.epc_urn, 'urn:epc:id:sscc:0614141.1123456789')
+
+    def test_invalid(self):
+        for data in ('', '01123', '0100614141123452' + '10',
+                     '0100614141123452' + '21' + 'X' * 21,
+                     '010061414112345A', '99', '310',
+                     '0100614141123452' + '0100614141123452'):
+            self.assertIsNone(parse_element_string(data), data)
+
+    def test_buffer(self):
+        data = ('0100614141123452' + '21A\r\n\n' + 'garbage\n'
+                + '00106141411234567897').encode('ascii')
+        parsed = list(iter_element_strings(data))
+        self.assertEqual(len(parsed), 3)
+        self.assertEqual(parsed[0].get('21'), 'A')
+        self.assertIsNone(parsed[1])
+        self.assertIs(parsed[2].data, data)
+        self.assertEqual(parsed[2].span('00'), (len(data) - 18, len(data)))
+        self.assertIsInstance(parse_element_string(data, 0, 19),
+                              ElementString)
+        self.assertIsNone(parse_element_string(data, 0, 18))
@@ -0,0 +1,76 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import datetime
+import importlib.util
+import unittest
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter
+from gs123.expiry import expires_before, expires_between, expires_within, \
+    parse_expiration_dates
+
+TODAY = datetime.date(2026, 10, 19)
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is required')
+class TestExpiry(TestCase):
+    """Tests for the `gs123.expiry` module."""
+
+    def test_parse(self):
+        dates, valid = parse_expiration_dates(
+            ['251231', '240200', '250200', '250229', '991301', '2512', None,
+             '25123X', '2512310', '761231', '770101', '000000'],
+            today=TODAY
+        )
+        self.assertEqual(
+            [str(date) for date in dates],
+            ['2025-12-31', '2024-02-29', '2025-02-28', 'NaT', 'NaT', 'NaT',
+             'NaT', 'NaT', 'NaT', '2076-12-31', '1977-01-01', 'NaT']
+        )
+        self.assertEqual(valid.tolist(), [str(date) != 'NaT'
+                                          for date in dates])
+
+    def test_century(self):
+        dates, _ = parse_expiration_dates(['490101', '500101', '990101'],
+                                          today=datetime.date(1999, 6, 1))
+        self.assertEqual([str(date) for date in dates],
+                         ['2049-01-01', '1950-01-01', '1999-01-01'])
+
+    def test_arrays(self):
+        import numpy
+        dates, valid = parse_expiration_dates(
+            numpy.array(['251231', '250100', 'x']), today=TODAY)
+        self.assertEqual(valid.tolist(), [True, True, False])
+        self.assertEqual(str(dates[1]), '2025-01-31')
+        dates, valid = parse_expiration_dates(numpy.array([b'251231']))
+        self.assertEqual(str(dates[0]), '2025-12-31')
+        dates, valid = parse_expiration_dates([])
+        self.assertEqual(len(dates), 0)
+
+    def test_filters(self):
+        expirations = [BarcodeConverter(
+            '(01)00614141123452(21)ABC1234567(17)%s(10)LOT7' % date, 7
+        ).expiration_date for date in ('261001', '261100', '270101')]
+        dates, _ = parse_expiration_dates(expirations + [None], today=TODAY)
+        self.assertEqual(expires_before(dates, '2026-11-30').tolist(),
+                         [True, False, False, False])
+        self.assertEqual(
+            expires_between(dates, datetime.date(2026, 11, 1),
+                            '2027-01-02').tolist(),
+            [False, True, True, False])
+        self.assertEqual(expires_within(dates, 43, today=TODAY).tolist(),
+                         [True, True, False, False])
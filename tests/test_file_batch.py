@@ -0,0 +1,130 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import shutil
+import tempfile
+
+from click.testing import CliRunner
+from django.test import TestCase
+
+from gs123.file_batch import FileJob, convert_files, output_path, plan_jobs
+from gs123.gs123conversion import main
+from gs123.stats import ConversionStats
+from gs123.xml_conversion import convert_xml_file
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestFileBatch(TestCase):
+    """Tests for the `gs123.file_batch` module and the --batch option."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.directory.name, 'in')
+        os.makedirs(os.path.join(self.input_dir, 'nested'))
+        for number in range(3):
+            shutil.copy(os.path.join(DATA_DIR, 'serialnumbers.xml'),
+                        os.path.join(self.input_dir, 'sn%s.xml' % number))
+        shutil.copy(os.path.join(DATA_DIR, 'serialnumbers.xml'),
+                    os.path.join(self.input_dir, 'nested', 'sn3.xml'))
+        self.expected = os.path.join(self.directory.name, 'expected.xml')
+        convert_xml_file(os.path.join(DATA_DIR, 'serialnumbers.xml'),
+                         self.expected)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_output_path(self):
+        self.assertEqual(output_path('/data/in/a.xml'),
+                         '/data/in/a.converted.xml')
+        self.assertEqual(output_path('/data/in/a.xml', '{dir}/../out/{name}'),
+                         '/data/out/a.xml')
+
+    def test_plan_jobs(self):
+        jobs, skipped = plan_jobs([self.input_dir])
+        self.assertEqual([os.path.basename(job.input_path) for job in jobs],
+                         ['sn0.xml', 'sn1.xml', 'sn2.xml'])
+        self.assertEqual(skipped, 0)
+        jobs, skipped = plan_jobs([os.path.join(self.input_dir, '**',
+                                                '*.xml')])
+        self.assertEqual(len(jobs), 4)
+        with self.assertRaises(ValueError):
+            plan_jobs([self.input_dir], '{dir}/out.xml')
+
+    def test_convert_files(self):
+        jobs, skipped = plan_jobs([self.input_dir])
+        stats = ConversionStats()
+        summary = convert_files(jobs, workers=2, stats=stats)
+        self.assertEqual(summary.converted, 3)
+        self.assertEqual(summary.workers, 2)
+        self.assertEqual(summary.failed, [])
+        self.assertEqual(stats.converted, 63)
+        for job in jobs:
+            self.assertEqual(self.read(job.output_path),
+                             self.read(self.expected))
+        # the outputs are up to date and are not picked up as inputs
+        jobs, skipped = plan_jobs([self.input_dir])
+        self.assertEqual((jobs, skipped), ([], 3))
+        os.utime(os.path.join(self.input_dir, 'sn1.xml'))
+        jobs, skipped = plan_jobs([self.input_dir])
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(skipped, 2)
+        self.assertEqual(len(plan_jobs([self.input_dir], force=True)[0]), 3)
+
+    def test_failures(self):
+        bad_input = os.path.join(self.input_dir, 'bad.xml')
+        with open(bad_input, 'w') as f:
+            f.write('<not closed>')
+        bad_output = os.path.join(self.directory.name, 'out', 'bad.xml')
+        summary = convert_files([
+            FileJob(bad_input, bad_output),
+            FileJob(os.path.join(self.input_dir, 'sn0.xml'),
+                    os.path.join(self.directory.name, 'out', 'sn0.xml'))
+        ], workers=1)
+        self.assertEqual(summary.converted, 1)
+        self.assertEqual(summary.failed[0][0], bad_input)
+        self.assertEqual(os.listdir(os.path.dirname(bad_output)),
+                         ['sn0.xml'])
+        self.assertIn('files failed: 1', str(summary))
+
+    def test_cli_batch(self):
+        runner = CliRunner()
+        template = os.path.join(self.directory.name, 'out', '{stem}.urns.xml')
+        result = runner.invoke(main, [
+            '--batch', os.path.join(self.input_dir, '*.xml'),
+            '--output-template', template, '--workers', '2', '--stats'
+        ])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('files converted: 3', result.output)
+        self.assertIn('throughput:', result.output)
+        self.assertIn('values converted: 63', result.output)
+        self.assertEqual(
+            self.read(os.path.join(self.directory.name, 'out',
+                                   'sn2.urns.xml')),
+            self.read(self.expected)
+        )
+        result = runner.invoke(main, [
+            '--batch', os.path.join(self.input_dir, '*.xml'),
+            '--output-template', template
+        ])
+        self.assertIn('files skipped (up to date): 3', result.output)
+        result = runner.invoke(main, ['--batch', self.input_dir,
+                                      '--input-file', 'a.xml'])
+        self.assertEqual(result.exit_code, 2)
@@ -25,7 +25,8 @@ django.setup()
 from quartet_capture import models
 from quartet_capture.rules import Rule
 
-from gs123.conversion import BarcodeConverter, URNConverter, FNC1
+from gs123.conversion import BarcodeConverter, LazyBarcodeConverter, \
+    URNConverter, FNC1
 from gs123.xml_conversion import convert_xml_file, convert_xml_string
 from gs123.check_digit import calculate_check_digit
 
@@ -220,6 +221,29 @@ class TestGs123(TestCase):
                 '012392348439', 6
             )
 
+    def test_lazy_converter(self):
+        properties = (
+            'gtin14', 'sscc18', 'extension_digit', 'serial_number',
+            'serial_number_field', 'padded_serial_number', 'lot',
+            'expiration_date', 'company_prefix', 'item_reference',
+            'check_digit', 'epc_urn', 'padded_epc_urn'
+        )
+        for barcode, company_prefix_length in (
+            ('0100377713112102211RFXVHNPA111', 6),
+            ('(01)00377713112102(21)0012345678(17)231231(10)LOT1', 6),
+            ('0100377713112102210012345678901712311910LOT777', 6),
+            ('(00)003061234567890121', 7),
+        ):
+            converter = BarcodeConverter(barcode, company_prefix_length)
+            lazy = LazyBarcodeConverter(barcode, company_prefix_length)
+            for name in properties:
+                if converter.sscc18 and name == 'item_reference':
+                    continue
+                self.assertEqual(getattr(lazy, name),
+                                 getattr(converter, name))
+        with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+            LazyBarcodeConverter('012392348439', 6)
+
     def test_check_digits(self):
         self.assertEqual(
             calculate_check_digit("0099999999998"),
@@ -465,6 +489,27 @@ class TestGs123(TestCase):
         self.assertTrue('urn:epc:id:sgtin:0377713.011210.1RFXVHNPA111' not in
                         c_rule.context.context['NUMBER_RESPONSE'])
 
+    def test_step_statistics(self):
+        data = """<sns>
+            <sn>0100377713112102211RFXVHNPA111</sn>
+            <sn>01003777131121022114R2FANWAG12</sn>
+        </sns>"""
+        db_rule, db_task, db_step = self._create_rule()
+        models.StepParameter.objects.create(
+            name='Collect Statistics',
+            value='True',
+            step=db_step
+        )
+        db_task.save()
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.context.context['NUMBER_RESPONSE'] = data
+        c_rule.execute('')
+        self.assertIn('urn:epc:id:sgtin:037771.0311210.1RFXVHNPA111',
+                      c_rule.context.context['NUMBER_RESPONSE'])
+        self.assertTrue(models.TaskMessage.objects.filter(
+            task=db_task, message__contains='values converted: 2'
+        ).exists())
+
     def test_parse_rule_data(self):
         data = """<?xml version='1.0' encoding='UTF-8'?>
         <S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
@@ -0,0 +1,119 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.test import TestCase
+from quartet_capture import models
+from quartet_capture.rules import Rule
+
+from gs123.conversion import BarcodeFormat
+from gs123.json_conversion import convert_json_file, convert_json_string, \
+    tokenize
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestJSONConversion(TestCase):
+    """Tests for the streaming EPCIS 2.0 JSON conversion."""
+
+    def setUp(self):
+        with open(os.path.join(DATA_DIR, 'epcis2.json')) as f:
+            self.data = f.read()
+
+    def test_tokenize(self):
+        for chunk_size in (1, 2, 7, 65536):
+            tokens = list(tokenize(StringIO(self.data), chunk_size))
+            self.assertEqual(''.join(tokens), self.data)
+            self.assertIn('"010030612345678721\\u0041BC1"', tokens)
+
+    def test_barcodes_to_urns(self):
+        ret = json.loads(convert_json_string(self.data, 7))
+        object_event, aggregation_event = ret['epcisBody']['eventList']
+        self.assertEqual(object_event['epcList'], [
+            'urn:epc:id:sgtin:0306123.045678.123456789012',
+            'urn:epc:id:sgtin:0306123.045678.ABC1',
+            'urn:epc:id:sgtin:0306123.045678.123456789013'
+        ])
+        self.assertEqual(object_event['quantityList'], [
+            {'epcClass': 'urn:epc:class:lgtin:0306123.045678.12AB',
+             'quantity': 10},
+            {'epcClass': 'urn:epc:idpat:sgtin:0306123.045678.*'}
+        ])
+        self.assertEqual(aggregation_event['parentID'],
+                         'urn:epc:id:sscc:0306123.0456789012')
+        self.assertEqual(aggregation_event['childEPCs'],
+                         ['urn:epc:id:sgtin:0306123.045678.123456789012'])
+        # fields that are not EPC fields are left alone
+        self.assertEqual(aggregation_event['readPoint']['id'],
+                         '010030612345678721123456789012')
+        self.assertEqual(ret['creationDate'],
+                         '2019-11-01T14:00:00.000+01:00')
+
+    def test_formatting_preserved(self):
+        ret = convert_json_string(self.data, 7, chunk_size=3)
+        self.assertEqual(ret, convert_json_string(self.data, 7))
+        self.assertEqual(ret.count('\n'), self.data.count('\n'))
+        self.assertIn('"bizStep": "commissioning",\n', ret)
+
+    def test_round_trip(self):
+        urns = convert_json_string(self.data, 7)
+        barcodes = json.loads(convert_json_string(urns, 7,
+                                                  urns_to_barcodes=True))
+        self.assertEqual(barcodes, json.loads(self.data))
+        barcodes = json.loads(convert_json_string(
+            urns, urns_to_barcodes=True,
+            barcode_format=BarcodeFormat(parenthesis=True)
+        ))
+        object_event = barcodes['epcisBody']['eventList'][0]
+        self.assertEqual(object_event['quantityList'][0]['epcClass'],
+                         '(01)00306123456787(10)12AB')
+
+    def test_target_keys(self):
+        ret = json.loads(convert_json_string(self.data, 7,
+                                             target_keys=['parentID']))
+        object_event, aggregation_event = ret['epcisBody']['eventList']
+        self.assertEqual(object_event['epcList'][0],
+                         '010030612345678721123456789012')
+        self.assertEqual(aggregation_event['parentID'],
+                         'urn:epc:id:sscc:0306123.0456789012')
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_path = os.path.join(output_dir, 'out.json')
+            convert_json_file(os.path.join(DATA_DIR, 'epcis2.json'),
+                              output_path, 7, chunk_size=16)
+            with open(output_path) as f:
+                self.assertEqual(f.read(),
+                                 convert_json_string(self.data, 7))
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            convert_json_string('{"epcList": ["0100', 7)
+
+    def test_step(self):
+        db_rule = models.Rule.objects.create(name='json conversion')
+        models.Step.objects.create(
+            name='convert', order=1, rule=db_rule,
+            step_class='gs123.steps.JSONBarcodeConversionStep'
+        )
+        db_task = models.Task.objects.create(rule=db_rule, status='QUEUED')
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.execute('{"parentID": "00003061234567890121"}')
+        self.assertEqual(c_rule.data,
+                         '{"parentID": "urn:epc:id:sscc:030612.03456789012"}')
@@ -0,0 +1,33 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from django.test import TestCase
+
+from gs123.memo import MISSING, NOT_A_BARCODE, ValueMemo
+
+
+class TestValueMemo(TestCase):
+    """Tests for the `gs123.memo` module."""
+
+    def test_bounded_lru(self):
+        memo = ValueMemo(2)
+        memo.put('a', 'urn:a')
+        memo.put('b', NOT_A_BARCODE)
+        self.assertEqual(memo.get('a'), 'urn:a')
+        memo.put('c', 'urn:c')
+        self.assertEqual(len(memo), 2)
+        self.assertIs(memo.get('b'), MISSING)
+        self.assertEqual(memo.get('c'), 'urn:c')
+        self.assertEqual((memo.hits, memo.misses), (2, 1))
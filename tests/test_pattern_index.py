@@ -0,0 +1,76 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter
+from gs123.pattern_index import PatternIndex
+
+
+class TestPatternIndex(TestCase):
+    """Tests for matching EPCs against EPC pattern URIs."""
+
+    def setUp(self):
+        self.index = PatternIndex([
+            'urn:epc:idpat:sgtin:0306123.045678.[1-100]',
+            'urn:epc:idpat:sgtin:0306123.045678.[50-200]',
+            'urn:epc:idpat:sgtin:0306123.045678.[300-400]',
+            'urn:epc:idpat:sgtin:0306123.045678.ABC',
+            'urn:epc:idpat:sgtin:0306123.045679.*',
+            'urn:epc:idpat:sgtin:0306124.*.*',
+            'urn:epc:idpat:sscc:0306123.[0456789000-0456789999]',
+        ])
+
+    def test_serial_ranges(self):
+        prefix = 'urn:epc:id:sgtin:0306123.045678.'
+        for serial in ('1', '150', '200', '300', '400', 'ABC'):
+            self.assertIn(prefix + serial, self.index)
+        for serial in ('0', '201', '299', '401', '0150', 'ABD'):
+            self.assertNotIn(prefix + serial, self.index)
+        self.index.add('urn:epc:idpat:sgtin:0306123.045678.[201-299]')
+        self.assertIn(prefix + '250', self.index)
+
+    def test_wildcards(self):
+        self.assertIn('urn:epc:id:sgtin:0306123.045679.X1', self.index)
+        self.assertIn('urn:epc:id:sgtin:0306124.012345.1', self.index)
+        self.assertNotIn('urn:epc:id:sgtin:0306125.012345.1', self.index)
+        index = PatternIndex(['urn:epc:idpat:sscc:*.*'])
+        self.assertIn('urn:epc:id:sscc:0306123.0556789012', index)
+        self.assertNotIn('urn:epc:id:sgtin:0306124.012345.1', index)
+
+    def test_sscc(self):
+        self.assertIn('urn:epc:id:sscc:0306123.0456789012', self.index)
+        self.assertNotIn('urn:epc:id:sscc:0306123.0556789012', self.index)
+
+    def test_barcodes_and_filter(self):
+        values = [
+            BarcodeConverter('010030612345678721150', 7),
+            BarcodeConverter('00003061234567890121', 7),
+            BarcodeConverter('010030612345678721250', 7),
+            'urn:epc:id:sgtin:0306123.045678.3',
+            'not a urn'
+        ]
+        self.assertEqual(list(self.index.filter(values)),
+                         values[:2] + [values[3]])
+        self.assertEqual(len(self.index), 7)
+
+    def test_invalid_patterns(self):
+        for pattern in ('urn:epc:idpat:sgtin:*.045678.1',
+                        'urn:epc:idpat:sgtin:0306123.*.1',
+                        'urn:epc:idpat:sgtin:0306123.1',
+                        'urn:epc:idpat:sgtin:0306123.045678.[5-1]',
+                        'urn:epc:id:sgtin:0306123.045678.1'):
+            with self.assertRaises(ValueError):
+                PatternIndex([pattern])
@@ -0,0 +1,137 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import pickle
+
+from django.test import TestCase
+
+from gs123.batch import BarcodeBatchConverter, convert_barcodes
+from gs123.conversion import BarcodeConverter
+from gs123.json_conversion import convert_json_string
+from gs123.profile import ConversionProfile
+from gs123.stats import ConversionStats
+from gs123.xml_conversion import convert_xml_string
+
+BARCODES = (
+    '0100377713112102211RFXVHNPA111',
+    '011234567890123421003456789012',
+    '(01)00377713112102(21)0012345678(17)231231(10)LOT1',
+    '0100377713112102210012345678901712311910LOT777',
+    '0100377713112102211RFX\x1d1712311910LOT777',
+    '(00)003061234567890121',
+    '003061234567890121',
+    '012392348439',
+    'not a barcode',
+    '',
+    None,
+)
+
+# a 10 digit serial number followed by 17 and 10
+SHORT_SERIAL = '01003777131121022112345678901712311910LOT7'
+SHORT_SERIAL_URN = 'urn:epc:id:sgtin:037771.0311210.1234567890'
+
+
+def convert(value, company_prefix_length, property_name='epc_urn',
+            stats=None):
+    try:
+        return getattr(BarcodeConverter(value, company_prefix_length, 12,
+                                        stats=stats), property_name)
+    except BarcodeConverter.BarcodeNotValid:
+        return None
+
+
+class TestConversionProfile(TestCase):
+    """Tests for `gs123.profile.ConversionProfile`."""
+
+    def test_same_output_as_converter(self):
+        for property_name in ('epc_urn', 'gtin14', 'serial_number', 'lot'):
+            for company_prefix_length in (6, 7):
+                profile = ConversionProfile(company_prefix_length,
+                                            property_name=property_name)
+                for barcode in BARCODES:
+                    expected_stats = ConversionStats()
+                    stats = ConversionStats()
+                    self.assertEqual(
+                        profile.convert(barcode, stats),
+                        convert(barcode, company_prefix_length,
+                                property_name, expected_stats),
+                        barcode
+                    )
+                    self.assertEqual(stats.report(), expected_stats.report())
+
+    def test_serial_number_length(self):
+        self.assertIsNone(convert(SHORT_SERIAL, 6))
+        profile = ConversionProfile(6, 10)
+        self.assertEqual(profile.convert(SHORT_SERIAL), SHORT_SERIAL_URN)
+        self.assertEqual(BarcodeConverter(SHORT_SERIAL,
+                                          profile=profile).lot, 'LOT7')
+        # 12 digit serial numbers are still converted
+        barcode = '0100377713112102210012345678901712311910LOT777'
+        self.assertEqual(profile.convert(barcode), convert(barcode, 6))
+
+    def test_formats(self):
+        profile = ConversionProfile(formats='SSCC')
+        self.assertEqual(profile.formats, ('SSCC',))
+        self.assertIsNone(profile.convert('0100377713112102211RFXVHNPA111'))
+        self.assertEqual(profile.convert('003061234567890121'),
+                         'urn:epc:id:sscc:030612.03456789012')
+        profile = ConversionProfile(formats=[
+            'FNC1_SERIAL', 'NO_PARENS_NUMERIC_GS1_01_21'])
+        stats = ConversionStats()
+        self.assertEqual(profile.convert('010037771311210221ABC', stats),
+                         'urn:epc:id:sgtin:037771.0311210.ABC')
+        self.assertEqual(stats.matches['NO_PARENS_NUMERIC_GS1_01_21'], 1)
+        self.assertIsNone(profile.convert('003061234567890121'))
+        with self.assertRaises(ValueError):
+            ConversionProfile(formats=['SSCC', 'NOT_A_FORMAT'])
+        with self.assertRaises(ValueError):
+            ConversionProfile(property_name='not_a_property')
+
+    def test_immutable_and_picklable(self):
+        profile = ConversionProfile(7, 10, 'gtin14', ['SSCC', 'FNC1_SERIAL'])
+        with self.assertRaises(AttributeError):
+            profile.company_prefix_length = 6
+        with self.assertRaises(AttributeError):
+            del profile.convert
+        copy = pickle.loads(pickle.dumps(profile))
+        self.assertEqual(copy, profile)
+        self.assertEqual(hash(copy), hash(profile))
+        self.assertEqual(copy.settings,
+                         (7, 10, 'gtin14', ('SSCC', 'FNC1_SERIAL')))
+        self.assertEqual(copy.convert('(00)003061234567890121'), None)
+        self.assertNotEqual(copy, ConversionProfile(7, 10))
+
+    def test_entry_points(self):
+        profile = ConversionProfile(6, 10)
+        self.assertEqual(
+            BarcodeConverter(SHORT_SERIAL, profile=profile).epc_urn,
+            SHORT_SERIAL_URN
+        )
+        with self.assertRaises(TypeError):
+            BarcodeConverter(SHORT_SERIAL)
+        self.assertEqual(convert_barcodes([SHORT_SERIAL, 'x'],
+                                          profile=profile),
+                         [SHORT_SERIAL_URN, None])
+        converter = BarcodeBatchConverter(
+            profile=ConversionProfile(property_name='lot', formats=[
+                'NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10']))
+        self.assertEqual(converter.property_name, 'lot')
+        self.assertEqual(converter.convert_batch([
+            '0100377713112102210012345678901712311910LOT777']), ['LOT777'])
+        self.assertIn(SHORT_SERIAL_URN, convert_xml_string(
+            '<epcs><epc>%s</epc></epcs>' % SHORT_SERIAL, profile=profile
+        ).decode('utf-8'))
+        self.assertIn(SHORT_SERIAL_URN, convert_json_string(
+            '{"epcList": ["%s"]}' % SHORT_SERIAL, profile=profile))
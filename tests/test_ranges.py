@@ -0,0 +1,148 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from io import StringIO
+
+from django.test import TestCase
+
+from gs123.check_digit import calculate_check_digit
+from gs123.conversion import BarcodeConverter
+from gs123.ranges import SerialRange, compress_serials, \
+    compress_to_pattern_urns, expand_ranges, join_blocks, sgtin_range, \
+    sscc_blocks, sscc_range, write_blocks
+
+
+class TestRanges(TestCase):
+    """Tests for the SSCC and SGTIN range generators."""
+
+    def test_sscc_check_digits(self):
+        # crosses several hundreds boundaries and a carry in the prefix
+        ret = sscc_range('00306123456789950', 250, 7, block_size=30)
+        self.assertEqual(len(ret), 250)
+        for number, value in enumerate(ret, 306123456789950):
+            self.assertEqual(
+                value, '00%s' % calculate_check_digit('%017d' % number))
+
+    def test_sscc_start_formats(self):
+        sscc18 = calculate_check_digit('00306123456789950')
+        expected = sscc_range('00306123456789950', 3, 7)
+        self.assertEqual(sscc_range(sscc18, 3, 7), expected)
+        self.assertEqual(sscc_range('00' + sscc18, 3, 7), expected)
+        self.assertEqual(sscc_range('(00)' + sscc18, 3, 7, parenthesis=True),
+                         ['(00)' + value[2:] for value in expected])
+        self.assertEqual(sscc_range(sscc18, 3, 7, output='sscc18'),
+                         [value[2:] for value in expected])
+        with self.assertRaises(ValueError):
+            sscc_range(sscc18[:17] + '0', 3, 7)
+
+    def test_sscc_urns(self):
+        barcodes = sscc_range('00306123456789998', 3, 7)
+        self.assertEqual(
+            sscc_range('00306123456789998', 3, 7, output='urn'),
+            [BarcodeConverter(value, 7).epc_urn for value in barcodes]
+        )
+
+    def test_sscc_overflow(self):
+        with self.assertRaises(ValueError):
+            sscc_range('00306123999999998', 3, 7)
+
+    def test_sgtin(self):
+        self.assertEqual(
+            sgtin_range('00306123456787', 99, 2, serial_number_length=12),
+            ['010030612345678721000000000099',
+             '010030612345678721000000000100']
+        )
+        self.assertEqual(
+            sgtin_range('00306123456787', 99, 2, company_prefix_length=7,
+                        output='urn'),
+            ['urn:epc:id:sgtin:0306123.045678.99',
+             'urn:epc:id:sgtin:0306123.045678.100']
+        )
+        with self.assertRaises(ValueError):
+            sgtin_range('00306123456788', 1, 2)
+        with self.assertRaises(ValueError):
+            sgtin_range('00306123456787', 1, 2, output='urn')
+
+    def test_block_output(self):
+        blocks = list(sscc_blocks('00306123456789950', 25, 7, block_size=10))
+        self.assertEqual([len(block) for block in blocks], [10, 10, 5])
+        joined = join_blocks(
+            sscc_blocks('00306123456789950', 25, 7, block_size=10))
+        self.assertEqual(joined, '\n'.join(sum(blocks, [])) + '\n')
+        stream = StringIO()
+        self.assertEqual(write_blocks(iter(blocks), stream), 25)
+        self.assertEqual(stream.getvalue(), joined)
+
+
+class TestRangeCompression(TestCase):
+    """Tests for compressing serial numbers into ranges and expanding them."""
+
+    def setUp(self):
+        self.urns = ['urn:epc:id:sgtin:0306123.045678.%s' % serial
+                     for serial in list(range(1, 101)) + [105, 106, 3]]
+        self.barcodes = ['010030612345678721%s' % serial
+                         for serial in range(200, 210)]
+
+    def test_compress(self):
+        ranges, others = compress_serials(
+            self.urns + self.barcodes + [
+                'urn:epc:id:sgtin:0306123.045678.0012', 'not a barcode',
+                '00003061234567890121', '010030612345678721007',
+                '010030612345678721008'
+            ],
+            7
+        )
+        self.assertEqual(ranges, [
+            SerialRange('00306123456787', 1, 100),
+            SerialRange('00306123456787', 105, 106),
+            SerialRange('00306123456787', 200, 209)
+        ])
+        self.assertEqual(ranges[0].count, 100)
+        self.assertEqual(others, [
+            'urn:epc:id:sgtin:0306123.045678.0012', 'not a barcode',
+            '00003061234567890121', '010030612345678721007',
+            '010030612345678721008'
+        ])
+
+    def test_pattern_urns(self):
+        patterns, others = compress_to_pattern_urns(
+            self.urns + ['urn:epc:id:sgtin:0306123.045678.300'], 7)
+        self.assertEqual(patterns, [
+            'urn:epc:idpat:sgtin:0306123.045678.[1-100]',
+            'urn:epc:idpat:sgtin:0306123.045678.[105-106]',
+            'urn:epc:idpat:sgtin:0306123.045678.300'
+        ])
+        self.assertEqual(others, [])
+        self.assertEqual(SerialRange.from_pattern_urn(patterns[2]),
+                         SerialRange('00306123456787', 300, 300))
+        with self.assertRaises(ValueError):
+            SerialRange.from_pattern_urn(
+                'urn:epc:idpat:sgtin:0306123.045678.[9-1]')
+
+    def test_expand(self):
+        patterns, others = compress_to_pattern_urns(self.urns, 7)
+        self.assertEqual(list(expand_ranges(patterns)),
+                         sorted(set(self.urns),
+                                key=lambda urn: int(urn.split('.')[-1])))
+        self.assertEqual(
+            list(expand_ranges([('00306123456787', 200, 209)], 'barcode')),
+            self.barcodes
+        )
+
+    def test_expand_is_lazy(self):
+        values = expand_ranges(
+            ['urn:epc:idpat:sgtin:0306123.045678.[1-100000000000]'])
+        self.assertEqual(next(values), 'urn:epc:id:sgtin:0306123.045678.1')
+        self.assertEqual(next(values), 'urn:epc:id:sgtin:0306123.045678.2')
@@ -0,0 +1,155 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import tempfile
+
+from django.test import TestCase
+from quartet_capture import models
+from quartet_capture.rules import Rule
+
+from gs123.reconciliation import EPCSet, business_step, \
+    reconcile_xml_file, reconcile_xml_string
+from gs123.steps import EPCsNotCommissioned
+
+COMMISSIONING = 'urn:epcglobal:cbv:bizstep:commissioning'
+PALLET = '00050991510019004305'
+ITEMS = ['0100377713112102211RFXVHNPA111', '0100377713112102212FWA6AVK7614',
+         '0100377713112102213NOTCOMMIS']
+PALLET_URN = 'urn:epc:id:sscc:5099151.0001900430'
+ITEM_URNS = ['urn:epc:id:sgtin:0377713.011210.1RFXVHNPA111',
+             'urn:epc:id:sgtin:0377713.011210.2FWA6AVK7614',
+             'urn:epc:id:sgtin:0377713.011210.3NOTCOMMIS']
+
+
+def _event(name, epcs, biz_step, parent=None, action='ADD'):
+    list_name = 'childEPCs' if name == 'AggregationEvent' else 'epcList'
+    return (
+        '<%s><%s>%s</%s><action>%s</action><bizStep>%s</bizStep>%s</%s>' % (
+            name, list_name, ''.join('<epc>%s</epc>' % epc for epc in epcs),
+            list_name, action, biz_step,
+            '<parentID>%s</parentID>' % parent if parent else '', name)
+    )
+
+
+DOCUMENT = '<EPCISDocument><EventList>%s</EventList></EPCISDocument>' % (
+    ''.join((
+        _event('ObjectEvent', ITEMS[:2], COMMISSIONING),
+        _event('AggregationEvent', ITEMS, 'packing', PALLET),
+        _event('ObjectEvent', [PALLET], COMMISSIONING),
+        _event('ObjectEvent', [PALLET, ITEMS[2]], 'shipping', None,
+               'OBSERVE'),
+        _event('ObjectEvent', ['0100377713112102214OBSERVED'], 'receiving',
+               None, 'OBSERVE'),
+    ))
+)
+
+
+class TestReconciliation(TestCase):
+    """Tests for the `gs123.reconciliation` module and step."""
+
+    def test_epc_set(self):
+        epcs = EPCSet(ITEM_URNS)
+        self.assertEqual(len(epcs), 3)
+        self.assertFalse(epcs.add(ITEM_URNS[0]))
+        self.assertTrue(epcs.add(PALLET_URN))
+        self.assertIn(PALLET_URN, epcs)
+        self.assertNotIn(PALLET, epcs)
+        many = EPCSet('urn:epc:id:sgtin:0377713.011210.%d' % serial
+                      for serial in range(20000))
+        self.assertEqual(len(many), 20000)
+        self.assertIn('urn:epc:id:sgtin:0377713.011210.19999', many)
+        self.assertNotIn('urn:epc:id:sgtin:0377713.011210.20000', many)
+
+    def test_reconcile(self):
+        converted, reconciliation = reconcile_xml_string(DOCUMENT, 7)
+        self.assertIn(ITEM_URNS[2].encode('ascii'), converted)
+        self.assertEqual(reconciliation.missing, [ITEM_URNS[2]])
+        self.assertFalse(reconciliation.reconciled)
+        self.assertEqual(reconciliation.checked, 6)
+        self.assertEqual(len(reconciliation.commissioned), 3)
+        commissioned = EPCSet([ITEM_URNS[2]])
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'in.xml')
+            with open(input_path, 'w') as f:
+                f.write(DOCUMENT)
+            reconciliation = reconcile_xml_file(
+                input_path, os.path.join(directory, 'out.xml'), 7,
+                commissioned=commissioned)
+        self.assertTrue(reconciliation.reconciled)
+        self.assertIs(reconciliation.commissioned, commissioned)
+        self.assertEqual(len(commissioned), 4)
+
+    def test_business_steps(self):
+        for value in (COMMISSIONING, 'commissioning',
+                      ' https://ref.gs1.org/cbv/BizStep-commissioning\n'):
+            self.assertEqual(business_step(value), 'commissioning')
+        # the same events with CBV 2.0 business steps
+        document = DOCUMENT.replace(
+            COMMISSIONING, 'https://ref.gs1.org/cbv/BizStep-commissioning'
+        ).replace(
+            '>shipping<', '>https://ref.gs1.org/cbv/BizStep-shipping<')
+        converted, reconciliation = reconcile_xml_string(document, 7)
+        self.assertEqual(reconciliation.missing, [ITEM_URNS[2]])
+        self.assertEqual(reconciliation.checked, 6)
+
+    def test_target_elements(self):
+        # parentID is converted even though it is not a target element
+        converted, reconciliation = reconcile_xml_string(
+            DOCUMENT, 7, target_elements=frozenset(('epc',)))
+        self.assertEqual(reconciliation.missing, [ITEM_URNS[2]])
+        self.assertIn(b'<parentID>%s</parentID>' % PALLET_URN.encode(),
+                      converted)
+
+    def test_step(self):
+        db_task, db_step = self._create_rule()
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.context.context['NUMBER_RESPONSE'] = DOCUMENT
+        with self.assertRaises(EPCsNotCommissioned):
+            c_rule.execute('')
+        self.assertEqual(c_rule.context.context['MISSING_EPCS'],
+                         [ITEM_URNS[2]])
+        models.StepParameter.objects.create(
+            name='Commissioned Context Key', value='COMMISSIONED',
+            step=db_step)
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.context.context['NUMBER_RESPONSE'] = DOCUMENT
+        c_rule.context.context['COMMISSIONED'] = [ITEM_URNS[2]]
+        c_rule.execute('')
+        self.assertEqual(c_rule.context.context['MISSING_EPCS'], [])
+        self.assertIn(PALLET_URN, c_rule.context.context['NUMBER_RESPONSE'])
+        models.StepParameter.objects.create(
+            name='Target Elements', value='epc', step=db_step)
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.context.context['NUMBER_RESPONSE'] = DOCUMENT
+        with self.assertRaises(EPCsNotCommissioned):
+            c_rule.execute('')
+        self.assertEqual(c_rule.context.context['MISSING_EPCS'],
+                         [ITEM_URNS[2]])
+
+    def _create_rule(self):
+        db_rule = models.Rule.objects.create(
+            name='reconciliation',
+            description='Reconciles commissioning and aggregation.')
+        db_step = models.Step.objects.create(
+            name='reconcile', description='Reconcile the EPCs.', order=1,
+            step_class='gs123.steps.XMLReconciliationStep', rule=db_rule)
+        for name, value in (('Use Context Key', 'True'),
+                            ('Company Prefix Length', '7')):
+            models.StepParameter.objects.create(name=name, value=value,
+                                                step=db_step)
+        db_task = models.Task(rule=db_rule, status='QUEUED')
+        db_task.save()
+        return db_task, db_step
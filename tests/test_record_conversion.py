@@ -0,0 +1,110 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import json
+from io import StringIO
+
+from django.test import TestCase
+
+from gs123.batch import convert_barcodes, convert_urns
+from gs123.record_conversion import convert_csv, convert_jsonl, convert_lines
+
+SGTIN = '0100377713112102211RFXVHNPA111'
+SGTIN_URN = 'urn:epc:id:sgtin:037771.0311210.1RFXVHNPA111'
+LOT_BARCODE = '(01)00312345678901(21)000000000001(17)191231(10)ABC123'
+
+
+class TestBatchConversion(TestCase):
+    """Tests for the `gs123.batch` module."""
+
+    def test_convert_barcodes(self):
+        self.assertEqual(
+            convert_barcodes([SGTIN, 'garbage', SGTIN, None], 6),
+            [SGTIN_URN, None, SGTIN_URN, None]
+        )
+        self.assertEqual(
+            convert_barcodes([SGTIN], 6, property_name='gtin14'),
+            ['00377713112102']
+        )
+
+    def test_convert_urns(self):
+        self.assertEqual(
+            convert_urns(['urn:epc:id:sgtin:0377713.011210.1RFXVHNPA111',
+                          'garbage']),
+            ['0100377713112109211RFXVHNPA111', None]
+        )
+
+
+class TestRecordConversion(TestCase):
+    """Tests for the `gs123.record_conversion` module."""
+
+    def test_csv(self):
+        output = StringIO()
+        count = convert_csv(
+            StringIO('id,barcode\n1,%s\n2,garbage\n3,%s\n' % (
+                SGTIN, LOT_BARCODE)),
+            output, ['barcode'], add_fields=True, batch_size=2
+        )
+        self.assertEqual(count, 3)
+        self.assertEqual(output.getvalue().splitlines(), [
+            'id,barcode,gtin14,serial_number,lot,expiration_date',
+            '1,%s,00377713112102,1RFXVHNPA111,,' % SGTIN_URN,
+            '2,garbage,,,,',
+            '3,urn:epc:id:sgtin:031234.0567890.1,00312345678901,1,ABC123,'
+            '191231',
+        ])
+
+    def test_csv_short_rows(self):
+        output = StringIO()
+        convert_csv(StringIO('barcode,id,note\n%s,1\ngarbage\n' % SGTIN),
+                    output, ['barcode'], add_fields=True)
+        self.assertEqual(output.getvalue().splitlines(), [
+            'barcode,id,note,gtin14,serial_number,lot,expiration_date',
+            '%s,1,,00377713112102,1RFXVHNPA111,,' % SGTIN_URN,
+            'garbage,,,,,,',
+        ])
+
+    def test_csv_missing_column(self):
+        with self.assertRaises(ValueError):
+            convert_csv(StringIO('id\n1\n'), StringIO(), ['barcode'])
+
+    def test_jsonl(self):
+        output = StringIO()
+        convert_jsonl(
+            StringIO('{"sn": "%s", "qty": 1}\n\n{"sn": "garbage"}\n{}\n'
+                     % SGTIN),
+            output, ['sn'], add_fields=True
+        )
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['sn'], SGTIN_URN)
+        self.assertEqual(records[0]['qty'], 1)
+        self.assertEqual(records[0]['gtin14'], '00377713112102')
+        self.assertEqual(records[1]['sn'], 'garbage')
+        self.assertIsNone(records[1]['gtin14'])
+        # records that are not objects are written unchanged
+        for add_fields in (True, False):
+            output = StringIO()
+            convert_jsonl(StringIO('[1, 2]\n"x"\n5\n{"sn": "%s"}\n' % SGTIN),
+                          output, ['sn'], add_fields=add_fields)
+            records = [json.loads(line)
+                       for line in output.getvalue().splitlines()]
+            self.assertEqual(records[:3], [[1, 2], 'x', 5])
+            self.assertEqual(records[3]['sn'], SGTIN_URN)
+
+    def test_lines(self):
+        output = StringIO()
+        convert_lines(StringIO('%s\nABC\n' % SGTIN), output)
+        self.assertEqual(output.getvalue(), '%s\nABC\n' % SGTIN_URN)
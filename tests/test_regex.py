@@ -0,0 +1,107 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import pickle
+import subprocess
+import sys
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter
+from gs123.lazy import LazyPattern
+from gs123.regex import PatternRegistry, match_pattern
+from gs123.stats import ConversionStats
+
+FNC1_BARCODE = '010031234567890121000000000001\x1D1719123110ABC123'
+
+
+class TestPatternRegistry(TestCase):
+    """Tests for the `gs123.regex.PatternRegistry` class."""
+
+    def _names(self, registry):
+        return [name for name, pattern in registry.fallback_patterns]
+
+    def test_reorder(self):
+        registry = PatternRegistry(reorder_interval=3)
+        self.assertEqual(self._names(registry)[-1], 'FNC1_SERIAL')
+        for i in range(3):
+            self.assertTrue(match_pattern(FNC1_BARCODE, registry=registry))
+        self.assertEqual(registry.hits['FNC1_SERIAL'], 3)
+        self.assertEqual(self._names(registry), [
+            'FNC1_SERIAL',
+            'NO_PARENS_NUMERIC_GS1_01_21',
+            'NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10'
+        ])
+        stats = ConversionStats()
+        match_pattern(FNC1_BARCODE, registry=registry, stats=stats)
+        self.assertEqual(stats.report().matches, {'FNC1_SERIAL': 1})
+
+    def test_reordered_results_match(self):
+        registry = PatternRegistry(reorder_interval=1)
+        registry.hits['FNC1_SERIAL'] = 10
+        registry.hits['NO_PARENS_NUMERIC_GS1_01_21_OPTIONAL_17_10'] = 5
+        registry.reorder()
+        for value in (FNC1_BARCODE,
+                      '0100312345678901210000000000011719123110ABC123',
+                      '01003005406390512110008344372010'):
+            expected = BarcodeConverter(value, 6)
+            converter = BarcodeConverter(value, 6, registry=registry)
+            self.assertEqual(converter.epc_urn, expected.epc_urn)
+            self.assertEqual(converter.lot, expected.lot)
+
+    def test_pinned(self):
+        registry = PatternRegistry(pinned='FNC1_SERIAL')
+        converter = BarcodeConverter(FNC1_BARCODE, 6, registry=registry)
+        self.assertEqual(converter.lot, 'ABC123')
+        with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+            BarcodeConverter('(01)12345678901234(21)123456789012', 6,
+                             registry=registry)
+        registry.unpin()
+        BarcodeConverter('(01)12345678901234(21)123456789012', 6,
+                         registry=registry)
+        with self.assertRaises(ValueError):
+            registry.pin('NOT_A_PATTERN')
+
+
+class TestLazyImports(TestCase):
+    """Tests for the `gs123.lazy` module."""
+
+    def test_lazy_pattern(self):
+        pattern = LazyPattern(r'^(?P<digits>\d+)$')
+        self.assertNotIn('match', pattern.__dict__)
+        self.assertEqual(pattern.match('123').group('digits'), '123')
+        self.assertIn('match', pattern.__dict__)
+        self.assertIsNone(pattern.match('abc'))
+        self.assertEqual(pattern.groupindex['digits'], 1)
+        copy = pickle.loads(pickle.dumps(pattern))
+        self.assertNotIn('match', copy.__dict__)
+        self.assertEqual(copy.search('45').group(), '45')
+        with self.assertRaises(AttributeError):
+            pattern.missing
+
+    def test_lazy_imports(self):
+        # importing the converters compiles nothing and does not load lxml,
+        # or json for the checkpoints
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, gs123.xml_conversion, gs123.gs123conversion; '
+            'from gs123 import regex; '
+            'print(\'lxml\' in sys.modules, \'multiprocessing\' in '
+            'sys.modules, \'match\' in regex.SSCC.__dict__, '
+            '\'json\' in sys.modules)'
+        ], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.split(),
+                         [b'False', b'False', b'False', b'False'])
@@ -0,0 +1,113 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from io import BytesIO
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter, LazyBarcodeConverter
+from gs123.elements import ElementString, parse_element_string
+from gs123.scanner import ScannedBarcode, convert_payloads, \
+    decode_payload, decode_payloads, read_scanner_log
+from gs123.stats import ConversionStats
+
+GS = '\x1d'
+SGTIN_URN = 'urn:epc:id:sgtin:0614141.012345.ABC123'
+
+
+class TestScanner(TestCase):
+    """Tests for the `gs123.scanner` module."""
+
+    def test_symbology_and_separators(self):
+        expected = {'01': '00614141123452', '17': '251231',
+                    '10': 'LOT7', '21': 'ABC123'}
+        for payload in (
+            ']d2010061414112345217251231' + '10LOT7' + GS + '21ABC123',
+            ']C1' + GS + '0100614141123452' + GS + '17251231' + '10LOT7'
+            + GS + '21ABC123\r\n',
+            ']Q30100614141123452172512311' + '0LOT7<GS>21ABC123',
+            b'0100614141123452' + b'17251231' + b'10LOT7\xe821ABC123',
+        ):
+            scanned = decode_payload(payload)
+            self.assertEqual(dict(scanned.elements.items()), expected)
+            self.assertTrue(scanned.is_gs1)
+        self.assertEqual(decode_payload(']d2' + GS + '0100614141123452')
+                         .symbology, ']d2')
+        self.assertFalse(decode_payload(']d10100614141123452').is_gs1)
+
+    def test_invalid_payloads(self):
+        for payload in ('', ']d2', '01123', '0100614141123452' + '10',
+                        '0100614141123452' + '21' + 'X' * 21,
+                        '010061414112345A', '99',
+                        '0100614141123452' + '0100614141123452'):
+            self.assertIsNone(decode_payload(payload), payload)
+
+    def test_element_string(self):
+        scanned = decode_payload(
+            ']d2' + GS + '0100614141123452' + '10LOT7' + GS + '3103000250'
+            + '21ABC123'
+        )
+        self.assertEqual(scanned.get('3103'), '000250')
+        # the parse result is kept as it is, not copied into a dict
+        self.assertIsInstance(scanned.elements, ElementString)
+        self.assertEqual(scanned.group('lot'), 'LOT7')
+        self.assertEqual(scanned.element_string,
+                         '0100614141123452' + '10LOT7' + GS + '3103000250'
+                         + '21ABC123')
+        self.assertEqual(decode_payload(scanned.element_string).elements,
+                         scanned.elements)
+
+    def test_from_match(self):
+        scanned = decode_payload(']d2010061414112345221ABC123' + GS
+                                 + '17251231' + '10LOT7')
+        converter = BarcodeConverter.from_match(scanned, 7)
+        self.assertEqual(converter.epc_urn, SGTIN_URN)
+        self.assertEqual(converter.lot, 'LOT7')
+        self.assertEqual(converter.expiration_date, '251231')
+        barcode = '(01)00614141123452(21)ABC1234567(17)251231(10)LOT7'
+        self.assertEqual(
+            BarcodeConverter.from_match(decode_payload(
+                '010061414112345221ABC1234567' + GS + '1725123110LOT7'
+            ), 7).epc_urn,
+            BarcodeConverter(barcode, 7).epc_urn
+        )
+        lazy = LazyBarcodeConverter.from_match(scanned, 7)
+        self.assertEqual(lazy.epc_urn, SGTIN_URN)
+        sscc = BarcodeConverter.from_match(
+            decode_payload(']C100106141411234567897'), 7)
+        self.assertEqual(sscc.epc_urn,
+                         'urn:epc:id:sscc:0614141.1123456789')
+
+    def test_bulk(self):
+        payloads = [']d20100614141123452' + '21ABC123', b'garbage',
+                    ']C10100614141123452' + '10LOT7']
+        self.assertEqual(len(list(decode_payloads(payloads))), 3)
+        stats = ConversionStats()
+        self.assertEqual(convert_payloads(payloads, 7, stats=stats),
+                         [SGTIN_URN, None, None])
+        self.assertEqual(stats.matches['SCANNER_PAYLOAD'], 1)
+        self.assertEqual(stats.rejections, 2)
+        self.assertEqual(
+            convert_payloads(payloads[:1], 7, property_name='gtin14'),
+            ['00614141123452']
+        )
+        log = BytesIO(b']d20100614141123452' + b'21ABC123\r\n\r\n'
+                      b']C10100614141123452\n')
+        self.assertEqual(
+            list(read_scanner_log(log)),
+            [ScannedBarcode(']d2', parse_element_string(
+                '0100614141123452' '21ABC123')),
+             ScannedBarcode(']C1', parse_element_string('0100614141123452'))]
+        )
@@ -0,0 +1,154 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+
+from django.test import TestCase
+
+from gs123.batch import convert_barcodes, convert_urns
+from gs123.conversion import BarcodeFormat
+from gs123.server import ConversionServer
+from gs123.xml_conversion import convert_xml_string, \
+    convert_xml_urns_to_barcodes
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+BARCODES = [
+    '(01)00614141123452(21)%010d(17)251231(10)LOT7' % serial
+    for serial in range(1, 300)
+] + ['', 'not a barcode', '00106141411234567897']
+
+
+class TestServer(TestCase):
+    """Tests for the `gs123.server` module, against localhost."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.server = ConversionServer(
+            port=0, company_prefix_length=7, workers=2, batch_size=50,
+            barcode_format=BarcodeFormat(parenthesis=True))
+        self._run(self.server.start())
+
+    def tearDown(self):
+        self._run(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine,
+                                                self.loop).result(30)
+
+    def _connect(self):
+        return HTTPConnection('127.0.0.1', self.server.port, timeout=30)
+
+    def _post(self, connection, path, body, headers=None, **kwargs):
+        connection.request('POST', path, body, headers or {}, **kwargs)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_values(self):
+        connection = self._connect()
+        status, body = self._post(connection, '/barcodes',
+                                  '\r\n'.join(BARCODES).encode('ascii'))
+        self.assertEqual(status, 200)
+        urns = body.decode('ascii').split('\n')
+        self.assertEqual(urns.pop(), '')
+        self.assertEqual(urns, [urn or '' for urn in
+                                convert_barcodes(BARCODES, 7)])
+        sock = connection.sock
+        # the connection is kept alive for the next request
+        status, body = self._post(
+            connection, '/urns', json.dumps(urns[:3] + ['', None, 'x']),
+            {'Content-Type': 'application/json'})
+        self.assertIs(connection.sock, sock)
+        self.assertEqual(json.loads(body), convert_urns(
+            urns[:3], BarcodeFormat(parenthesis=True)) + [None] * 3)
+        connection.request('GET', '/health')
+        self.assertEqual(json.loads(connection.getresponse().read()),
+                         {'status': 'ok', 'workers': 2, 'active': 0})
+        connection.close()
+
+    def test_chunked_xml(self):
+        with open(os.path.join(DATA_DIR, 'epcis_mixed.xml'), 'rb') as f:
+            data = f.read()
+        connection = self._connect()
+        status, body = self._post(
+            connection, '/xml/barcodes',
+            (data[index:index + 100] for index in range(0, len(data), 100)),
+            encode_chunked=True)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, convert_xml_string(data, 7))
+        status, barcodes = self._post(connection, '/xml/urns', body)
+        self.assertEqual(barcodes, convert_xml_urns_to_barcodes(
+            body, BarcodeFormat(parenthesis=True)))
+        # a line body sent in chunks is answered in chunks
+        status, urns = self._post(
+            connection, '/barcodes',
+            (value.encode('ascii') + b'\n' for value in BARCODES),
+            encode_chunked=True)
+        self.assertEqual(len(urns.split(b'\n')), len(BARCODES) + 1)
+        connection.close()
+
+    def test_errors(self):
+        connection = self._connect()
+        self.assertEqual(self._post(connection, '/other', b'')[0], 404)
+        connection = self._connect()
+        connection.request('GET', '/barcodes')
+        self.assertEqual(connection.getresponse().status, 405)
+        connection = self._connect()
+        status, body = self._post(connection, '/xml/barcodes', b'<a><b></a>')
+        self.assertEqual(status, 400)
+        self.assertIn(b'not a valid XML document', body)
+        connection = self._connect()
+        self.assertEqual(self._post(
+            connection, '/barcodes', b'{}',
+            {'Content-Type': 'application/json'})[0], 400)
+        with socket.create_connection(('127.0.0.1', self.server.port)) as s:
+            s.sendall(b'POST /barcodes HTTP/1.1\r\n'
+                      b'Transfer-Encoding: chunked\r\n\r\nzz\r\n')
+            self.assertTrue(s.recv(1024).startswith(b'HTTP/1.1 400'))
+
+    def test_concurrency(self):
+        results = []
+
+        def post():
+            connection = self._connect()
+            results.append(self._post(connection, '/barcodes',
+                                      '\n'.join(BARCODES)))
+            connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(results[0][0], 200)
+        # a response can reach the client just before its handler ends
+        for _ in range(100):
+            if not self.server.active:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.server.active, 0)
@@ -0,0 +1,98 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+from unittest import skipUnless
+
+from django.test import TestCase
+
+from gs123.batch import convert_barcodes
+from gs123.profile import ConversionProfile
+from gs123.shared_batch import SharedBatch, SharedBatchConverter, \
+    convert_barcodes_shared
+from gs123.stats import ConversionStats
+
+VALUES = [
+    '(01)00614141123452(21)%010d(17)251231(10)LOT7' % serial
+    for serial in range(1, 500)
+] + [None, '', 'not a barcode', 'caf\xe9', '€', '00106141411234567897',
+     '0100614141123452211234567890']
+
+
+class Scanned:
+    """A value that is not a string and converts through `str`."""
+
+    def __init__(self, barcode):
+        self.barcode = barcode
+
+    def __str__(self):
+        return self.barcode
+
+
+def mapped_segments(_=None):
+    """Returns the shared memory segments mapped by the worker."""
+    with open('/proc/self/maps') as maps:
+        return [line for line in maps if '/psm_' in line]
+
+
+class TestSharedBatch(TestCase):
+    """Tests for the `gs123.shared_batch` module."""
+
+    def test_convert(self):
+        stats = ConversionStats()
+        with SharedBatchConverter(2, 7, chunk_size=64) as converter:
+            converted = converter.convert_batch(VALUES, stats)
+            self.assertEqual(converter.convert_batch([]), [])
+            self.assertEqual(converter.convert_batch(VALUES[-1:]),
+                             ['urn:epc:id:sgtin:0614141.012345.1234567890'])
+        self.assertEqual(converted, convert_barcodes(VALUES, 7))
+        self.assertEqual(stats.converted, 501)
+
+    def test_long_values(self):
+        # Digital Link URIs can be too long for the output slots and are
+        # converted again by the caller
+        profile = ConversionProfile(7, property_name='digital_link')
+        self.assertEqual(
+            convert_barcodes_shared(VALUES, 2, profile=profile),
+            convert_barcodes(VALUES, profile=profile)
+        )
+
+    def test_buffers(self):
+        with SharedBatch(['0102', None, '€', 'ab']) as batch:
+            self.assertEqual(batch.size, 4)
+            self.assertEqual(len(batch.key), 5)
+            data = bytes(batch._blocks[0].buf[:6])
+        self.assertEqual(data, b'0102ab')
+
+    def test_not_strings(self):
+        # values that are not strings are converted as the profile
+        # converts them
+        profile = ConversionProfile(7)
+        values = [Scanned('0100614141123452211234567890'), 0, False, 3.5,
+                  10614141123452211234, Scanned('€'), b'00106141411234567897']
+        converted = convert_barcodes_shared(values, 2, profile=profile)
+        self.assertEqual(converted,
+                         [profile.convert(value) for value in values])
+        self.assertEqual(converted[0],
+                         'urn:epc:id:sgtin:0614141.012345.1234567890')
+
+    @skipUnless(os.path.exists('/proc/self/maps'), 'needs /proc')
+    def test_workers_detach(self):
+        with SharedBatchConverter(2, 7, chunk_size=64) as converter:
+            converter.convert_batch(VALUES)
+            self.assertEqual(
+                converter._pool.map(mapped_segments, range(8), 1),
+                [[]] * 8
+            )
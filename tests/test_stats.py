@@ -0,0 +1,84 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+from django.test import TestCase
+
+from gs123.conversion import BarcodeConverter
+from gs123.regex import match_pattern
+from gs123.stats import ConversionStats
+from gs123.xml_conversion import convert_xml_string
+
+
+class TestConversionStats(TestCase):
+    """Tests for the `gs123.stats` module."""
+
+    def test_match_pattern_stats(self):
+        stats = ConversionStats()
+        match_pattern('(01)12345678901234(21)123456789012', stats=stats)
+        match_pattern('00050991510019004305', stats=stats)
+        match_pattern('not a barcode', stats=stats)
+        report = stats.report()
+        self.assertEqual(report.matches['SGTIN_SN_10_13_ALPHA'], 1)
+        self.assertEqual(report.matches['SSCC'], 1)
+        self.assertEqual(report.misses, 1)
+
+    def test_converter_rejections(self):
+        stats = ConversionStats()
+        BarcodeConverter('011234567890123421003456789012', 6, stats=stats)
+        for value in ('', 'garbage'):
+            with self.assertRaises(BarcodeConverter.BarcodeNotValid):
+                BarcodeConverter(value, 6, stats=stats)
+        report = stats.report()
+        self.assertEqual(report.rejections, 2)
+        self.assertEqual(report.matches['ALPHA_01_21_GTIN_NO_PARENS'], 1)
+
+    def test_xml_stats(self):
+        data = """<sns>
+            <sn id="0100377713112102211RFXVHNPA111">
+            0100377713112102211RFXVHNPA111</sn>
+            <sn>01003777131121022114R2FANWAG12</sn>
+            <sn>ABC</sn>
+        </sns>"""
+        stats = ConversionStats()
+        with_stats = convert_xml_string(data, 6, stats=stats)
+        self.assertEqual(with_stats, convert_xml_string(data, 6))
+        report = stats.report()
+        self.assertEqual(report.elements, 4)
+        self.assertEqual(report.attributes, 1)
+        self.assertEqual(report.converted, 2)
+        self.assertEqual(report.exceptions, {})
+        self.assertTrue(report.timings['serialize'] > 0)
+        self.assertIn('values converted: 2', str(report))
+        self.assertEqual(report.as_dict()['elements'], 4)
+
+    def test_memo_hit_rate(self):
+        data = """<events>
+            <parentID>00050991510019004305</parentID>
+            <epc>00050991510019004305</epc>
+            <epc>00050991510019004305</epc>
+            <epc>ABC</epc>
+            <epc>ABC</epc>
+        </events>"""
+        stats = ConversionStats()
+        memoized = convert_xml_string(data, 7, stats=stats)
+        self.assertEqual(memoized, convert_xml_string(data, 7, memo_size=0))
+        self.assertEqual(memoized.count(b'urn:epc:id:sscc:5099151.0001900430'),
+                         3)
+        report = stats.report()
+        self.assertEqual(report.converted, 3)
+        self.assertEqual(report.matches, {'SSCC': 1})
+        self.assertTrue(report.memo_hits >= 3)
+        self.assertTrue(0 < report.memo_hit_rate < 1)
+        self.assertIn('memo hit rate', str(report))
@@ -0,0 +1,130 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import tempfile
+
+from click.testing import CliRunner
+from django.test import TestCase
+
+from gs123.gs123conversion import main
+from gs123.profile import ConversionProfile
+from gs123.summary import SummaryRow, summarize_barcodes
+
+GTIN = '00614141123452'
+OTHER_GTIN = '00377713112102'
+
+
+def _barcode(serial, expiration='251231', lot='LOT7', gtin=GTIN):
+    return '(01)%s(21)%s(17)%s(10)%s' % (gtin, serial, expiration, lot)
+
+
+class TestSummary(TestCase):
+    """Tests for the `gs123.summary` module."""
+
+    def test_groups(self):
+        values = [_barcode('%010d' % serial) for serial in (5, 100, 9, 20)]
+        values += [
+            _barcode('ABCDEFGHIJ'),
+            _barcode('0000000003', lot='LOT8'),
+            _barcode('0000000004', '260101', 'LOT8', OTHER_GTIN),
+            '0100614141123452211234567890',
+            '00106141411234567897',
+            'not a barcode',
+            None,
+        ]
+        summary = summarize_barcodes(values)
+        self.assertEqual(summary.total, 11)
+        self.assertEqual(summary.invalid, 2)
+        self.assertEqual(summary.ssccs, 1)
+        self.assertEqual(summary.rows(), [
+            SummaryRow(OTHER_GTIN, 'LOT8', '260101', 1, '0000000004',
+                       '0000000004'),
+            SummaryRow(GTIN, None, None, 1, '1234567890', '1234567890'),
+            SummaryRow(GTIN, 'LOT7', '251231', 5, '0000000005',
+                       'ABCDEFGHIJ'),
+            SummaryRow(GTIN, 'LOT8', '251231', 1, '0000000003',
+                       '0000000003'),
+        ])
+        self.assertIn('groups: 4', str(summary))
+
+    def test_formats(self):
+        values = [_barcode('%010d' % serial) for serial in range(100)]
+        values.append('0100614141123452' + '211234567890')
+        summary = summarize_barcodes(values)
+        # a single format skips detection and counts what it matches the
+        # same way
+        pinned = summarize_barcodes(values, formats='SGTIN_SN_10_13_ALPHA')
+        self.assertEqual(pinned.rows(), summary.rows())
+        self.assertEqual(pinned.invalid, 0)
+        self.assertEqual(
+            summarize_barcodes(values, formats='SSCC').invalid, 101)
+
+    def test_order_independent(self):
+        # the second value has the length and app identifiers of the first
+        # but a space in its serial number, which the pattern does not
+        # allow
+        values = ['0100614141999996' + '21ABCDE\x1d17250101' + '10LOT1',
+                  '0100614141999996' + '21AB DE\x1d17259999' + '10LO~1']
+        summary = summarize_barcodes(values)
+        self.assertEqual(summary.invalid, 1)
+        self.assertEqual(summary.rows(), [
+            SummaryRow('00614141999996', 'LOT1', '250101', 1, 'ABCDE',
+                       'ABCDE')])
+        values.append(_barcode('0000000001'))
+        values.append('(01)%s(21)000000000(17)251231(10)LOT7(' % GTIN)
+        self.assertEqual(summarize_barcodes(values).rows(),
+                         summarize_barcodes(values[::-1]).rows())
+        self.assertEqual(summarize_barcodes(values[::-1]).invalid, 2)
+        # the same length and text around the fields, but the lowercase
+        # lot of the first only matches the 17 and 10 pattern while the
+        # second is matched by an earlier pattern as one long serial number
+        profile = ConversionProfile(serial_number_length=6)
+        values = ['0100614141123452' + '21ABC123' + '17251231' + '10l',
+                  '0100614141123452' + '21ABC123' + '17251231' + '10L']
+        rows = summarize_barcodes(values, profile=profile).rows()
+        self.assertEqual(rows, summarize_barcodes(
+            values[::-1], profile=profile).rows())
+        self.assertIn(SummaryRow(GTIN, None, None, 1, 'ABC1231725123110L',
+                                 'ABC1231725123110L'), rows)
+
+    def test_merge(self):
+        first = summarize_barcodes([_barcode('0000000002'), 'x'])
+        second = summarize_barcodes([_barcode('0000000001'),
+                                     _barcode('0000000003')])
+        first.merge(second)
+        self.assertEqual(first.total, 4)
+        self.assertEqual(first.invalid, 1)
+        self.assertEqual(first.rows(), [
+            SummaryRow(GTIN, 'LOT7', '251231', 3, '0000000001',
+                       '0000000003')])
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'barcodes.txt')
+            with open(path, 'w') as f:
+                f.write('%s\r\n\n%s\nbad\n' % (_barcode('0000000001'),
+                                               _barcode('0000000002')))
+            runner = CliRunner()
+            result = runner.invoke(main, ['summarize', path, '--csv'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(result.output.splitlines(), [
+                'gtin14,lot,expiration_date,count,serial_min,serial_max',
+                '%s,LOT7,251231,2,0000000001,0000000002' % GTIN,
+            ])
+            result = runner.invoke(main, ['summarize', path])
+            self.assertIn('invalid: 1', result.output)
+            result = runner.invoke(main, [])
+            self.assertEqual(result.exit_code, 2)
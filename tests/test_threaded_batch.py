@@ -0,0 +1,202 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import sys
+import tempfile
+import threading
+
+from django.test import TestCase
+
+from gs123.batch import BarcodeBatchConverter, convert_barcodes
+from gs123.cache import ConversionCache
+from gs123.memo import ValueMemo
+from gs123.pattern_index import PatternIndex
+from gs123.profile import ConversionProfile
+from gs123.regex import PatternRegistry, match_pattern
+from gs123.stats import ConversionStats
+from gs123.threaded_batch import ThreadedBatchConverter, \
+    convert_barcodes_threaded, gil_enabled
+
+VALUES = [
+    '(01)00614141123452(21)%010d(17)251231(10)LOT7' % serial
+    for serial in range(1, 500)
+] + [None, '', 'not a barcode', '00106141411234567897',
+     '0100614141123452211234567890']
+
+THREADS = 8
+
+
+def _run_threads(target, count=THREADS):
+    """
+    Starts the threads at the same time, with a short switch interval so
+    they interleave as often as possible, and waits for them.
+    """
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run, args=(index,))
+                   for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    if errors:
+        raise errors[0]
+
+
+class TestThreadedBatch(TestCase):
+    """Tests for the `gs123.threaded_batch` module."""
+
+    def test_convert(self):
+        stats = ConversionStats()
+        with ThreadedBatchConverter(4, 7, chunk_size=64) as converter:
+            converted = converter.convert_batch(VALUES, stats)
+            self.assertEqual(converter.convert_batch([]), [])
+        self.assertEqual(converted, convert_barcodes(VALUES, 7))
+        self.assertEqual(stats.converted, 501)
+        self.assertEqual(sum(stats.matches.values()), 501)
+        profile = ConversionProfile(7, property_name='digital_link')
+        self.assertEqual(
+            convert_barcodes_threaded(VALUES, 3, profile=profile),
+            convert_barcodes(VALUES, profile=profile)
+        )
+        self.assertIsInstance(gil_enabled(), bool)
+
+    def test_shared_converter(self):
+        # one converter, and so one memo and registry, used by every thread
+        converter = BarcodeBatchConverter(7, memo_size=100)
+        expected = convert_barcodes(VALUES, 7)
+        results = [None] * THREADS
+        _run_threads(lambda index: results.__setitem__(
+            index, converter.convert_batch(VALUES)))
+        self.assertEqual(results, [expected] * THREADS)
+        self.assertEqual(converter.memo.hits + converter.memo.misses,
+                         THREADS * len(VALUES))
+        self.assertLessEqual(len(converter.memo), 100)
+        # and one stats collector written to by every thread
+        stats = ConversionStats()
+        converter = BarcodeBatchConverter(7, memo_size=100, stats=stats)
+        _run_threads(lambda index: converter.convert_batch(VALUES))
+        self.assertEqual(stats.memo_hits + stats.memo_misses,
+                         THREADS * len(VALUES))
+        self.assertEqual(stats.converted,
+                         THREADS * (len(VALUES) - expected.count(None)))
+
+    def test_shared_state(self):
+        memo = ValueMemo(50)
+        registry = PatternRegistry(reorder_interval=7)
+        stats = ConversionStats()
+
+        def hammer(index):
+            local = ConversionStats()
+            for value in range(1000):
+                memo.put(value % 60, value)
+                memo.get((value + index) % 60)
+                registry.record_hit('FNC1_SERIAL')
+                local.record_match('FNC1_SERIAL')
+            stats.merge(local.report())
+
+        _run_threads(hammer)
+        self.assertEqual(memo.hits + memo.misses, THREADS * 1000)
+        self.assertEqual(len(memo), 50)
+        self.assertEqual(registry.hits['FNC1_SERIAL'], THREADS * 1000)
+        self.assertEqual(registry.fallback_patterns[0][0], 'FNC1_SERIAL')
+        self.assertEqual(stats.matches['FNC1_SERIAL'], THREADS * 1000)
+
+    def test_pin_while_matching(self):
+        class UnpinnedBetweenReads(PatternRegistry):
+            # every other read sees the format unpinned, as if another
+            # thread unpinned it just after the previous read
+            reads = 0
+
+            @property
+            def pinned(self):
+                self.reads += 1
+                return self._pinned if self.reads % 2 else None
+
+        registry = UnpinnedBetweenReads(pinned='SGTIN_SN_10_13_ALPHA')
+        for value in VALUES[:2]:
+            self.assertTrue(match_pattern(value, registry=registry))
+        registry = PatternRegistry()
+
+        def hammer(index):
+            for _ in range(2000):
+                if index == 0:
+                    registry.pin('SGTIN_SN_10_13_ALPHA')
+                    registry.unpin()
+                else:
+                    self.assertTrue(match_pattern(VALUES[0],
+                                                  registry=registry))
+
+        _run_threads(hammer)
+
+    def test_shared_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ConversionCache(os.path.join(directory, 'cache.db'),
+                                 max_values=500) as cache:
+                def hammer(index):
+                    for value in range(50):
+                        cache.put_values({'%s-%s' % (index, value): 'out'},
+                                         'config')
+                        cache.put_document('%s' % value, index, 'output')
+                        self.assertEqual(
+                            cache.get_document('%s' % value, index),
+                            'output')
+                    self.assertEqual(len(cache.get_values(
+                        ['%s-%s' % (index, value) for value in range(50)],
+                        'config')), 50)
+
+                _run_threads(hammer)
+
+    def test_shared_pattern_index(self):
+        prefix = 'urn:epc:id:sgtin:0306123.045678.'
+        index = PatternIndex(
+            'urn:epc:idpat:sgtin:0306123.045678.[%s-%s]' % (start, start + 4)
+            for start in range(0, 1000, 10)
+        )
+        values = [prefix + str(serial) for serial in range(1000)]
+        expected = [value for value in values
+                    if int(value.rpartition('.')[2]) % 10 < 5]
+        results = [None] * THREADS
+
+        def hammer(index_number):
+            if index_number == 0:
+                # adds ranges outside the values while the others match,
+                # so every new range makes the next match merge again
+                for start in range(2000, 2400, 10):
+                    index.add('urn:epc:idpat:sgtin:0306123.045678.[%s-%s]'
+                              % (start, start + 4))
+                    list(index.filter(values[:50]))
+                return
+            for _ in range(5):
+                results[index_number] = list(index.filter(values))
+
+        _run_threads(hammer)
+        self.assertEqual(results[1:], [expected] * (THREADS - 1))
+        self.assertIn(prefix + '2394', index)
+        self.assertNotIn(prefix + '2395', index)
@@ -0,0 +1,162 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2018 SerialLab Corp.  All rights reserved.
+
+import os
+import tempfile
+from io import BytesIO
+
+from django.test import TestCase
+from lxml import etree
+from quartet_capture import models
+from quartet_capture.rules import Rule
+
+from gs123.conversion import BarcodeFormat, URNConverter, URNNotValid
+from gs123.xml_conversion import convert_xml_file, convert_xml_string, \
+    convert_xml_urns_to_barcodes, convert_xml_file_urns_to_barcodes, \
+    convert_xml_chunks, convert_xml_chunks_urns_to_barcodes, _start_tag
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestXMLConversion(TestCase):
+    """Tests for the streaming and reverse XML conversions."""
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.output_dir.name, 'out.xml')
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def _read_output(self):
+        with open(self.output_path, 'rb') as f:
+            return f.read()
+
+    def test_streaming_matches_tree(self):
+        path = os.path.join(DATA_DIR, 'epcis_mixed.xml')
+        with open(path, 'rb') as f:
+            data = f.read()
+        for kwargs in ({}, {'target_elements': ('epc',)}):
+            convert_xml_file(path, self.output_path, 6, **kwargs)
+            self.assertEqual(self._read_output(),
+                             convert_xml_string(data, 6, **kwargs))
+
+    def test_chunks(self):
+        path = os.path.join(DATA_DIR, 'epcis_mixed.xml')
+        with open(path, 'rb') as f:
+            data = f.read()
+        output = BytesIO()
+        convert_xml_chunks((data[index:index + 97]
+                            for index in range(0, len(data), 97)), output, 6)
+        self.assertEqual(output.getvalue(), convert_xml_string(data, 6))
+        urns = output.getvalue()
+        output = BytesIO()
+        convert_xml_chunks_urns_to_barcodes(
+            (urns[index:index + 5] for index in range(0, len(urns), 5)),
+            output)
+        self.assertEqual(output.getvalue(), convert_xml_urns_to_barcodes(urns))
+
+    def test_target_elements(self):
+        data = '<a><epc>00050991510019004305</epc>' \
+               '<other>00050991510019004305</other></a>'
+        ret = convert_xml_string(data, 7, target_elements=['epc'])
+        self.assertEqual(
+            ret,
+            b'<a><epc>urn:epc:id:sscc:5099151.0001900430</epc>'
+            b'<other>00050991510019004305</other></a>'
+        )
+
+    def test_urns_to_barcodes(self):
+        data = '<a x="urn:epc:id:sgtin:0377713.011210.1RFXVHNPA111">' \
+               '<epc>urn:epc:id:sscc:509915.01001900430</epc>' \
+               '<epc>urn:epc:id:sgtin:bad</epc></a>'
+        ret = convert_xml_urns_to_barcodes(
+            data, BarcodeFormat(parenthesis=True))
+        self.assertEqual(
+            ret,
+            b'<a x="(01)00377713112109(21)1RFXVHNPA111">'
+            b'<epc>(00)050991510019004305</epc>'
+            b'<epc>urn:epc:id:sgtin:bad</epc></a>'
+        )
+
+    def test_file_round_trip(self):
+        path = os.path.join(DATA_DIR, 'urns.xml')
+        convert_xml_file_urns_to_barcodes(path, self.output_path)
+        barcodes = self._read_output()
+        self.assertIn(b'<SerialNo>01007772201121022112CW68RW6G</SerialNo>',
+                      barcodes)
+        self.assertNotIn(b'urn:epc', barcodes)
+        with open(path, 'rb') as f:
+            self.assertEqual(
+                convert_xml_string(barcodes, 6).strip(), f.read().strip()
+            )
+
+    def test_invalid_urn(self):
+        # URNConverter raises URNNotValid for anything that is not an
+        # SGTIN or SSCC URN instead of returning a half-built converter
+        for value in ('0100377713112102211RFXVHNPA111', '',
+                      'urn:epc:id:sgtin:0377713.011210.',
+                      'urn:epc:id:grai:0377713.01121.1'):
+            with self.assertRaises(URNNotValid):
+                URNConverter(value)
+            with self.assertRaises(URNNotValid):
+                BarcodeFormat().get_barcode_value(value)
+        # the XML conversion leaves such values alone
+        document = ('<epcList><epc>urn:epc:id:grai:0377713.01121.1</epc>'
+                    '<epc>urn:epc:id:sscc:0377713.0001900430</epc></epcList>')
+        converted = convert_xml_urns_to_barcodes(document)
+        self.assertIn(b'<epc>urn:epc:id:grai:0377713.01121.1</epc>',
+                      converted)
+        self.assertIn(b'<epc>00003777130019004303</epc>', converted)
+
+    def test_attribute_namespace_prefix(self):
+        class Element:
+            # an element whose attribute namespace is only bound as the
+            # default namespace, which lxml itself never creates
+            tag = '{urn:a}root'
+            prefix = None
+            nsmap = {None: 'urn:a', 'ns0': 'urn:other'}
+
+            def getparent(self):
+                return None
+
+            def items(self):
+                return [('{urn:a}first', '1'), ('{urn:a}second', '2'),
+                        ('plain', '3')]
+
+        tag = _start_tag(Element(), empty=True)
+        self.assertEqual(
+            tag, b'<root xmlns="urn:a" xmlns:ns0="urn:other" '
+                 b'xmlns:ns1="urn:a" ns1:first="1" ns1:second="2" '
+                 b'plain="3"/>')
+        root = etree.fromstring(tag)
+        self.assertEqual(root.get('{urn:a}first'), '1')
+        self.assertEqual(root.get('plain'), '3')
+
+    def test_urn_step(self):
+        db_rule = models.Rule.objects.create(name='urn xml conversion')
+        db_step = models.Step.objects.create(
+            name='convert', order=1, rule=db_rule,
+            step_class='gs123.steps.XMLURNConversionStep'
+        )
+        models.StepParameter.objects.create(
+            name='Parenthesis', value='True', step=db_step
+        )
+        db_task = models.Task.objects.create(rule=db_rule, status='QUEUED')
+        c_rule = Rule(db_task.rule, db_task)
+        c_rule.execute('<a><epc>urn:epc:id:sscc:509915.01001900430</epc></a>')
+        self.assertEqual(
+            c_rule.data, '<a><epc>(00)050991510019004305</epc></a>'
+        )